@@ -2,10 +2,11 @@ import customtkinter as ctk
 from tkinter import messagebox
 import subprocess
 import os
+import queue
 import sys
 import socket
 import threading
-import pandas as pd
+from datetime import datetime, timezone
 from tabulate import tabulate
 import time
 
@@ -16,8 +17,29 @@ else:
     base_path = os.path.dirname(os.path.abspath(__file__))
 
 csv_path = os.path.join(base_path, "../sensor_data.csv")
+bin_path = os.path.join(base_path, "../sensor_data.bin")
 test_runner_path = os.path.join(base_path, "TestRunner.py")
 
+sys.path.insert(0, os.path.join(base_path, ".."))
+from Common.sinks import COLUMNS, LogTail
+
+# Log lines are queued by the reader thread and drained on the Tk thread
+# once per frame; the view keeps only the newest LOG_MAX_LINES.
+LOG_REFRESH_MS = 50
+LOG_MAX_LINES = 5000
+RUN_FINISHED = None
+
+# The results view shows one page of the file and re-indexes new rows
+# every TAIL_REFRESH_MS while the server is writing.
+TAIL_REFRESH_MS = 500
+PAGE_ROWS = 200
+
+log_queue = queue.SimpleQueue()
+results_tail = None
+results_since = 0.0
+results_page = 0
+shown_page = None
+
 
 # Utility Functions 
 def get_lan_ip():
@@ -30,58 +52,128 @@ def get_lan_ip():
     except Exception:
         return "127.0.0.1"
 
-def show_csv_content():
-    if not os.path.exists(csv_path):
-        return
+def latest_results_path():
+    # The server writes sensor_data.csv or sensor_data.bin depending on --sink
+    existing = [p for p in (csv_path, bin_path) if os.path.exists(p)]
+    if not existing:
+        return None
+    return max(existing, key=os.path.getmtime)
 
+def format_time(value):
     try:
-        df = pd.read_csv(csv_path)
-        if 'timestamp' in df.columns:
-            df['timestamp'] = pd.to_datetime(df['timestamp'], unit='s')
-        if 'arrival_time' in df.columns:
-            try:
-                df['arrival_time'] = pd.to_datetime(df['arrival_time'], unit='s')
-            except Exception:
-                pass
-
-        table = tabulate(df, headers='keys', tablefmt='grid', showindex=False)
-        log_box.configure(state="normal")
-        log_box.insert("end", "\n" + table + "\n")
-        log_box.configure(state="disabled")
-
-    except Exception as e:
-        log_box.configure(state="normal")
-        log_box.insert("end", f"\nError reading CSV: {e}\n")
-        log_box.configure(state="disabled")
+        return datetime.fromtimestamp(float(value), timezone.utc).strftime("%Y-%m-%d %H:%M:%S.%f")[:-3]
+    except (ValueError, OverflowError, OSError):
+        return value
+
+def format_row(row):
+    row = list(row)
+    for i, name in enumerate(COLUMNS[:len(row)]):
+        if name in ("timestamp", "arrival_time", "send_time"):
+            row[i] = format_time(row[i])
+    return row
+
+# Log View
+def append_log(text):
+    log_box.configure(state="normal")
+    log_box.insert("end", text)
+    lines = int(log_box.index("end-1c").split(".")[0])
+    if lines > LOG_MAX_LINES:
+        log_box.delete("1.0", f"{lines - LOG_MAX_LINES + 1}.0")
+    log_box.see("end")
+    log_box.configure(state="disabled")
+
+def drain_log_queue():
+    lines = []
+    finished = False
+    while True:
+        try:
+            line = log_queue.get_nowait()
+        except queue.Empty:
+            break
+        if line is RUN_FINISHED:
+            finished = True
+        else:
+            lines.append(line)
+
+    if lines:
+        append_log("\n".join(lines) + "\n")
+    if finished:
+        append_log("\n--- Test Completed ---\n")
+        refresh_results(reschedule=False)
+        tabs.set("Results")
+
+    root.after(LOG_REFRESH_MS, drain_log_queue)
 
 # Stream process output (NO METRICS)  
 def stream_process_output(process):
-    # Reader Thread
+    # Reader Thread: only queues lines, never touches Tk widgets
     def reader():
         for raw in iter(process.stdout.readline, ''):
-            if not raw:
-                if process.poll() is not None:
-                    break
-                time.sleep(0.01)
-                continue
+            log_queue.put(raw.rstrip("\n"))
+        process.wait()
+        log_queue.put(RUN_FINISHED)
 
-            clean = raw.rstrip("\n")
+    threading.Thread(target=reader, daemon=True).start()
 
-            # Insert log line
-            log_box.configure(state="normal")
-            log_box.insert("end", clean + "\n")
-            log_box.see("end")
-            log_box.configure(state="disabled")
+# Results View
+def page_count():
+    if results_tail is None:
+        return 0
+    return max(1, -(-results_tail.row_count // PAGE_ROWS))
+
+def refresh_results(reschedule=True):
+    global results_tail, results_page
+    if results_tail is None:
+        path = latest_results_path()
+        if path is not None and os.path.getmtime(path) >= results_since:
+            results_tail = LogTail(path, PAGE_ROWS)
+
+    if results_tail is not None:
+        caught_up = results_tail.refresh()
+        if follow_results.get():
+            results_page = page_count() - 1
+        render_results(caught_up)
+
+    if reschedule:
+        root.after(TAIL_REFRESH_MS, refresh_results)
+
+def render_results(caught_up=True):
+    global shown_page
+    total = results_tail.row_count
+    first = results_page * PAGE_ROWS
+    rows = results_tail.rows(first, PAGE_ROWS)
+
+    status = (
+        f"Rows {first + 1 if rows else 0}-{first + len(rows)} of {total} "
+        f"(page {results_page + 1}/{page_count()})"
+    )
+    if not caught_up:
+        status += " - indexing..."
+    page_label.configure(text=f"{os.path.basename(results_tail.path)} | {status}")
 
-        # Show completion
-        log_box.configure(state="normal")
-        log_box.insert("end", "\n--- Test Completed ---\n")
-        log_box.see("end")
-        log_box.configure(state="disabled")
+    # Rows are only appended, so a page changes only when it grows
+    page = (results_tail, results_page, len(rows))
+    if page == shown_page:
+        return
+    shown_page = page
 
-        show_csv_content()
+    table = tabulate([format_row(row) for row in rows], headers=COLUMNS, tablefmt="simple")
+    results_box.configure(state="normal")
+    results_box.delete("1.0", "end")
+    results_box.insert("end", table + "\n")
+    results_box.configure(state="disabled")
 
-    threading.Thread(target=reader, daemon=True).start()
+def go_to_page(page, follow=False):
+    global results_page
+    if results_tail is None:
+        return
+    follow_results.set(follow)
+    results_page = min(max(page, 0), page_count() - 1)
+    render_results()
+
+def toggle_follow():
+    if follow_results.get():
+        go_to_page(page_count() - 1, follow=True)
 
 # Recommendation Logic  
 def recommend_batch_size(duration):
@@ -118,6 +210,7 @@ def on_test_type_change():
 
 # Run Test  
 def run_test():
+    global results_tail, results_since, shown_page
     ip = ip_entry.get().strip() or get_lan_ip()
     if test_type.get() == "Baseline Test (60s, no batching)":
         duration = 60
@@ -136,8 +229,7 @@ def run_test():
             return
 
         num_clients = int(clients_entry.get())
-        interval = int(interval_var.get())
-        
+        interval = float(interval_var.get())
 
         if batching_enabled.get():
             if not batch_entry.get().isdigit():
@@ -155,11 +247,22 @@ def run_test():
     )
     log_box.configure(state="disabled")
 
+    # Tail the file this run's server creates, not the previous one
+    results_tail = None
+    results_since = time.time()
+    shown_page = None
+    follow_results.set(True)
+    tabs.set("Logs")
+
     cmd = [
         sys.executable, "-u", test_runner_path,
         ip, str(duration), str(batch_size), str(num_clients),
-        "--interval", str(interval)
+        "--interval", str(interval),
+        # Live metrics on localhost:9100 and metrics_live.json while the test runs
+        "--live_metrics"
     ]
+    if adaptive_enabled.get() and test_type.get() == "Custom Test":
+        cmd.append("--adaptive")
 
     process = subprocess.Popen(
         cmd,
@@ -265,11 +368,21 @@ interval_var = ctk.StringVar(value="1")
 
 interval_menu = ctk.CTkOptionMenu(
     interval_frame,
-    values=["1", "5", "30"],
+    values=["0.1", "0.5", "1", "5", "30"],
     variable=interval_var
 )
 interval_menu.grid(row=0, column=1, padx=5)
 
+# Adaptive interval / batch size, driven by server heartbeat replies
+adaptive_enabled = ctk.BooleanVar(value=False)
+
+ctk.CTkCheckBox(
+    controls_frame,
+    text="Adaptive",
+    variable=adaptive_enabled,
+    command=force_custom_test
+).pack(side="left", padx=10)
+
 # Run test button
 run_button = ctk.CTkButton(
     controls_frame,
@@ -282,9 +395,15 @@ run_button = ctk.CTkButton(
 )
 run_button.pack(side="right", padx=20)
 
+# Logs / Results Tabs
+tabs = ctk.CTkTabview(root)
+tabs.pack(fill="both", expand=True, padx=12, pady=12)
+logs_tab = tabs.add("Logs")
+results_tab = tabs.add("Results")
+
 # Log Box 
-log_frame = ctk.CTkFrame(root)
-log_frame.pack(fill="both", expand=True, padx=12, pady=12)
+log_frame = ctk.CTkFrame(logs_tab)
+log_frame.pack(fill="both", expand=True)
 
 log_box = ctk.CTkTextbox(log_frame, wrap="none", font=("Consolas", 11))
 log_box.pack(side="left", fill="both", expand=True)
@@ -296,5 +415,35 @@ scroll.pack(side="right", fill="y")
 log_box.insert("end", "Logs will appear here...\n")
 log_box.configure(state="disabled")
 
+# Results Table (one page at a time)
+nav_frame = ctk.CTkFrame(results_tab)
+nav_frame.pack(fill="x", pady=(0, 6))
+
+follow_results = ctk.BooleanVar(value=True)
+
+for text, command in [
+    ("<<", lambda: go_to_page(0)),
+    ("<", lambda: go_to_page(results_page - 1)),
+    (">", lambda: go_to_page(results_page + 1)),
+    (">>", lambda: go_to_page(page_count() - 1, follow=True)),
+]:
+    ctk.CTkButton(nav_frame, text=text, width=40, command=command).pack(side="left", padx=3)
+
+ctk.CTkCheckBox(
+    nav_frame,
+    text="Follow",
+    variable=follow_results,
+    command=toggle_follow
+).pack(side="left", padx=10)
+
+page_label = ctk.CTkLabel(nav_frame, text="No results yet")
+page_label.pack(side="left", padx=10)
+
+results_box = ctk.CTkTextbox(results_tab, wrap="none", font=("Consolas", 11))
+results_box.pack(fill="both", expand=True)
+results_box.configure(state="disabled")
+
 # Start GUI
+root.after(LOG_REFRESH_MS, drain_log_queue)
+root.after(0, refresh_results)
 root.mainloop()
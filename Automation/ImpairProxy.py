@@ -0,0 +1,268 @@
+"""
+Userspace UDP impairment proxy: loss, burst loss, delay/jitter,
+reordering, duplication and rate limiting between clients and the
+server, without root, tc or netem.
+
+Clients send to --listen_port; every client address gets its own
+upstream socket, so the server still sees one source per device and its
+replies find their way back. Both directions are impaired by default,
+like netem on lo. Every copy of every datagram goes into one heap keyed
+by its delivery time and the loop sleeps in select() until the earliest
+deadline, sending everything due in one pass, so timing holds at
+thousands of packets per second.
+
+Usage:
+  python Automation/ImpairProxy.py --listen_port 10000 --server_port 9999 --profile loss5
+  python Automation/ImpairProxy.py --listen_port 10000 --burst 1 20 --delay 50 --jitter 5
+"""
+import argparse
+import heapq
+import itertools
+import json
+import logging
+import os
+import selectors
+import signal
+import socket
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from Common.impairment import DEFAULT_LIMIT, PROFILES, Impairment
+from Common.logs import add_logging_args, setup_logging
+from Common.protocol import MAX_DATAGRAM
+from Common.readiness import mark_ready
+
+DEFAULT_LISTEN_PORT = 10000
+SERVER_PORT = 9999
+SESSION_IDLE_TIMEOUT = 60.0
+# Datagrams read from one socket before the loop checks its deadlines
+DRAIN_LIMIT = 256
+
+log = logging.getLogger("proxy")
+
+
+class ImpairProxy:
+
+    def __init__(self, listen_port, upstream, up, down):
+        self.upstream = upstream
+        self.up = up
+        self.down = down
+
+        self.selector = selectors.DefaultSelector()
+        self.listen = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.listen.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self.listen.bind(("0.0.0.0", listen_port))
+        self.listen.setblocking(False)
+        self.selector.register(self.listen, selectors.EVENT_READ, self.from_client)
+
+        # client address -> upstream socket, and back
+        self.sessions = {}
+        self.clients = {}
+        self.last_seen = {}
+
+        self.queue = []
+        self.order = itertools.count()
+        self.stopping = False
+
+    def session(self, addr, now):
+        sock = self.sessions.get(addr)
+        if sock is None:
+            sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+            sock.connect(self.upstream)
+            sock.setblocking(False)
+            self.selector.register(sock, selectors.EVENT_READ, self.from_server)
+            self.sessions[addr] = sock
+            self.clients[sock] = addr
+            log.info(f"New session {addr[0]}:{addr[1]}")
+        self.last_seen[addr] = now
+        return sock
+
+    def enqueue(self, impairment, now, data, sock, addr):
+        for due in impairment.schedule(now, len(data)):
+            heapq.heappush(self.queue, (due, next(self.order), impairment, sock, data, addr))
+
+    def from_client(self, sock):
+        now = time.monotonic()
+        for _ in range(DRAIN_LIMIT):
+            try:
+                data, addr = sock.recvfrom(MAX_DATAGRAM)
+            except (BlockingIOError, InterruptedError):
+                return
+            upstream = self.session(addr, now)
+            self.enqueue(self.up, now, data, upstream, None)
+
+    def from_server(self, sock):
+        now = time.monotonic()
+        addr = self.clients.get(sock)
+        for _ in range(DRAIN_LIMIT):
+            try:
+                data = sock.recv(MAX_DATAGRAM)
+            except (BlockingIOError, InterruptedError):
+                return
+            except ConnectionRefusedError:
+                # ICMP port unreachable from an earlier send: no server yet
+                continue
+            self.enqueue(self.down, now, data, self.listen, addr)
+
+    def send_due(self, now):
+        queue = self.queue
+        while queue and queue[0][0] <= now:
+            _, _, impairment, sock, data, addr = heapq.heappop(queue)
+            impairment.delivered()
+            try:
+                if addr is None:
+                    sock.send(data)
+                else:
+                    sock.sendto(data, addr)
+            except OSError as e:
+                log.debug(f"Send failed: {e}")
+
+    def expire_sessions(self, now):
+        for addr, seen in list(self.last_seen.items()):
+            if now - seen > SESSION_IDLE_TIMEOUT:
+                sock = self.sessions.pop(addr)
+                del self.clients[sock]
+                del self.last_seen[addr]
+                self.selector.unregister(sock)
+                sock.close()
+
+    def run(self, duration, status_interval):
+        start = time.monotonic()
+        end = start + duration if duration > 0 else float("inf")
+        next_status = start + status_interval if status_interval > 0 else float("inf")
+        next_expiry = start + SESSION_IDLE_TIMEOUT
+
+        while not self.stopping:
+            now = time.monotonic()
+            if now >= end:
+                break
+            timeout = min(1.0, end - now)
+            if self.queue:
+                timeout = max(0.0, min(timeout, self.queue[0][0] - now))
+
+            for key, _ in self.selector.select(timeout):
+                key.data(key.fileobj)
+
+            now = time.monotonic()
+            self.send_due(now)
+
+            if now >= next_status:
+                log.info(f"Status | sessions {len(self.sessions)} | queued {len(self.queue)} | "
+                         f"up {format_stats(self.up.stats)} | down {format_stats(self.down.stats)}")
+                next_status += status_interval
+            if now >= next_expiry:
+                self.expire_sessions(now)
+                next_expiry = now + SESSION_IDLE_TIMEOUT
+
+        # Whatever is still queued would have arrived after the run ended
+        self.queue.clear()
+
+    def close(self):
+        for sock in [self.listen] + list(self.clients):
+            self.selector.unregister(sock)
+            sock.close()
+        self.selector.close()
+
+
+def format_stats(stats):
+    return " ".join(f"{name} {value}" for name, value in stats.items())
+
+
+def build_impairment(args, seed):
+    return Impairment.from_profile(
+        args.profile, seed=seed,
+        loss=args.loss, burst=args.burst, delay=args.delay, jitter=args.jitter,
+        reorder=args.reorder, duplicate=args.duplicate, rate=args.rate, limit=args.limit
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="UDP impairment proxy (userspace netem)")
+    parser.add_argument("--listen_port", type=int, default=DEFAULT_LISTEN_PORT)
+    parser.add_argument("--server_ip", default="127.0.0.1")
+    parser.add_argument("--server_port", type=int, default=SERVER_PORT)
+    parser.add_argument("--duration", type=float, default=0, help="Seconds to run (0 = until SIGTERM/SIGINT)")
+    parser.add_argument(
+        "--profile",
+        default="normal",
+        choices=list(PROFILES),
+        help="Named impairment; the options below override its fields"
+    )
+    parser.add_argument("--loss", type=float, help="Independent loss (%%)")
+    parser.add_argument(
+        "--burst",
+        type=float,
+        nargs="+",
+        metavar="PCT",
+        help="Gilbert-Elliott loss: p r [bad_loss [good_loss]] in %%; mean burst is 100/r packets"
+    )
+    parser.add_argument("--delay", type=float, help="Delay (ms)")
+    parser.add_argument("--jitter", type=float, help="Uniform +- jitter on the delay (ms)")
+    parser.add_argument("--reorder", type=float, help="Packets sent without the delay (%%)")
+    parser.add_argument("--duplicate", type=float, help="Packets sent twice (%%)")
+    parser.add_argument("--rate", type=float, help="Link rate (kbit/s)")
+    parser.add_argument("--limit", type=int, help=f"Packets in flight per direction (default {DEFAULT_LIMIT})")
+    parser.add_argument(
+        "--direction",
+        default="both",
+        choices=["both", "up", "down"],
+        help="Impair client->server (up), server->client (down) or both"
+    )
+    parser.add_argument("--seed", type=int, help="Seed for reproducible loss patterns")
+    parser.add_argument("--stats_json", help="Write per-direction counters here at exit")
+    parser.add_argument("--ready_file", help="Create this file once the listening socket is bound")
+    add_logging_args(parser)
+    args = parser.parse_args()
+
+    global log
+    log = setup_logging(args, "proxy")
+
+    if args.burst is not None and not 2 <= len(args.burst) <= 4:
+        parser.error("--burst takes p r [bad_loss [good_loss]]")
+
+    try:
+        impaired = build_impairment(args, args.seed)
+        # The reverse direction gets its own random stream
+        mirrored = build_impairment(args, None if args.seed is None else args.seed + 1)
+    except ValueError as e:
+        parser.error(str(e))
+    up = impaired if args.direction in ("both", "up") else Impairment()
+    down = mirrored if args.direction in ("both", "down") else Impairment()
+
+    proxy = ImpairProxy(args.listen_port, (args.server_ip, args.server_port), up, down)
+
+    def stop(signum, frame):
+        proxy.stopping = True
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+
+    log.info(
+        f"Proxy :{args.listen_port} -> {args.server_ip}:{args.server_port} "
+        f"({args.direction}: {impaired.describe()})"
+    )
+    if args.ready_file:
+        mark_ready(args.ready_file, args.listen_port)
+    try:
+        proxy.run(args.duration, args.status_interval)
+    finally:
+        proxy.close()
+
+    for name, impairment in (("up", up), ("down", down)):
+        log.info(f"Total {name} | {format_stats(impairment.stats)}")
+    if args.stats_json:
+        with open(args.stats_json, "w") as f:
+            json.dump({
+                "listen_port": args.listen_port,
+                "server": f"{args.server_ip}:{args.server_port}",
+                "direction": args.direction,
+                "impairment": impaired.describe(),
+                "up": up.stats,
+                "down": down.stats,
+            }, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,418 @@
+"""
+Discrete-event simulation of a full experiment on a virtual clock.
+
+Devices encode their packets with the real PacketEncoder and payload
+codecs and follow the client's schedule (INIT handshake with retries,
+send interval, heartbeats, count/bytes/linger batching). The server is
+the real ServerState, fed each datagram at its virtual arrival time and
+writing the usual sink and metrics.txt. In between, the network is the
+Common.impairment channel model (the same one ImpairProxy uses), one
+instance per direction shared by all devices like a single link.
+
+Nothing sleeps: events are popped from a heap in time order, so the
+run costs only the CPU time of encoding and decoding (roughly 100k
+packets per second), whatever the interval. Timing follows TestRunner:
+the server runs for --duration and clients start 0.4 s after it, each
+sending for --duration after its handshake.
+
+Lists for --devices, --interval, --batch_size, --profile and --loss run
+every combination; --results appends one row per cell, with the
+metrics.txt fields and the cell's parameters.
+
+Usage:
+  python Automation/Simulate.py --duration 3600 --devices 50 --profile loss5
+  python Automation/Simulate.py --batch_size 0 5 10 --interval 0.1 1 5 --loss 0 1 5 \\
+      --devices 1 100 --results sim_results.csv
+"""
+import argparse
+import csv
+import heapq
+import itertools
+import logging
+import os
+import random
+import sys
+import time
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, PROJECT_ROOT)
+sys.path.insert(0, os.path.join(PROJECT_ROOT, "Server"))
+
+from Server import READY_DELAY, ServerState
+from Common.devices import DEFAULT_IDLE_TIMEOUT
+from Common.impairment import PROFILES, Impairment
+from Common.logs import add_logging_args, setup_logging
+from Common.payload import ENC_ASCII, ENC_TIMED, ENCODINGS, MAX_AGE_MS, encode_readings, reading_size
+from Common.protocol import (
+    MAX_DATAGRAM, MSG_DATA, MSG_HEARTBEAT, MSG_INIT,
+    SUPPORTED_VERSIONS, PacketEncoder, header_size, max_device_id, version_for
+)
+from Common.results import read_metrics
+from Common.sinks import SINKS, create_sink
+
+# Client behaviour, as in Client.py
+HEARTBEAT_INTERVAL = 5
+INIT_TIMEOUT = 2
+INIT_MAX_RETRIES = 5
+UDP_MTU_PAYLOAD = 1472
+DEFAULT_MAX_LINGER = 10.0
+
+# TestRunner starts the clients this long after the server
+CLIENT_START_DELAY = 0.4
+
+log = logging.getLogger("simulate")
+
+
+class EventLoop:
+    """Virtual clock: callbacks run in time order, ties in scheduling order."""
+
+    def __init__(self):
+        self.now = 0.0
+        self.events = []
+        self.order = itertools.count()
+
+    def at(self, when, callback, *args):
+        heapq.heappush(self.events, (when, next(self.order), callback, args))
+
+    def run(self, until):
+        events = self.events
+        while events and events[0][0] <= until:
+            self.now, _, callback, args = heapq.heappop(events)
+            callback(*args)
+        self.now = until
+
+
+class SimDevice:
+    """One client: handshake, periodic sampling, batching and heartbeats."""
+
+    def __init__(self, sim, device_id, start):
+        self.sim = sim
+        self.loop = sim.loop
+        self.rng = sim.rng
+        config = sim.config
+
+        self.interval = config.interval
+        self.batch_size = config.batch_size
+        self.linger = config.max_linger
+        self.max_payload = min(MAX_DATAGRAM, UDP_MTU_PAYLOAD) - header_size(config.protocol_version)
+        self.max_age = int(self.linger * 2000) if self.linger > 0 else MAX_AGE_MS
+
+        encoding = ENCODINGS[config.encoding]
+        if self.batch_size > 0 and not config.no_reading_timestamps:
+            encoding |= ENC_TIMED
+        self.encoder = PacketEncoder(device_id, config.protocol_version, encoding)
+
+        self.started = start
+        self.seq = 0
+        self.attempt = 0
+        self.state = "init"
+        self.end = None
+
+        self.readings = []
+        self.sampled = []
+        self.payload_size = 0
+        self.batch_number = 0
+
+        self.packets_sent = 0
+        self.readings_sent = 0
+        self.loop.at(start, self.send_init)
+
+    # Transmit
+    def timestamp_ms(self):
+        return int((self.loop.now - self.started) * 1000)
+
+    def send(self, msg_type, payload=b""):
+        self.sim.uplink(self, self.encoder.encode(msg_type, self.seq, self.timestamp_ms(), payload))
+
+    # INIT handshake
+    def send_init(self):
+        if self.state != "init":
+            return
+        if self.attempt == INIT_MAX_RETRIES:
+            self.state = "failed"
+            self.sim.failed += 1
+            return
+        self.attempt += 1
+        self.send(MSG_INIT)
+        self.loop.at(self.loop.now + INIT_TIMEOUT, self.init_timeout, self.attempt)
+
+    def init_timeout(self, attempt):
+        if self.state == "init" and attempt == self.attempt:
+            self.send_init()
+
+    def receive(self, reply):
+        if self.state != "init":
+            return
+        if reply.startswith(b"ACK_INIT"):
+            self.encoder.encoding = reply[8] if len(reply) > 8 else ENC_ASCII
+        elif reply == b"ACK_READY":
+            self.state = "running"
+            self.seq += 1
+            now = self.loop.now
+            self.end = now + self.sim.config.duration
+            self.loop.at(now, self.sample, now)
+            self.loop.at(now + HEARTBEAT_INTERVAL, self.heartbeat)
+            self.loop.at(self.end, self.finish)
+
+    # Data
+    def send_readings(self, readings, ages=None):
+        encoding = self.encoder.encoding
+        if ages is None and encoding & ENC_TIMED:
+            ages = [0] * len(readings)
+        self.send(MSG_DATA, encode_readings(encoding, readings, ages))
+        self.seq += 1
+        self.packets_sent += 1
+        self.readings_sent += len(readings)
+
+    def sample(self, due):
+        now = self.loop.now
+        if now >= self.end:
+            return
+        next_send = due + self.interval
+        self.loop.at(next_send, self.sample, next_send)
+
+        reading = round(self.rng.uniform(20, 35), 1)
+        if self.batch_size == 0:
+            self.send_readings([reading])
+            return
+
+        if not self.fits(reading):
+            self.flush()
+        self.add(reading, now)
+        if len(self.readings) >= self.batch_size:
+            self.flush()
+        elif self.linger > 0 and next_send > self.sampled[0] + self.linger:
+            # The next reading would miss the linger limit anyway
+            self.flush()
+
+    def fits(self, reading):
+        previous = self.readings[-1] if self.readings else None
+        size = reading_size(self.encoder.encoding, reading, previous, self.max_age)
+        return self.payload_size + size <= self.max_payload
+
+    def add(self, reading, now):
+        previous = self.readings[-1] if self.readings else None
+        self.payload_size += reading_size(self.encoder.encoding, reading, previous, self.max_age)
+        if not self.readings and self.linger > 0:
+            self.loop.at(now + self.linger, self.linger_expired, self.batch_number)
+        self.readings.append(reading)
+        self.sampled.append(now)
+
+    def linger_expired(self, batch_number):
+        if batch_number == self.batch_number and self.state == "running":
+            self.flush()
+
+    def flush(self):
+        if not self.readings:
+            return
+        now = self.loop.now
+        ages = None
+        if self.encoder.encoding & ENC_TIMED:
+            ages = [min(int((now - sampled) * 1000), self.max_age) for sampled in self.sampled]
+        self.send_readings(self.readings, ages)
+        self.readings = []
+        self.sampled = []
+        self.payload_size = 0
+        self.batch_number += 1
+
+    def heartbeat(self):
+        if self.loop.now >= self.end:
+            return
+        self.send(MSG_HEARTBEAT)
+        self.loop.at(self.loop.now + HEARTBEAT_INTERVAL, self.heartbeat)
+
+    def finish(self):
+        self.flush()
+        self.state = "done"
+
+
+class Simulation:
+
+    def __init__(self, config, data_path):
+        self.config = config
+        self.loop = EventLoop()
+        self.rng = random.Random(config.seed)
+
+        self.sink = create_sink(config.sink, data_path)
+        self.state = ServerState(
+            self.sink, status_interval=float("inf"), label="Simulated server",
+            idle_timeout=config.idle_timeout
+        )
+        self.server_end = config.duration
+
+        # One link per direction, shared by every device
+        self.up = Impairment.from_profile(config.profile, seed=config.seed, loss=config.loss)
+        self.down = Impairment.from_profile(
+            config.profile, seed=None if config.seed is None else config.seed + 1, loss=config.loss
+        )
+
+        # Devices come up in a spread over one interval rather than in lockstep
+        self.devices = [
+            SimDevice(self, device_id, CLIENT_START_DELAY + self.rng.uniform(0, min(config.interval, 1.0)))
+            for device_id in range(1, config.devices + 1)
+        ]
+        self.failed = 0
+        self.loop.at(1.0, self.housekeeping)
+
+    def uplink(self, device, packet):
+        for due in self.up.schedule(self.loop.now, len(packet)):
+            self.loop.at(due, self.server_receive, device, packet)
+
+    def downlink(self, device, reply, delay=0.0):
+        for due in self.down.schedule(self.loop.now + delay, len(reply)):
+            self.loop.at(due, self.client_receive, device, reply)
+
+    def client_receive(self, device, reply):
+        self.down.delivered()
+        device.receive(reply)
+
+    def server_receive(self, device, packet):
+        self.up.delivered()
+        if self.loop.now > self.server_end:
+            return
+        result = self.state.process_packet(packet, self.loop.now)
+        if not result:
+            return
+        msg_type, device_id = result
+        if msg_type == MSG_INIT:
+            self.downlink(device, self.state.init_ack(device_id))
+            self.downlink(device, b"ACK_READY", READY_DELAY)
+        elif msg_type == MSG_HEARTBEAT:
+            self.downlink(device, self.state.heartbeat_ack(device_id))
+
+    def housekeeping(self):
+        # What ServerState.tick() does once per second, on the virtual clock
+        self.state.devices.evict_idle(self.loop.now)
+        if self.loop.now < self.server_end:
+            self.loop.at(self.loop.now + 1.0, self.housekeeping)
+
+    def run(self):
+        # Clients outlive the server by their start-up delay, as in TestRunner
+        self.loop.run(self.server_end + CLIENT_START_DELAY + READY_DELAY + self.config.duration)
+        self.sink.close()
+
+
+def cell_configs(args):
+    """One config per combination of the list-valued options."""
+    for devices, interval, batch_size, profile, loss in itertools.product(
+        args.devices, args.interval, args.batch_size, args.profile, args.loss
+    ):
+        config = argparse.Namespace(**vars(args))
+        config.devices = devices
+        config.interval = interval
+        config.batch_size = batch_size
+        config.profile = profile
+        config.loss = loss
+        yield config
+
+
+def cell_name(config):
+    name = f"d{config.devices}_i{config.interval:g}_b{config.batch_size}_{config.profile}"
+    if config.loss is not None:
+        name += f"_loss{config.loss:g}"
+    return name
+
+
+def append_results(path, row):
+    new = not os.path.exists(path) or os.path.getsize(path) == 0
+    with open(path, "a", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=list(row))
+        if new:
+            writer.writeheader()
+        writer.writerow(row)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Simulate experiments on a virtual clock")
+    parser.add_argument("--duration", type=float, default=60, help="Simulated seconds")
+    parser.add_argument("--devices", type=int, nargs="+", default=[1])
+    parser.add_argument("--interval", type=float, nargs="+", default=[1.0])
+    parser.add_argument("--batch_size", type=int, nargs="+", default=[0])
+    parser.add_argument("--profile", nargs="+", default=["normal"], choices=list(PROFILES))
+    parser.add_argument(
+        "--loss",
+        type=float,
+        nargs="+",
+        default=[None],
+        help="Independent loss (%%) overriding the profile's"
+    )
+    parser.add_argument("--encoding", default="ascii", choices=list(ENCODINGS))
+    parser.add_argument(
+        "--protocol_version",
+        type=int,
+        choices=SUPPORTED_VERSIONS,
+        help="Default: 2, or 3 when there are more than 255 devices"
+    )
+    parser.add_argument("--max_linger", type=float, default=DEFAULT_MAX_LINGER)
+    parser.add_argument("--no_reading_timestamps", action="store_true")
+    parser.add_argument("--idle_timeout", type=float, default=DEFAULT_IDLE_TIMEOUT, help="Server device eviction (0 keeps them)")
+    parser.add_argument("--sink", default="csv", choices=sorted(SINKS))
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument(
+        "--output_dir",
+        help="Where sensor_data and metrics.txt go (default: the project root for a single run, "
+             "sim_runs/<cell>/ for a sweep)"
+    )
+    parser.add_argument("--results", help="Append one CSV row of metrics per run")
+    add_logging_args(parser)
+    args = parser.parse_args()
+
+    global log
+    log = setup_logging(args, "simulate")
+    # INIT lines for thousands of devices would drown the summary
+    server_log = setup_logging(args, "server")
+    if not server_log.isEnabledFor(logging.DEBUG):
+        server_log.setLevel(logging.WARNING)
+
+    if min(args.interval) <= 0 or args.duration <= 0 or min(args.devices) < 1:
+        parser.error("--duration, --interval and --devices must be positive")
+    if args.protocol_version is None:
+        args.protocol_version = version_for(max(args.devices))
+    if max(args.devices) > max_device_id(args.protocol_version):
+        parser.error(f"Protocol version {args.protocol_version} allows at most "
+                     f"{max_device_id(args.protocol_version)} devices")
+    args.max_linger = max(0.0, args.max_linger)
+
+    configs = list(cell_configs(args))
+    sweep = len(configs) > 1
+    for config in configs:
+        name = cell_name(config)
+        if args.output_dir:
+            out_dir = os.path.join(args.output_dir, name) if sweep else args.output_dir
+        else:
+            out_dir = os.path.join(PROJECT_ROOT, "sim_runs", name) if sweep else PROJECT_ROOT
+        os.makedirs(out_dir, exist_ok=True)
+        data_path = os.path.join(out_dir, "sensor_data" + SINKS[config.sink].extension)
+        metrics_path = os.path.join(out_dir, "metrics.txt")
+
+        wall_start = time.perf_counter()
+        sim = Simulation(config, data_path)
+        sim.run()
+        wall = time.perf_counter() - wall_start
+
+        sim.state.write_metrics(metrics_path, report=not sweep and not args.quiet)
+        sent = sum(device.packets_sent for device in sim.devices)
+        log.info(
+            f"{name}: {config.duration:g} s simulated in {wall:.2f} s | "
+            f"sent {sent} packets, received {sim.state.packets_received}, "
+            f"gaps {sim.state.sequence_gap_count}"
+            + (f", {sim.failed} devices failed INIT" if sim.failed else "")
+        )
+
+        if args.results:
+            row = read_metrics(metrics_path)
+            row.update({
+                "duration": config.duration,
+                "devices": config.devices,
+                "interval": config.interval,
+                "batch_size": config.batch_size,
+                "profile": config.profile,
+                "loss": "" if config.loss is None else config.loss,
+                "packets_sent": sent,
+                "wall_seconds": round(wall, 3),
+            })
+            append_results(args.results, row)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,272 @@
+"""
+Run a matrix of real experiments concurrently and collect their metrics.
+
+Every combination of --duration, --batch_size, --interval, --clients and
+--impair is one cell: a server (plus an ImpairProxy unless the profile
+is "none") and its clients, on ports of its own and writing into its own
+directory, so up to --parallel cells run side by side without sharing
+sensor_data.csv or metrics.txt. Clients start as soon as the server and
+proxy report their sockets bound.
+
+Each cell directory holds sensor_data, metrics.txt, metrics_live.json,
+server.log, clients.log and, when impaired, proxy.log and
+proxy_stats.json. One row
+per cell, the metrics.txt fields followed by the cell's parameters, goes
+into experiment_results.csv in the sweep directory.
+
+Usage:
+  python Automation/Sweep.py --duration 30 --interval 0.1 1 --batch_size 0 10 --impair none loss5
+  python Automation/Sweep.py --clients 1 4 16 --impair burst5 lossy_wan --parallel 2
+"""
+import argparse
+import csv
+import itertools
+import os
+import subprocess
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, PROJECT_ROOT)
+
+from Common.impairment import PROFILES
+from Common.live import SNAPSHOT_INTERVAL
+from Common.readiness import wait_ready
+from Common.results import METRIC_FIELDS, read_metrics
+
+PYTHON = sys.executable
+SERVER_PATH = os.path.join(PROJECT_ROOT, "Server", "Server.py")
+CLIENT_PATH = os.path.join(PROJECT_ROOT, "Client", "Client.py")
+PROXY_PATH = os.path.join(PROJECT_ROOT, "Automation", "ImpairProxy.py")
+
+NO_IMPAIRMENT = "none"
+DEFAULT_BASE_PORT = 20000
+# Seconds past its duration before a cell's processes are killed
+CELL_GRACE = 30
+
+PARAMETER_FIELDS = ["duration", "batch_size", "interval", "clients", "impair", "port", "status"]
+
+print_lock = threading.Lock()
+
+
+def safe_print(msg):
+    with print_lock:
+        print(msg, flush=True)
+
+
+class Cell:
+    def __init__(self, index, duration, batch_size, interval, clients, impair, port, out_dir):
+        self.index = index
+        self.duration = duration
+        self.batch_size = batch_size
+        self.interval = interval
+        self.clients = clients
+        self.impair = impair
+        self.port = port
+        # The proxy listens next to the server; clients send to whichever is in front
+        self.client_port = port + 1 if impair != NO_IMPAIRMENT else port
+        self.name = f"d{duration}_b{batch_size}_i{interval:g}_c{clients}_{impair}"
+        self.out_dir = os.path.join(out_dir, self.name)
+        self.status = "pending"
+
+    def path(self, name):
+        return os.path.join(self.out_dir, name)
+
+    def row(self):
+        row = dict.fromkeys(METRIC_FIELDS, "")
+        metrics_path = self.path("metrics.txt")
+        if os.path.exists(metrics_path):
+            row.update(read_metrics(metrics_path))
+        row.update({
+            "duration": self.duration,
+            "batch_size": self.batch_size,
+            "interval": self.interval,
+            "clients": self.clients,
+            "impair": self.impair,
+            "port": self.port,
+            "status": self.status,
+        })
+        return row
+
+
+def start(cmd, log_file):
+    return subprocess.Popen(cmd, stdout=log_file, stderr=subprocess.STDOUT, text=True)
+
+
+def stop(proc, timeout):
+    """Wait up to timeout seconds, then terminate; True if it exited on its own."""
+    try:
+        proc.wait(timeout=max(0.0, timeout))
+        return True
+    except subprocess.TimeoutExpired:
+        proc.terminate()
+        try:
+            proc.wait(timeout=5)
+        except subprocess.TimeoutExpired:
+            proc.kill()
+            proc.wait()
+        return False
+
+
+def run_cell(cell, log_args):
+    os.makedirs(cell.out_dir, exist_ok=True)
+    for name in ("server.ready", "proxy.ready", "metrics.txt"):
+        if os.path.exists(cell.path(name)):
+            os.remove(cell.path(name))
+
+    started = time.monotonic()
+    deadline = started + cell.duration + CELL_GRACE
+    logs = []
+    server_log = open(cell.path("server.log"), "w")
+    logs.append(server_log)
+    server = start([
+        PYTHON, "-u", SERVER_PATH,
+        "--duration", str(cell.duration),
+        "--port", str(cell.port),
+        "--output_dir", cell.out_dir,
+        "--ready_file", cell.path("server.ready"),
+        # metrics_live.json lands in the cell directory; no metrics port,
+        # which concurrent servers would fight over
+        "--snapshot_interval", str(SNAPSHOT_INTERVAL),
+    ] + log_args, server_log)
+
+    proxy = None
+    if cell.impair != NO_IMPAIRMENT:
+        proxy_log = open(cell.path("proxy.log"), "w")
+        logs.append(proxy_log)
+        proxy = start([
+            PYTHON, "-u", PROXY_PATH,
+            "--listen_port", str(cell.client_port),
+            "--server_ip", "127.0.0.1",
+            "--server_port", str(cell.port),
+            "--profile", cell.impair,
+            "--duration", str(cell.duration + 5),
+            "--seed", str(cell.index),
+            "--stats_json", cell.path("proxy_stats.json"),
+            "--ready_file", cell.path("proxy.ready"),
+        ] + log_args, proxy_log)
+
+    clients = []
+    try:
+        if not wait_ready(cell.path("server.ready"), server) or (
+                proxy and not wait_ready(cell.path("proxy.ready"), proxy)):
+            cell.status = "not ready"
+        else:
+            client_log = open(cell.path("clients.log"), "w")
+            logs.append(client_log)
+            for device_id in range(1, cell.clients + 1):
+                clients.append(start([
+                    PYTHON, "-u", CLIENT_PATH,
+                    "--server_ip", "127.0.0.1",
+                    "--server_port", str(cell.client_port),
+                    "--duration", str(cell.duration),
+                    "--batch_size", str(cell.batch_size),
+                    "--device_id", str(device_id),
+                    "--interval", str(cell.interval),
+                ] + log_args, client_log))
+
+            exited = [stop(proc, deadline - time.monotonic()) for proc in clients + [server]]
+            if not all(exited):
+                cell.status = "timeout"
+            elif server.returncode != 0:
+                cell.status = f"server exit {server.returncode}"
+            elif any(proc.returncode != 0 for proc in clients):
+                cell.status = "client failed"
+            else:
+                cell.status = "ok"
+    finally:
+        for proc in clients + [server]:
+            if proc.poll() is None:
+                stop(proc, 0)
+        if proxy:
+            stop(proxy, 0)
+        for f in logs:
+            f.close()
+        for name in ("server.ready", "proxy.ready"):
+            if os.path.exists(cell.path(name)):
+                os.remove(cell.path(name))
+
+    row = cell.row()
+    packets, gaps = (
+        "-" if row[name] == "" else row[name] for name in ("packets_received", "sequence_gap_count")
+    )
+    safe_print(
+        f"[{cell.index + 1}] {cell.name}: {cell.status} in {time.monotonic() - started:.1f}s | "
+        f"packets {packets} gaps {gaps}"
+    )
+    return cell
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run an experiment matrix concurrently")
+    parser.add_argument("--duration", type=int, nargs="+", default=[60])
+    parser.add_argument("--batch_size", type=int, nargs="+", default=[0])
+    parser.add_argument("--interval", type=float, nargs="+", default=[1.0])
+    parser.add_argument("--clients", type=int, nargs="+", default=[1])
+    parser.add_argument(
+        "--impair",
+        nargs="+",
+        default=[NO_IMPAIRMENT],
+        choices=[NO_IMPAIRMENT] + list(PROFILES),
+        help="ImpairProxy profiles; none sends straight to the server"
+    )
+    parser.add_argument(
+        "--parallel",
+        type=int,
+        default=max(1, (os.cpu_count() or 2) // 2),
+        help="Cells run at the same time"
+    )
+    parser.add_argument(
+        "--base_port",
+        type=int,
+        default=DEFAULT_BASE_PORT,
+        help="Cell i uses UDP ports base + 2i (server) and base + 2i + 1 (proxy)"
+    )
+    parser.add_argument(
+        "--output_dir",
+        help="Sweep directory (default Tests/results/sweep_<timestamp>)"
+    )
+    parser.add_argument("--log-level", dest="log_level", help="Forwarded to server, proxy and clients")
+    args = parser.parse_args()
+
+    if min(args.interval) <= 0 or min(args.duration) <= 0 or min(args.clients) < 1:
+        parser.error("--duration, --interval and --clients must be positive")
+
+    out_dir = args.output_dir or os.path.join(
+        PROJECT_ROOT, "Tests", "results", f"sweep_{time.strftime('%Y%m%d_%H%M%S')}"
+    )
+    os.makedirs(out_dir, exist_ok=True)
+    log_args = ["--log-level", args.log_level] if args.log_level else []
+
+    cells = [
+        Cell(index, duration, batch_size, interval, clients, impair, args.base_port + 2 * index, out_dir)
+        for index, (duration, batch_size, interval, clients, impair) in enumerate(itertools.product(
+            args.duration, args.batch_size, args.interval, args.clients, args.impair
+        ))
+    ]
+    parallel = max(1, min(args.parallel, len(cells)))
+    safe_print(f"Running {len(cells)} cells, {parallel} at a time, into {out_dir}")
+
+    started = time.monotonic()
+    with ThreadPoolExecutor(max_workers=parallel) as pool:
+        list(pool.map(lambda cell: run_cell(cell, log_args), cells))
+
+    results_path = os.path.join(out_dir, "experiment_results.csv")
+    with open(results_path, "w", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=METRIC_FIELDS + PARAMETER_FIELDS)
+        writer.writeheader()
+        for cell in cells:
+            writer.writerow(cell.row())
+
+    failed = sum(cell.status != "ok" for cell in cells)
+    safe_print(
+        f"\nSweep finished in {time.monotonic() - started:.1f}s "
+        f"({failed} of {len(cells)} cells failed). Results: {results_path}"
+    )
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,10 +1,16 @@
 import subprocess
 import sys
+import tempfile
 import threading
-import time
 import os
 import socket
 
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, PROJECT_ROOT)
+
+from Common.live import METRICS_PORT, SNAPSHOT_INTERVAL
+from Common.readiness import wait_ready
+
 # Get LAN IP
 def get_lan_ip():
     try:
@@ -41,24 +47,43 @@ def stream_process(proc, prefix):
             safe_print(f"{prefix} {clean}")
 
 
-#  Locate Client/Server 
-def find_file(filename, search_dir):
-    for root, _, files in os.walk(search_dir):
-        if filename in files:
-            return os.path.join(root, filename)
-    return None
-
-
 #  MAIN PROGRAM
 if len(sys.argv) < 5:
-    print("Usage: python TestRunner.py <server_ip> <duration> <batch_size> <num_clients> [--interval N]")
+    print("Usage: python TestRunner.py <server_ip> <duration> <batch_size> <num_clients> [--interval N] [--adaptive] [--port N] [--impair PROFILE] [--live_metrics] [--log-level LEVEL] [--quiet]")
     sys.exit(1)
 
 INTERVAL = 1
 if "--interval" in sys.argv:
     idx = sys.argv.index("--interval")
-    INTERVAL = int(sys.argv[idx + 1])
-
+    INTERVAL = float(sys.argv[idx + 1])
+
+# Client-side adaptive interval / batch size
+CLIENT_ARGS = ["--adaptive"] if "--adaptive" in sys.argv else []
+
+# Server port; with --impair the clients go through ImpairProxy on PORT + 1
+PORT = 9999
+if "--port" in sys.argv:
+    idx = sys.argv.index("--port")
+    PORT = int(sys.argv[idx + 1])
+
+IMPAIR = None
+if "--impair" in sys.argv:
+    idx = sys.argv.index("--impair")
+    IMPAIR = sys.argv[idx + 1]
+CLIENT_PORT = PORT + 1 if IMPAIR else PORT
+
+# Server live metrics endpoint and metrics_live.json snapshots (off by default)
+SERVER_ARGS = []
+if "--live_metrics" in sys.argv:
+    SERVER_ARGS += ["--metrics_port", str(METRICS_PORT), "--snapshot_interval", str(SNAPSHOT_INTERVAL)]
+
+# Logging options forwarded to server and clients
+LOG_ARGS = []
+if "--log-level" in sys.argv:
+    idx = sys.argv.index("--log-level")
+    LOG_ARGS += ["--log-level", sys.argv[idx + 1]]
+if "--quiet" in sys.argv:
+    LOG_ARGS.append("--quiet")
 
 SERVER_IP = sys.argv[1]
 DURATION = int(sys.argv[2])
@@ -67,20 +92,24 @@ NUM_CLIENTS = int(sys.argv[4])
 
 PYTHON = sys.executable
 
-base_dir = os.path.dirname(os.path.abspath(__file__))
-project_dir = os.path.dirname(base_dir)
+server_path = os.path.join(PROJECT_ROOT, "Server", "Server.py")
+client_path = os.path.join(PROJECT_ROOT, "Client", "Client.py")
+proxy_path = os.path.join(PROJECT_ROOT, "Automation", "ImpairProxy.py")
 
-server_path = find_file("Server.py", project_dir)
-client_path = find_file("Client.py", project_dir)
-
-if not server_path or not client_path:
-    safe_print("ERROR: Could not find Server.py or Client.py!")
-    sys.exit(1)
+# Server and proxy create these once their sockets are bound
+ready_dir = tempfile.TemporaryDirectory(prefix="ttp_ready_")
+server_ready = os.path.join(ready_dir.name, "server")
+proxy_ready = os.path.join(ready_dir.name, "proxy")
 
 #  Start Server 
 safe_print("Starting server...")
 server_proc = subprocess.Popen(
-    [PYTHON, "-u", server_path, "--duration", str(DURATION)],
+    [
+        PYTHON, "-u", server_path,
+        "--duration", str(DURATION),
+        "--port", str(PORT),
+        "--ready_file", server_ready
+    ] + SERVER_ARGS + LOG_ARGS,
     stdout=subprocess.PIPE,
     stderr=subprocess.STDOUT,
     text=True,
@@ -94,7 +123,38 @@ threading.Thread(
     daemon=True
 ).start()
 
-time.sleep(0.4)
+# Start the impairment proxy in front of the server
+proxy_proc = None
+if IMPAIR:
+    safe_print(f"Starting impairment proxy ({IMPAIR}) on port {CLIENT_PORT}...")
+    proxy_proc = subprocess.Popen(
+        [
+            PYTHON, "-u", proxy_path,
+            "--listen_port", str(CLIENT_PORT),
+            "--server_ip", "127.0.0.1",
+            "--server_port", str(PORT),
+            "--profile", IMPAIR,
+            "--duration", str(DURATION + 5),
+            "--ready_file", proxy_ready
+        ] + LOG_ARGS,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.STDOUT,
+        text=True,
+        bufsize=1,
+    )
+    threading.Thread(
+        target=stream_process,
+        args=(proxy_proc, "[PROXY]"),
+        daemon=True
+    ).start()
+
+if not wait_ready(server_ready, server_proc) or (proxy_proc and not wait_ready(proxy_ready, proxy_proc)):
+    safe_print("ERROR: Server or proxy did not come up (port in use?)")
+    server_proc.terminate()
+    if proxy_proc:
+        proxy_proc.terminate()
+    sys.exit(1)
+ready_dir.cleanup()
 
 # Start Clients  
 safe_print(f"Starting {NUM_CLIENTS} client(s)...")
@@ -105,11 +165,12 @@ for cid in range(1, NUM_CLIENTS + 1):
         [
             PYTHON, "-u", client_path,
             "--server_ip", SERVER_IP,
+            "--server_port", str(CLIENT_PORT),
             "--duration", str(DURATION),
             "--batch_size", str(BATCH_SIZE),
             "--device_id", str(cid),
             "--interval", str(INTERVAL)
-        ],
+        ] + CLIENT_ARGS + LOG_ARGS,
         stdout=subprocess.PIPE,
         stderr=subprocess.STDOUT,
         text=True,
@@ -131,4 +192,8 @@ for proc in client_procs:
 
 server_proc.wait()
 
+if proxy_proc:
+    proxy_proc.terminate()
+    proxy_proc.wait()
+
 safe_print("\nTest completed.\n")
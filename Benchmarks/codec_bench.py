@@ -0,0 +1,111 @@
+"""
+Packet encode/decode throughput in packets per second: the baseline
+client and server code (struct.pack/concat/slice, patched copy + byte
+sum, ASCII split), inlined here, against the current codecs in
+Common/protocol.py and Common/payload.py with the default v2 header.
+The baseline only spoke ASCII, so its columns always handle the ASCII
+packet carrying the same readings. Decoding is measured on bytes
+(asyncio mode), on a memoryview over a receive-pool buffer, and on the
+copy out of the pool that blocking mode actually decodes
+(BatchReceiver.packet).
+
+Usage: python Benchmarks/codec_bench.py [iterations]
+"""
+import os
+import struct
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from Common.payload import ENC_ASCII, ENC_INT16, encode_readings, decode_readings
+from Common.protocol import (
+    HEADER_FORMAT, HEADER_SIZE, MAX_DATAGRAM, MSG_DATA, VERSION_CRC, VERSION_SUM,
+    PacketEncoder, decode_header, verify_checksum
+)
+
+ROUNDS = 15
+READINGS = [23.9, 21.3, 33.2, 27.5, 20.1, 34.8, 22.2, 29.9, 31.0, 25.6]
+
+
+def legacy_encode(seq, payload):
+    """Baseline Client.send_packet: pack, concat, byte sum, splice."""
+    header = struct.pack(HEADER_FORMAT, seq, 1, MSG_DATA, 1000, 0, 0, VERSION_SUM)
+    packet = header + payload.encode()
+    checksum = sum(packet) % 65536
+    return packet[:9] + struct.pack("!H", checksum) + packet[11:]
+
+
+def legacy_decode(data):
+    """Baseline Server.py receive path, minus the CSV write."""
+    seq, device_id, msg_type, timestamp_ms, _, checksum, version = struct.unpack(
+        HEADER_FORMAT, data[:HEADER_SIZE]
+    )
+    temp_data = data[:9] + b"\x00\x00" + data[11:]
+    integrity = sum(temp_data) % 65536 == checksum
+    payload = data[HEADER_SIZE:].decode(errors="ignore")
+    values = payload.split(",") if "," in payload else [payload]
+    return integrity, values
+
+
+def fast_decode(data):
+    seq, device_id, msg_type, timestamp_ms, encoding, checksum, version = decode_header(data)
+    verify_checksum(data, checksum, version)
+    return decode_readings(encoding, data[HEADER_SIZE:])
+
+
+def packets_per_second(func, iterations):
+    # Best of many short runs: single runs vary by 10-20% on a busy host
+    best = float("inf")
+    for _ in range(ROUNDS):
+        start = time.perf_counter()
+        for i in range(iterations):
+            func(i & 0xFFFF)
+        best = min(best, time.perf_counter() - start)
+    return iterations / best
+
+
+def main():
+    iterations = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+
+    print(
+        f"{'case':<26} | {'legacy pkt/s':>14} | {'codec pkt/s':>14} | "
+        f"{'codec (view) pkt/s':>18} | {'codec (pool copy) pkt/s':>23}"
+    )
+    for label, encoding, readings in [
+        ("ascii, 1 reading", ENC_ASCII, READINGS[:1]),
+        ("ascii, 10 readings", ENC_ASCII, READINGS),
+        ("int16, 10 readings", ENC_INT16, READINGS),
+    ]:
+        payload = encode_readings(encoding, readings)
+        encoder = PacketEncoder(1, VERSION_CRC, encoding)
+        packet = encoder.encode(MSG_DATA, 1, 1000, payload)
+
+        legacy_payload = ",".join(str(r) for r in readings)
+        legacy_packet = legacy_encode(1, legacy_payload)
+        assert legacy_packet == PacketEncoder(1, VERSION_SUM).encode(
+            MSG_DATA, 1, 1000, legacy_payload.encode()
+        )
+        integrity, values = legacy_decode(legacy_packet)
+        assert integrity and [float(v) for v in values] == readings
+        assert [float(v) for v in fast_decode(memoryview(packet))] == readings
+        pool = memoryview(bytearray(MAX_DATAGRAM))
+        pool[:len(packet)] = packet
+        size = len(packet)
+
+        legacy_enc = packets_per_second(lambda seq: legacy_encode(seq, legacy_payload), iterations)
+        fast_enc = packets_per_second(lambda seq: encoder.encode(MSG_DATA, seq, 1000, payload), iterations)
+        legacy_dec = packets_per_second(lambda seq: legacy_decode(legacy_packet), iterations)
+        fast_dec = packets_per_second(lambda seq: fast_decode(packet), iterations)
+        view_dec = packets_per_second(lambda seq: fast_decode(pool[:size]), iterations)
+        copy_dec = packets_per_second(lambda seq: fast_decode(pool[:size].tobytes()), iterations)
+
+        print(f"{'encode ' + label:<26} | {legacy_enc:>14,.0f} | {fast_enc:>14,.0f} | {'':>18} | {'':>23}")
+        print(
+            f"{'decode ' + label:<26} | {legacy_dec:>14,.0f} | {fast_dec:>14,.0f} | "
+            f"{view_dec:>18,.0f} | {copy_dec:>23,.0f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,322 @@
+"""
+Server ingest benchmark: synthetic fleets pushed through the real
+ServerState.process_packet (and the real sink) with no network, root or
+real-time pacing.
+
+Each case pre-encodes a fleet's packets (devices x readings per packet x
+payload encoding), then times every packet through the server path,
+either handed over directly or through an AF_UNIX datagram socketpair
+drained by the blocking server's BatchReceiver. The measured per-packet
+service times are then replayed through a FIFO model of the socket
+receive queue at each offered send rate, which gives the queueing
+latency and drop rate that rate would see without waiting for it.
+
+Results go to a JSON file stamped with a schema version and the git
+commit, one record per (devices, batch, encoding, rate); --compare
+prints the change against an earlier file.
+
+Usage: python Benchmarks/ingest_bench.py [--quick] [--compare OLD.json]
+"""
+import argparse
+import collections
+import json
+import logging
+import os
+import platform
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, PROJECT_ROOT)
+sys.path.insert(0, os.path.join(PROJECT_ROOT, "Server"))
+
+from Server import BatchReceiver, ServerState
+from Common.histogram import LogHistogram
+from Common.payload import ENCODINGS, ENC_TIMED, encode_readings
+from Common.protocol import MSG_INIT, MSG_DATA, VERSION_WIDE, PacketEncoder
+from Common.sinks import SINKS, create_sink
+
+SCHEMA_VERSION = 1
+RESULTS_DIR = os.path.join(PROJECT_ROOT, "Benchmarks", "results")
+
+DEVICES = (1, 100, 1000)
+BATCHES = (1, 10)
+RATES = (1000, 10000, 50000)
+
+DEFAULT_PACKETS = 20000
+DEFAULT_RCVBUF = 4 * 1024 * 1024
+# Approximate kernel accounting per queued datagram (skb truesize) on top
+# of the payload; Linux also doubles the requested SO_RCVBUF.
+DATAGRAM_OVERHEAD = 768
+RECV_BATCH = 64
+
+
+def git_commit():
+    """(commit, dirty) of the working tree, or (None, None) outside git."""
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "HEAD"], cwd=PROJECT_ROOT,
+            capture_output=True, text=True, check=True
+        ).stdout.strip()
+        status = subprocess.run(
+            ["git", "status", "--porcelain", "--untracked-files=no"], cwd=PROJECT_ROOT,
+            capture_output=True, text=True, check=True
+        ).stdout
+        return commit, bool(status.strip())
+    except (OSError, subprocess.CalledProcessError):
+        return None, None
+
+
+def make_traffic(devices, batch, encoding, packets, seed):
+    """INIT packets for every device, then DATA packets round-robin."""
+    rng = random.Random(seed)
+    if batch > 1:
+        encoding |= ENC_TIMED
+    encoders = [PacketEncoder(device_id, VERSION_WIDE, encoding) for device_id in range(1, devices + 1)]
+    inits = [encoder.encode(MSG_INIT, 0, 0) for encoder in encoders]
+
+    data = []
+    seqs = [1] * devices
+    for i in range(packets):
+        index = i % devices
+        readings = [round(rng.uniform(20, 35), 1) for _ in range(batch)]
+        ages = [(batch - 1 - k) * 100 for k in range(batch)] if batch > 1 else None
+        data.append(encoders[index].encode(
+            MSG_DATA, seqs[index], i, encode_readings(encoding, readings, ages)
+        ))
+        seqs[index] += 1
+    return inits, data
+
+
+def run_direct(state, packets, services):
+    """Hand each packet straight to process_packet."""
+    for i, packet in enumerate(packets):
+        start = time.perf_counter_ns()
+        state.process_packet(packet, i / 1000.0)
+        services.append(time.perf_counter_ns() - start)
+
+
+def run_socketpair(state, packets, services):
+    """
+    Send RECV_BATCH packets at a time into a datagram socketpair and let
+    BatchReceiver drain them; each packet is charged its share of the
+    drain plus its own processing.
+    """
+    sender, receiver_socket = socket.socketpair(socket.AF_UNIX, socket.SOCK_DGRAM)
+    receiver_socket.setblocking(False)
+    receiver = BatchReceiver(receiver_socket, RECV_BATCH, state)
+    try:
+        for first in range(0, len(packets), RECV_BATCH):
+            for packet in packets[first:first + RECV_BATCH]:
+                sender.send(packet)
+            start = time.perf_counter_ns()
+            count = receiver.drain()
+            drain_share = (time.perf_counter_ns() - start) // max(count, 1)
+            for i in range(count):
+                start = time.perf_counter_ns()
+                state.process_packet(receiver.packet(i), (first + i) / 1000.0)
+                services.append(time.perf_counter_ns() - start + drain_share)
+    finally:
+        sender.close()
+        receiver_socket.close()
+
+
+TRANSPORTS = {
+    "direct": run_direct,
+    "socketpair": run_socketpair,
+}
+
+
+def simulate_queue(services, sizes, rate, capacity):
+    """
+    Replay service times (ns) behind a FIFO receive queue fed at rate
+    packets/s. A datagram is dropped if its bytes do not fit in capacity;
+    it leaves the queue when the server starts on it. Returns (drop rate,
+    sojourn-time histogram in seconds).
+    """
+    interval = 1e9 / rate
+    queued = collections.deque()
+    queued_bytes = 0
+    free_at = 0.0
+    drops = 0
+    sojourn = LogHistogram()
+
+    for i, service in enumerate(services):
+        now = i * interval
+        while queued and queued[0][0] <= now:
+            queued_bytes -= queued.popleft()[1]
+        charge = sizes[i] + DATAGRAM_OVERHEAD
+        if queued_bytes + charge > capacity:
+            drops += 1
+            continue
+        start = max(now, free_at)
+        free_at = start + service
+        queued.append((start, charge))
+        queued_bytes += charge
+        sojourn.record((free_at - now) / 1e9)
+
+    return drops / len(services), sojourn
+
+
+def run_case(args, devices, batch, encoding_name, workdir):
+    inits, packets = make_traffic(devices, batch, ENCODINGS[encoding_name], args.packets, args.seed)
+    sink = create_sink(args.sink, os.path.join(workdir, "bench" + SINKS[args.sink].extension))
+    state = ServerState(sink, status_interval=float("inf"))
+    for packet in inits:
+        state.process_packet(packet, 0.0)
+
+    services = []
+    cpu_start = time.process_time()
+    TRANSPORTS[args.transport](state, packets, services)
+    cpu_time = time.process_time() - cpu_start
+    sink.close()
+
+    processing = LogHistogram()
+    for service in services:
+        processing.record(service / 1e9)
+    busy = sum(services) / 1e9
+    sizes = [len(packet) for packet in packets]
+
+    base = {
+        "devices": devices,
+        "batch": batch,
+        "encoding": encoding_name,
+        "transport": args.transport,
+        "sink": args.sink,
+        "packets": len(services),
+        "bytes_per_packet": sum(sizes) / len(sizes),
+        "packets_per_second": len(services) / busy,
+        "readings_per_second": state.total_readings / busy,
+        "cpu_us_per_packet": cpu_time / len(services) * 1e6,
+        "p50_processing_us": processing.percentile(50) * 1e6,
+        "p99_processing_us": processing.percentile(99) * 1e6,
+    }
+
+    records = []
+    for rate in args.rates:
+        drop_rate, sojourn = simulate_queue(services, sizes, rate, 2 * args.rcvbuf)
+        records.append(dict(
+            base,
+            rate=rate,
+            drop_rate=drop_rate,
+            p99_latency_us=sojourn.percentile(99) * 1e6,
+        ))
+    return records
+
+
+def case_key(record):
+    return (record["devices"], record["batch"], record["encoding"], record["transport"],
+            record["sink"], record["rate"])
+
+
+def print_records(records):
+    print(f"{'devices':>7} {'batch':>5} {'encoding':>8} {'rate':>7} | {'pkt/s':>9} {'readings/s':>10} "
+          f"{'cpu us/pkt':>10} {'p99 proc us':>11} | {'p99 lat us':>11} {'drops':>7}")
+    for r in records:
+        print(f"{r['devices']:>7} {r['batch']:>5} {r['encoding']:>8} {r['rate']:>7} | "
+              f"{r['packets_per_second']:>9,.0f} {r['readings_per_second']:>10,.0f} "
+              f"{r['cpu_us_per_packet']:>10.1f} {r['p99_processing_us']:>11.1f} | "
+              f"{r['p99_latency_us']:>11.1f} {r['drop_rate']:>7.2%}", flush=True)
+
+
+def compare(records, baseline_path):
+    with open(baseline_path) as f:
+        baseline = json.load(f)
+    if baseline.get("schema_version") != SCHEMA_VERSION:
+        print(f"\n{baseline_path} uses schema {baseline.get('schema_version')}, "
+              f"expected {SCHEMA_VERSION}; not comparing")
+        return
+    old = {case_key(r): r for r in baseline["results"]}
+
+    print(f"\n Change against {baseline.get('commit') or baseline_path}")
+    print(f"{'devices':>7} {'batch':>5} {'encoding':>8} {'rate':>7} | {'pkt/s':>8} "
+          f"{'p99 proc':>8} {'drops':>9}")
+    matched = 0
+    for r in records:
+        before = old.get(case_key(r))
+        if before is None:
+            continue
+        matched += 1
+        throughput = r["packets_per_second"] / before["packets_per_second"] - 1
+        p99 = r["p99_processing_us"] / before["p99_processing_us"] - 1
+        drops = r["drop_rate"] - before["drop_rate"]
+        print(f"{r['devices']:>7} {r['batch']:>5} {r['encoding']:>8} {r['rate']:>7} | "
+              f"{throughput:>+8.1%} {p99:>+8.1%} {drops:>+9.2%}")
+    if not matched:
+        print("No cases in common (different sweep, transport or sink)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Server ingest throughput/latency benchmark")
+    parser.add_argument("--devices", type=int, nargs="+", default=list(DEVICES))
+    parser.add_argument("--batch", type=int, nargs="+", default=list(BATCHES),
+                        help="Readings per packet")
+    parser.add_argument("--encodings", nargs="+", default=list(ENCODINGS), choices=list(ENCODINGS))
+    parser.add_argument("--rates", type=float, nargs="+", default=list(RATES),
+                        help="Offered send rates (packets/s) replayed through the queue model")
+    parser.add_argument("--packets", type=int, default=DEFAULT_PACKETS, help="DATA packets per case")
+    parser.add_argument("--transport", default="direct", choices=list(TRANSPORTS))
+    parser.add_argument("--sink", default="csv", choices=sorted(SINKS))
+    parser.add_argument("--rcvbuf", type=int, default=DEFAULT_RCVBUF,
+                        help="Modelled SO_RCVBUF request in bytes")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--quick", action="store_true",
+                        help="Small smoke run: 2000 packets, 1 and 100 devices, ascii and int16")
+    parser.add_argument("--output",
+                        help="JSON path (default Benchmarks/results/ingest_<commit>.json, git-ignored)")
+    parser.add_argument("--compare", help="Earlier result file to diff against")
+    args = parser.parse_args()
+
+    if args.quick:
+        args.packets = 2000
+        args.devices = [1, 100]
+        args.encodings = ["ascii", "int16"]
+
+    # INIT and checksum messages would otherwise dominate the output
+    logging.getLogger("server").setLevel(logging.WARNING)
+
+    commit, dirty = git_commit()
+    records = []
+    with tempfile.TemporaryDirectory() as workdir:
+        for devices in args.devices:
+            for batch in args.batch:
+                for encoding_name in args.encodings:
+                    records.extend(run_case(args, devices, batch, encoding_name, workdir))
+    print_records(records)
+
+    output = args.output
+    if output is None:
+        os.makedirs(RESULTS_DIR, exist_ok=True)
+        output = os.path.join(RESULTS_DIR, f"ingest_{(commit or 'nogit')[:12]}{'-dirty' if dirty else ''}.json")
+    with open(output, "w") as f:
+        json.dump({
+            "schema_version": SCHEMA_VERSION,
+            "benchmark": "ingest",
+            "commit": commit,
+            "dirty": dirty,
+            "created": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "parameters": {
+                "packets": args.packets,
+                "transport": args.transport,
+                "sink": args.sink,
+                "rcvbuf": args.rcvbuf,
+                "seed": args.seed,
+                "datagram_overhead": DATAGRAM_OVERHEAD,
+            },
+            "results": records,
+        }, f, indent=2)
+    print(f"\nResults written to {output}")
+
+    if args.compare:
+        compare(records, args.compare)
+
+
+if __name__ == "__main__":
+    main()
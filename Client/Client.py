@@ -1,56 +1,145 @@
 import socket
-import struct
 import time
 import random
 import argparse
+import logging
+import os
 import sys
 
-# Constants 
-HEADER_FORMAT = "!HBBIBHB"
-MSG_INIT = 1
-MSG_DATA = 2
-MSG_HEARTBEAT = 3
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from Common.payload import (
+    ENCODINGS, ENC_ASCII, ENC_TIMED, MAX_AGE_MS, encode_readings, reading_size
+)
+from Common.logs import add_logging_args, setup_logging
+from Common.protocol import (
+    MSG_INIT, MSG_DATA, MSG_HEARTBEAT,
+    MAX_DATAGRAM, SUPPORTED_VERSIONS,
+    PacketEncoder, header_size, max_device_id, version_for
+)
 
-VERSION = 1
+# Constants 
+SERVER_PORT = 9999
 HEARTBEAT_INTERVAL = 5
 
+# Largest UDP payload that avoids IP fragmentation on a 1500-byte MTU
+UDP_MTU_PAYLOAD = 1472
+DEFAULT_MAX_LINGER = 10.0
+
+# Adaptive mode: healthy heartbeat replies needed before stepping back
+# towards the configured interval / batch size
+ADAPTIVE_RECOVERY_ACKS = 3
+
 INIT_TIMEOUT = 2
 INIT_MAX_RETRIES = 5
 
-# Checksum 
-def calculate_checksum(data):
-    return sum(data) % 65536
-
 # Arguments 
 parser = argparse.ArgumentParser()
 parser.add_argument("--server_ip", required=True)
+parser.add_argument("--server_port", type=int, default=SERVER_PORT)
 parser.add_argument("--duration", type=int, default=60)
 parser.add_argument("--batch_size", type=int, default=0)
+parser.add_argument(
+    "--max_payload",
+    type=int,
+    default=0,
+    help="Flush a batch before its payload exceeds this many bytes "
+         "(default and upper bound: what fits the server's receive buffer)"
+)
+parser.add_argument(
+    "--max_linger",
+    type=float,
+    default=DEFAULT_MAX_LINGER,
+    help="Flush a batch before its oldest reading is older than this "
+         "many seconds (0 = no limit)"
+)
 parser.add_argument("--device_id", type=int, default=1)
 parser.add_argument(
     "--interval",
-    type=int,
+    type=float,
     default=1,
-    choices=[1, 5, 30],
-    help="Reporting interval in seconds"
+    help="Reporting interval in seconds, fractions allowed (0.01 = 10 ms)"
 )
+parser.add_argument(
+    "--adaptive",
+    action="store_true",
+    help="Grow the batch size, then the interval, when the server reports "
+         "load or heartbeats go unanswered; shrink back when healthy"
+)
+parser.add_argument(
+    "--max_batch_size",
+    type=int,
+    default=32,
+    help="Largest batch size adaptive mode will use"
+)
+parser.add_argument(
+    "--max_interval",
+    type=float,
+    default=30,
+    help="Longest interval in seconds adaptive mode will use"
+)
+parser.add_argument(
+    "--encoding",
+    default="ascii",
+    choices=list(ENCODINGS),
+    help="Requested payload encoding (falls back to ascii if the server declines)"
+)
+parser.add_argument(
+    "--no_reading_timestamps",
+    action="store_true",
+    help="Send batches with only the packet timestamp instead of one per reading"
+)
+parser.add_argument(
+    "--protocol_version",
+    type=int,
+    choices=SUPPORTED_VERSIONS,
+    help="1 = byte-sum checksum, 2 = folded CRC-32 checksum, "
+         "3 = CRC with 32-bit seq and 16-bit device id "
+         "(default: 2, or 3 for a --device_id above 255)"
+)
+add_logging_args(parser)
 args = parser.parse_args()
+if args.protocol_version is None:
+    args.protocol_version = version_for(args.device_id)
+
+log = setup_logging(args, "client")
+
+if args.interval <= 0:
+    parser.error("--interval must be positive")
+
+if not 0 <= args.device_id <= max_device_id(args.protocol_version):
+    parser.error(
+        f"--device_id must be 0-{max_device_id(args.protocol_version)} "
+        f"for protocol version {args.protocol_version}"
+    )
 
 SERVER_IP = args.server_ip
 DEVICE_ID = args.device_id
 DURATION = args.duration
 BATCH_SIZE = max(0, args.batch_size)
-SEND_INTERVAL = args.interval 
+SEND_INTERVAL = args.interval
+ENCODING = ENCODINGS[args.encoding]
+VERSION = args.protocol_version
+
+# A larger datagram would be truncated by the server's receive buffer
+PAYLOAD_LIMIT = min(MAX_DATAGRAM, UDP_MTU_PAYLOAD) - header_size(VERSION)
+MAX_PAYLOAD = min(args.max_payload, PAYLOAD_LIMIT) if args.max_payload > 0 else PAYLOAD_LIMIT
+MAX_LINGER = max(0.0, args.max_linger)
+
+# Batches carry per-reading sample times unless turned off. Ages are
+# sized for twice the linger limit to leave room for a late flush.
+if (BATCH_SIZE > 0 or args.adaptive) and not args.no_reading_timestamps:
+    ENCODING |= ENC_TIMED
+MAX_AGE = int(MAX_LINGER * 2000) if MAX_LINGER > 0 else MAX_AGE_MS
 
 # Socket 
 sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
-server_addr = (SERVER_IP, 9999)
+server_addr = (SERVER_IP, args.server_port)
 sock.settimeout(INIT_TIMEOUT)
 
-print(
-    f"Connecting to server {SERVER_IP}:9999 "
-    f"(interval={SEND_INTERVAL}s)",
-    flush=True
+log.info(
+    f"Connecting to server {SERVER_IP}:{args.server_port} "
+    f"(interval={SEND_INTERVAL:g}s{', adaptive' if args.adaptive else ''})"
 )
 
 # Relative Timestamp 
@@ -59,109 +148,292 @@ START_TIME = time.time()
 def get_timestamp_ms():
     return int((time.time() - START_TIME) * 1000)
 
+# Packet Encoder 
+encoder = PacketEncoder(DEVICE_ID, VERSION, ENCODING)
+
 # INIT Handshake 
 seq = 0
 retry = 0
 
 while retry < INIT_MAX_RETRIES:
-    timestamp_ms = get_timestamp_ms()
-
-    init = struct.pack(
-        HEADER_FORMAT,
-        seq, DEVICE_ID,
-        MSG_INIT, timestamp_ms,
-        0, 0, VERSION
-    )
+    init = encoder.encode(MSG_INIT, seq, get_timestamp_ms())
 
-    checksum = calculate_checksum(init)
-    init = init[:9] + struct.pack("!H", checksum) + init[11:]
-
-    print(f"Sending INIT attempt {retry + 1}", flush=True)
+    log.info(f"Sending INIT attempt {retry + 1}")
     sock.sendto(init, server_addr)
 
     try:
         ack1, _ = sock.recvfrom(1024)
-        if ack1 == b"ACK_INIT":
+        if ack1.startswith(b"ACK_INIT"):
+            # Servers without encoding support reply with a bare ACK_INIT
+            ENCODING = ack1[8] if len(ack1) > 8 else ENC_ASCII
+            encoder.encoding = ENCODING
             ack2, _ = sock.recvfrom(1024)
             if ack2 == b"ACK_READY":
-                print("Server READY — starting data\n", flush=True)
+                log.info(
+                    f"Server READY — starting data (encoding {ENCODING & ~ENC_TIMED}"
+                    f"{', per-reading timestamps' if ENCODING & ENC_TIMED else ''})\n"
+                )
                 seq += 1
                 break
     except socket.timeout:
-        print("No ACK, retrying...", flush=True)
+        log.warning("No ACK, retrying...")
         retry += 1
 
 if retry == INIT_MAX_RETRIES:
-    print("INIT handshake FAILED — exiting.", flush=True)
+    log.error("INIT handshake FAILED — exiting.")
     sock.close()
     sys.exit(1)
 
 # Send Helpers 
-def send_packet(payload):
-    global seq
-    timestamp_ms = get_timestamp_ms()
-
-    header = struct.pack(
-        HEADER_FORMAT,
-        seq, DEVICE_ID,
-        MSG_DATA, timestamp_ms,
-        0, 0, VERSION
+TRACE = log.isEnabledFor(logging.DEBUG)
+readings_sent = 0
+
+def send_packet(readings, ages=None):
+    global seq, readings_sent
+    if ages is None and ENCODING & ENC_TIMED:
+        ages = [0] * len(readings)
+    packet = encoder.encode(
+        MSG_DATA, seq, get_timestamp_ms(),
+        encode_readings(ENCODING, readings, ages)
     )
-
-    packet = header + payload.encode()
-    checksum = calculate_checksum(packet)
-    packet = packet[:9] + struct.pack("!H", checksum) + packet[11:]
-
     sock.sendto(packet, server_addr)
     seq += 1
+    readings_sent += len(readings)
 
 def send_single():
     temp = round(random.uniform(20, 35), 1)
-    send_packet(str(temp))
-    print(f"Sent temp {temp} (packet {seq-1})", flush=True)
-
-def send_batch(buffer):
-    payload = ",".join(buffer)
-    send_packet(payload)
-    print(f"Sent batch of {len(buffer)} readings (packet {seq-1})", flush=True)
-
-# Main Loop 
-start = time.time()
-last_heartbeat = start
-buffer = []
-
-while time.time() - start < DURATION:
-
-    now = time.time()
-
-    if now - last_heartbeat >= HEARTBEAT_INTERVAL:
-        timestamp_ms = get_timestamp_ms()
-        hb = struct.pack(
-            HEADER_FORMAT,
-            seq, DEVICE_ID,
-            MSG_HEARTBEAT, timestamp_ms,
-            0, 0, VERSION
+    send_packet([temp])
+    if TRACE:
+        log.debug(f"Sent temp {temp} (packet {seq-1})")
+
+def send_batch(buffer, ages=None):
+    send_packet(buffer, ages)
+    if TRACE:
+        log.debug(f"Sent batch of {len(buffer)} readings (packet {seq-1})")
+
+# Batching 
+class Batch:
+    """
+    Readings waiting to be sent. A batch is flushed on whichever limit it
+    hits first: reading count, payload bytes or the age of its oldest
+    reading. Tracks how long each reading was held before sending.
+    """
+
+    def __init__(self):
+        self.readings = []
+        self.sampled = []
+        self.payload_size = 0
+
+        self.flushes = {"count": 0, "bytes": 0, "linger": 0, "end": 0}
+        self.held = 0
+        self.hold_total = 0.0
+        self.hold_max = 0.0
+
+    def __len__(self):
+        return len(self.readings)
+
+    def fits(self, reading):
+        previous = self.readings[-1] if self.readings else None
+        size = reading_size(ENCODING, reading, previous, MAX_AGE)
+        return self.payload_size + size <= MAX_PAYLOAD
+
+    def add(self, reading, now):
+        previous = self.readings[-1] if self.readings else None
+        self.payload_size += reading_size(ENCODING, reading, previous, MAX_AGE)
+        self.readings.append(reading)
+        self.sampled.append(now)
+
+    def deadline(self):
+        if not self.readings or MAX_LINGER <= 0:
+            return float("inf")
+        return self.sampled[0] + MAX_LINGER
+
+    def flush(self, now, reason):
+        if not self.readings:
+            return
+        ages = [min(int((now - sampled) * 1000), MAX_AGE) for sampled in self.sampled]
+        send_batch(self.readings, ages if ENCODING & ENC_TIMED else None)
+
+        for sampled in self.sampled:
+            hold = now - sampled
+            self.hold_total += hold
+            if hold > self.hold_max:
+                self.hold_max = hold
+        self.held += len(self.sampled)
+        self.flushes[reason] += 1
+
+        self.readings = []
+        self.sampled = []
+        self.payload_size = 0
+
+    def summary(self):
+        packets = sum(self.flushes.values())
+        if not packets:
+            return None
+        reasons = ", ".join(f"{name} {count}" for name, count in self.flushes.items() if count)
+        return (
+            f"Batching | {self.held / packets:.1f} readings/packet | "
+            f"reading hold mean {self.hold_total / self.held * 1000:.1f} ms, "
+            f"max {self.hold_max * 1000:.1f} ms | flushed on {reasons}"
         )
-        checksum = calculate_checksum(hb)
-        hb = hb[:9] + struct.pack("!H", checksum) + hb[11:]
 
-        sock.sendto(hb, server_addr)
-        print("Heartbeat sent", flush=True)
-        last_heartbeat = now
-
-    if BATCH_SIZE == 0:
-        send_single()
-    else:
-        temp = round(random.uniform(20, 35), 1)
-        buffer.append(str(temp))
-        if len(buffer) >= BATCH_SIZE:
-            send_batch(buffer)
-            buffer.clear()
+def report_status(now):
+    global last_status, status_seq, status_readings
+    elapsed = now - last_status
+    if args.status_interval <= 0 or elapsed < args.status_interval:
+        return
+    log.info(
+        f"Status | {(seq - status_seq) / elapsed:.1f} pkt/s | "
+        f"{(readings_sent - status_readings) / elapsed:.1f} readings/s | "
+        f"sent {seq - 1} packets"
+    )
+    last_status = now
+    status_seq = seq
+    status_readings = readings_sent
+
+# Adaptive Control 
+class AdaptiveControl:
+    """
+    Trades latency for bytes per report based on heartbeat replies.
+    Backing off grows the batch first (same sampling rate, fewer headers),
+    then widens the interval; recovery undoes the steps in reverse.
+    """
+
+    def __init__(self, interval, batch_size):
+        self.base_interval = interval
+        self.base_batch = batch_size
+        self.interval = interval
+        self.batch_size = batch_size
+        self.healthy = 0
+        self.awaiting_ack = False
+        # Missed replies only count once the server has shown it answers
+        self.acks_supported = False
+
+    def heartbeat_sent(self):
+        if self.awaiting_ack and self.acks_supported:
+            self.back_off("heartbeat unanswered")
+        self.awaiting_ack = True
+
+    def ack_received(self, load):
+        self.awaiting_ack = False
+        self.acks_supported = True
+        if load:
+            self.back_off("server reported load")
+            return
+        self.healthy += 1
+        if self.healthy >= ADAPTIVE_RECOVERY_ACKS:
+            self.healthy = 0
+            self.recover()
+
+    def back_off(self, reason):
+        self.healthy = 0
+        if self.batch_size < args.max_batch_size:
+            self.batch_size = min(args.max_batch_size, max(2, self.batch_size * 2))
+        elif self.interval < args.max_interval:
+            self.interval = min(args.max_interval, self.interval * 2)
+        else:
+            return
+        log.info(
+            f"Adaptive: {reason} — batch {self.batch_size}, interval {self.interval:g}s"
+        )
 
-    time.sleep(SEND_INTERVAL)
+    def recover(self):
+        if self.interval > self.base_interval:
+            self.interval = max(self.base_interval, self.interval / 2)
+        elif self.batch_size > self.base_batch:
+            self.batch_size = max(self.base_batch, self.batch_size // 2)
+        else:
+            return
+        log.info(
+            f"Adaptive: healthy — batch {self.batch_size}, interval {self.interval:g}s"
+        )
 
-if BATCH_SIZE > 0 and buffer:
-    send_batch(buffer)
+def poll_replies(control):
+    """Drain heartbeat replies without blocking."""
+    while True:
+        try:
+            reply, _ = sock.recvfrom(1024)
+        except (BlockingIOError, InterruptedError):
+            return
+        except OSError:
+            # ICMP port unreachable surfaces here on some platforms
+            return
+        if reply.startswith(b"ACK_HB") and control:
+            control.ack_received(reply[6] if len(reply) > 6 else 0)
 
-print("Finished sending data", flush=True)
+# Main Loop 
+# Deadlines are fixed points on the monotonic clock (previous deadline
+# plus the interval), so send and logging time never stretch the period.
+sock.setblocking(False)
+control = AdaptiveControl(SEND_INTERVAL, BATCH_SIZE) if args.adaptive else None
+
+clock = time.monotonic
+start = clock()
+end = start + DURATION
+next_send = start
+next_heartbeat = start + HEARTBEAT_INTERVAL
+last_status = start
+status_seq = seq
+status_readings = 0
+missed_deadlines = 0
+batch = Batch()
+
+while True:
+
+    now = clock()
+    if now >= end:
+        break
+
+    if now >= next_heartbeat:
+        poll_replies(control)
+        hb = encoder.encode(MSG_HEARTBEAT, seq, get_timestamp_ms())
+        sock.sendto(hb, server_addr)
+        log.debug("Heartbeat sent")
+        if control:
+            control.heartbeat_sent()
+        next_heartbeat += HEARTBEAT_INTERVAL
+
+    if now >= batch.deadline():
+        batch.flush(now, "linger")
+
+    if now >= next_send:
+        batch_size = control.batch_size if control else BATCH_SIZE
+        interval = control.interval if control else SEND_INTERVAL
+
+        next_send += interval
+        if next_send <= now:
+            # More than a whole period behind: skip ahead instead of bursting
+            missed = int((now - next_send) // interval) + 1
+            missed_deadlines += missed
+            next_send += missed * interval
+
+        if batch_size == 0:
+            send_single()
+        else:
+            temp = round(random.uniform(20, 35), 1)
+            if not batch.fits(temp):
+                batch.flush(now, "bytes")
+            batch.add(temp, now)
+            if len(batch) >= batch_size:
+                batch.flush(now, "count")
+            elif next_send > batch.deadline():
+                # The next reading would miss the linger limit anyway
+                batch.flush(now, "linger")
+
+        report_status(now)
+
+    if control:
+        poll_replies(control)
+
+    delay = min(next_send, next_heartbeat, batch.deadline(), end) - clock()
+    if delay > 0:
+        time.sleep(delay)
+
+batch.flush(clock(), "end")
+
+if batch.summary():
+    log.info(batch.summary())
+if missed_deadlines:
+    log.warning(f"Fell behind schedule: {missed_deadlines} send slots skipped")
+log.info(f"Finished sending data ({seq - 1} packets, {readings_sent} readings)")
 sock.close()
@@ -0,0 +1,324 @@
+"""
+Load generator: N virtual devices from one process.
+
+Each device has its own UDP socket (the server answers INIT by address),
+device_id, sequence counter, INIT handshake and heartbeat schedule. All
+sends are driven by one asyncio loop through a heap of deadlines, so the
+rate is fractional (--rate 0.2 = one packet every 5 s, --rate 200 = every
+5 ms) and each deadline is the previous one plus the period, never "now"
+plus the period, so scheduling lag does not accumulate into drift.
+
+Status lines report achieved vs. target packet rate and scheduling lag;
+raise --devices or --rate until achieved falls behind target to find the
+point where the generator (or the server) saturates.
+
+Every device socket is a file descriptor, so the soft RLIMIT_NOFILE is
+raised towards the hard limit at startup when the fleet needs it; past
+the hard limit, split the fleet over several processes with
+--first_device_id.
+
+Usage: python Client/LoadGen.py --server_ip 127.0.0.1 --devices 1000 --rate 2
+Run the server with --mode asyncio for large fleets.
+"""
+import argparse
+import asyncio
+import heapq
+import logging
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from Common.payload import ENCODINGS, ENC_ASCII, encode_readings
+from Common.logs import add_logging_args, setup_logging
+from Common.protocol import (
+    MSG_INIT, MSG_DATA, MSG_HEARTBEAT,
+    SUPPORTED_VERSIONS, PacketEncoder, max_device_id, version_for
+)
+
+SERVER_PORT = 9999
+HEARTBEAT_INTERVAL = 5
+
+INIT_TIMEOUT = 2
+INIT_MAX_RETRIES = 5
+# Handshakes in flight at once
+INIT_CONCURRENCY = 200
+# File descriptors needed besides the device sockets (stdio, event loop, logs)
+FD_HEADROOM = 64
+
+# Schedule entry kinds
+SEND_DATA = 0
+SEND_HEARTBEAT = 1
+
+log = logging.getLogger("loadgen")
+
+
+class DeviceProtocol(asyncio.DatagramProtocol):
+    """One virtual device: its socket, encoder and sequence counter."""
+
+    def __init__(self, device_id, version, encoding):
+        self.device_id = device_id
+        self.encoder = PacketEncoder(device_id, version, encoding)
+        self.seq = 0
+        self.transport = None
+        self.ready = False
+        self.replies = asyncio.Queue()
+
+    def connection_made(self, transport):
+        self.transport = transport
+
+    def datagram_received(self, data, addr):
+        # Only the handshake waits on replies; later ACK_HBs are dropped
+        if not self.ready:
+            self.replies.put_nowait(data)
+
+    def error_received(self, exc):
+        log.debug(f"Device {self.device_id} socket error: {exc}")
+
+    def send(self, msg_type, timestamp_ms, payload=b""):
+        self.transport.sendto(self.encoder.encode(msg_type, self.seq, timestamp_ms, payload))
+
+    async def handshake(self, timestamp_ms):
+        """INIT -> ACK_INIT[encoding] -> ACK_READY, with retries."""
+        for attempt in range(INIT_MAX_RETRIES):
+            self.send(MSG_INIT, timestamp_ms())
+            try:
+                ack1 = await asyncio.wait_for(self.replies.get(), INIT_TIMEOUT)
+                if not ack1.startswith(b"ACK_INIT"):
+                    continue
+                self.encoder.encoding = ack1[8] if len(ack1) > 8 else ENC_ASCII
+                ack2 = await asyncio.wait_for(self.replies.get(), INIT_TIMEOUT)
+                if ack2 == b"ACK_READY":
+                    self.ready = True
+                    self.seq += 1
+                    return True
+            except asyncio.TimeoutError:
+                log.debug(f"Device {self.device_id}: no ACK (attempt {attempt + 1})")
+        return False
+
+
+def ensure_fd_limit(needed):
+    """
+    Raise the soft open-file limit to at least needed if the hard limit
+    allows. Returns (ok, soft, hard); platforms without the resource
+    module are assumed to be fine.
+    """
+    try:
+        import resource
+    except ImportError:
+        return True, None, None
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    if soft == resource.RLIM_INFINITY or soft >= needed:
+        return True, soft, hard
+    if hard != resource.RLIM_INFINITY and hard < needed:
+        return False, soft, hard
+    try:
+        resource.setrlimit(resource.RLIMIT_NOFILE, (needed, hard))
+    except (ValueError, OSError):
+        return False, soft, hard
+    log.info(f"Raised the open-file limit from {soft} to {needed}")
+    return True, needed, hard
+
+
+class LoadStats:
+    def __init__(self, target_rate):
+        self.target_rate = target_rate
+        self.packets = 0
+        self.readings = 0
+        self.bytes = 0
+        self.heartbeats = 0
+        self.max_lag = 0.0
+        self.total_lag = 0.0
+
+        self.window_start = 0.0
+        self.window_packets = 0
+        self.window_max_lag = 0.0
+
+    def report(self, now, final=False):
+        elapsed = now - self.window_start
+        if elapsed <= 0:
+            return
+        if final:
+            rate = self.packets / elapsed
+            lag = self.max_lag
+        else:
+            rate = self.window_packets / elapsed
+            lag = self.window_max_lag
+        log.info(
+            f"{'Total' if final else 'Status'} | achieved {rate:.1f} pkt/s "
+            f"of target {self.target_rate:.1f} ({rate / self.target_rate * 100:.1f}%) | "
+            f"max lag {lag * 1000:.1f} ms | sent {self.packets} packets"
+        )
+        if not final:
+            self.window_start = now
+            self.window_packets = 0
+            self.window_max_lag = 0.0
+
+
+async def start_devices(args, timestamp_ms):
+    loop = asyncio.get_running_loop()
+    encoding = ENCODINGS[args.encoding]
+    limit = asyncio.Semaphore(INIT_CONCURRENCY)
+
+    async def start(device_id):
+        async with limit:
+            _, device = await loop.create_datagram_endpoint(
+                lambda: DeviceProtocol(device_id, args.protocol_version, encoding),
+                remote_addr=(args.server_ip, args.server_port)
+            )
+            if await device.handshake(timestamp_ms):
+                return device
+            device.transport.close()
+            return None
+
+    ids = range(args.first_device_id, args.first_device_id + args.devices)
+    devices = await asyncio.gather(*(start(device_id) for device_id in ids))
+    return [device for device in devices if device is not None]
+
+
+async def run(args):
+    loop = asyncio.get_running_loop()
+    start_time = time.time()
+
+    def timestamp_ms():
+        return int((time.time() - start_time) * 1000)
+
+    log.info(f"Starting {args.devices} devices against {args.server_ip}:{args.server_port}")
+    devices = await start_devices(args, timestamp_ms)
+    if len(devices) < args.devices:
+        log.warning(f"{args.devices - len(devices)} devices failed the INIT handshake")
+    if not devices:
+        return
+
+    period = 1.0 / args.rate
+    stats = LoadStats(len(devices) * args.rate * args.burst)
+    log.info(
+        f"{len(devices)} devices ready (target {stats.target_rate:.1f} pkt/s, "
+        f"burst {args.burst}, {args.readings} readings/packet)"
+    )
+
+    # Spread first sends over one period so devices do not fire in lockstep
+    now = loop.time()
+    schedule = []
+    for index, device in enumerate(devices):
+        schedule.append((now + random.uniform(0, period), SEND_DATA, index))
+        schedule.append((now + random.uniform(0, HEARTBEAT_INTERVAL), SEND_HEARTBEAT, index))
+    heapq.heapify(schedule)
+
+    deadline = now + args.duration
+    stats.window_start = now
+    next_status = now + args.status_interval if args.status_interval > 0 else float("inf")
+
+    while schedule:
+        due, kind, index = schedule[0]
+        if due >= deadline:
+            break
+
+        now = loop.time()
+        if due > now:
+            await asyncio.sleep(min(due, next_status) - now)
+        else:
+            heapq.heapreplace(
+                schedule,
+                (due + (period if kind == SEND_DATA else HEARTBEAT_INTERVAL), kind, index)
+            )
+            device = devices[index]
+
+            if kind == SEND_HEARTBEAT:
+                device.send(MSG_HEARTBEAT, timestamp_ms())
+                stats.heartbeats += 1
+            else:
+                lag = now - due
+                stats.total_lag += lag
+                stats.max_lag = max(stats.max_lag, lag)
+                stats.window_max_lag = max(stats.window_max_lag, lag)
+                for _ in range(args.burst):
+                    readings = [round(random.uniform(20, 35), 1) for _ in range(args.readings)]
+                    device.send(
+                        MSG_DATA, timestamp_ms(),
+                        encode_readings(device.encoder.encoding, readings)
+                    )
+                    device.seq += 1
+                    stats.packets += 1
+                    stats.window_packets += 1
+                    stats.readings += len(readings)
+
+        now = loop.time()
+        if now >= next_status:
+            stats.report(now)
+            next_status += args.status_interval
+            # Yield so handshake replies and socket errors are processed
+            await asyncio.sleep(0)
+
+    stats.window_start = deadline - args.duration
+    stats.report(loop.time(), final=True)
+    log.info(
+        f"Finished: {stats.packets} packets, {stats.readings} readings, "
+        f"{stats.heartbeats} heartbeats, "
+        f"mean lag {stats.total_lag / max(stats.packets // args.burst, 1) * 1000:.2f} ms"
+    )
+
+    for device in devices:
+        device.transport.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Drive many virtual devices from one process")
+    parser.add_argument("--server_ip", required=True)
+    parser.add_argument("--server_port", type=int, default=SERVER_PORT)
+    parser.add_argument("--duration", type=float, default=60)
+    parser.add_argument("--devices", type=int, default=100)
+    parser.add_argument("--first_device_id", type=int, default=1)
+    parser.add_argument(
+        "--rate",
+        type=float,
+        default=1.0,
+        help="Send events per second per device (fractional allowed)"
+    )
+    parser.add_argument(
+        "--burst",
+        type=int,
+        default=1,
+        help="Packets sent back to back at each send event"
+    )
+    parser.add_argument("--readings", type=int, default=1, help="Readings per packet")
+    parser.add_argument("--encoding", default="ascii", choices=list(ENCODINGS))
+    parser.add_argument(
+        "--protocol_version",
+        type=int,
+        choices=SUPPORTED_VERSIONS,
+        help="Default: 2, or 3 when device ids go above 255"
+    )
+    add_logging_args(parser)
+    args = parser.parse_args()
+
+    global log
+    log = setup_logging(args, "loadgen")
+
+    if args.rate <= 0 or args.burst < 1 or args.readings < 1 or args.devices < 1:
+        parser.error("--devices, --rate, --burst and --readings must be positive")
+    last_id = args.first_device_id + args.devices - 1
+    if args.protocol_version is None:
+        args.protocol_version = version_for(last_id)
+    if args.first_device_id < 0 or last_id > max_device_id(args.protocol_version):
+        parser.error(
+            f"device ids {args.first_device_id}-{last_id} do not fit protocol "
+            f"version {args.protocol_version} (max {max_device_id(args.protocol_version)})"
+        )
+
+    ok, soft, hard = ensure_fd_limit(args.devices + FD_HEADROOM)
+    if not ok:
+        log.error(
+            f"{args.devices} devices need about {args.devices + FD_HEADROOM} open files "
+            f"(one socket each) but the limit is {soft} (hard {hard}). Raise it with "
+            f"'ulimit -n', or split the fleet over several processes with --first_device_id."
+        )
+        sys.exit(1)
+
+    asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    main()
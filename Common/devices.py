@@ -0,0 +1,169 @@
+"""
+Per-device state table for the server.
+
+Each device gets a DeviceState record (__slots__, no per-instance dict).
+Sequence numbers are classified against a per-device anti-replay style
+bitmap window (as in IPsec/DTLS): bit i set means seq (highest - i) has
+been seen, so every packet is new, late, duplicate or too old in O(1).
+Sequence comparisons use RFC 1982 serial arithmetic in the device's
+sequence space (16-bit for v1/v2 headers, 32-bit for v3), so a wrap
+is just the next packet rather than one enormous gap.
+Devices silent for longer than the idle timeout are evicted from the
+live table; their counters are folded into a per-device total so the
+final metrics still cover them.
+"""
+
+from Common.protocol import serial_diff
+
+DEFAULT_IDLE_TIMEOUT = 90.0
+DEFAULT_REORDER_WINDOW = 64
+
+# Sequence classification
+SEQ_NEW = 0
+SEQ_LATE = 1
+SEQ_DUPLICATE = 2
+SEQ_TOO_OLD = 3
+
+# Counters summed when records are merged or reported
+COUNTER_FIELDS = ("packets", "readings", "bytes", "duplicates", "gaps", "late", "too_old")
+
+
+class DeviceState:
+    __slots__ = (
+        "device_id", "last_seq", "seq_bits", "seen", "window_size", "encoding",
+        "packets", "readings", "bytes", "duplicates", "gaps", "late", "too_old",
+        "last_heartbeat", "last_arrival", "heartbeat_gaps",
+        "window_packets", "window_readings", "window_gaps", "window_duplicates",
+    )
+
+    def __init__(self, device_id, now=0.0, window_size=DEFAULT_REORDER_WINDOW):
+        self.device_id = device_id
+        # Highest sequence number seen and the bitmap window below it
+        self.last_seq = None
+        self.seq_bits = 16
+        self.seen = 0
+        self.window_size = window_size
+        self.encoding = 0
+
+        self.packets = 0
+        self.readings = 0
+        self.bytes = 0
+        self.duplicates = 0
+        self.gaps = 0
+        self.late = 0
+        self.too_old = 0
+
+        self.last_heartbeat = now
+        self.last_arrival = now
+        # Gap count when the last heartbeat was answered
+        self.heartbeat_gaps = 0
+
+        # Since the last status line
+        self.window_packets = 0
+        self.window_readings = 0
+        self.window_gaps = 0
+        self.window_duplicates = 0
+
+    def reset_sequence(self, seq, bits=16):
+        """
+        Start tracking at seq (INIT). Everything below it counts as seen,
+        so early stragglers are not mistaken for gap fills.
+        """
+        self.last_seq = seq
+        self.seq_bits = bits
+        self.seen = (1 << self.window_size) - 1
+
+    def classify(self, seq, bits=16):
+        """
+        Returns (kind, amount): for SEQ_NEW the number of sequence numbers
+        skipped (new gaps), for SEQ_LATE the reorder depth, otherwise 0.
+        """
+        highest = self.last_seq
+        if highest is None or bits != self.seq_bits:
+            self.reset_sequence(seq, bits)
+            return SEQ_NEW, 0
+
+        distance = serial_diff(seq, highest, bits)
+        if distance > 0:
+            shift = distance
+            if shift >= self.window_size:
+                self.seen = 1
+            else:
+                self.seen = ((self.seen << shift) | 1) & ((1 << self.window_size) - 1)
+            self.last_seq = seq
+            return SEQ_NEW, shift - 1
+
+        depth = -distance
+        if depth >= self.window_size:
+            return SEQ_TOO_OLD, 0
+
+        bit = 1 << depth
+        if self.seen & bit:
+            return SEQ_DUPLICATE, 0
+
+        self.seen |= bit
+        return SEQ_LATE, depth
+
+    def last_seen(self):
+        return max(self.last_heartbeat, self.last_arrival)
+
+    def reset_window(self):
+        self.window_packets = 0
+        self.window_readings = 0
+        self.window_gaps = 0
+        self.window_duplicates = 0
+
+    def counters(self):
+        return [getattr(self, name) for name in COUNTER_FIELDS]
+
+    def add_counters(self, values):
+        for name, value in zip(COUNTER_FIELDS, values):
+            setattr(self, name, getattr(self, name) + value)
+
+
+class DeviceTable:
+    """Live DeviceState records keyed by device_id, plus evicted totals."""
+
+    def __init__(self, idle_timeout=DEFAULT_IDLE_TIMEOUT, window_size=DEFAULT_REORDER_WINDOW):
+        self.idle_timeout = idle_timeout
+        self.window_size = window_size
+        self.live = {}
+        self.evicted = {}
+        self.evictions = 0
+
+    def get(self, device_id, now):
+        device = self.live.get(device_id)
+        if device is None:
+            device = self.live[device_id] = DeviceState(device_id, now, self.window_size)
+        return device
+
+    def evict_idle(self, now):
+        """Drop devices that have not been heard from within idle_timeout."""
+        if self.idle_timeout <= 0:
+            return []
+
+        idle = [
+            device for device in self.live.values()
+            if now - device.last_seen() > self.idle_timeout
+        ]
+        for device in idle:
+            del self.live[device.device_id]
+            self.totals_for(device.device_id).add_counters(device.counters())
+            self.evictions += 1
+        return idle
+
+    def totals_for(self, device_id):
+        total = self.evicted.get(device_id)
+        if total is None:
+            total = self.evicted[device_id] = DeviceState(device_id)
+        return total
+
+    def breakdown(self):
+        """device_id -> counter list, covering live and evicted devices."""
+        result = {}
+        for table in (self.evicted, self.live):
+            for device_id, device in table.items():
+                counters = result.setdefault(device_id, [0] * len(COUNTER_FIELDS))
+                for i, value in enumerate(device.counters()):
+                    counters[i] += value
+        return result
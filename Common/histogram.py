@@ -0,0 +1,110 @@
+"""
+HDR-style histogram with log-spaced buckets.
+
+Each bucket is (1 + precision) times wider than the one before, so any
+recorded value is reported within `precision` relative error while the
+memory is fixed (about 2,200 counters for 1 us .. 1 h at 1%). Histograms
+with the same layout merge by adding counts, which is how per-device
+and per-window histograms roll up into fleet-wide ones.
+
+Pure Python so the server can use it; record_array() takes a numpy
+array for the analysis scripts.
+"""
+import math
+
+DEFAULT_LOWEST = 1e-6
+DEFAULT_HIGHEST = 3600.0
+DEFAULT_PRECISION = 0.01
+
+
+class LogHistogram:
+    """
+    Bucket 0 holds values below lowest (including zero and negative
+    values), the last bucket anything at or above highest. Exact count,
+    sum, min and max are kept alongside.
+    """
+
+    def __init__(self, lowest=DEFAULT_LOWEST, highest=DEFAULT_HIGHEST, precision=DEFAULT_PRECISION):
+        self.lowest = lowest
+        self.highest = highest
+        self.precision = precision
+        self.log_base = math.log1p(precision)
+        self.size = int(math.ceil(math.log(highest / lowest) / self.log_base)) + 2
+        self.counts = [0] * self.size
+        self.count = 0
+        self.total = 0.0
+        self.min = float("inf")
+        self.max = float("-inf")
+
+    def index(self, value):
+        if value < self.lowest:
+            return 0
+        return min(self.size - 1, int(math.log(value / self.lowest) / self.log_base) + 1)
+
+    def record(self, value):
+        self.counts[self.index(value)] += 1
+        self.count += 1
+        self.total += value
+        if value < self.min:
+            self.min = value
+        if value > self.max:
+            self.max = value
+
+    def record_array(self, values):
+        """Record a numpy array in one pass."""
+        import numpy as np
+
+        values = values[~np.isnan(values)]
+        if not len(values):
+            return
+        with np.errstate(divide="ignore", invalid="ignore"):
+            scaled = np.log(np.maximum(values, self.lowest) / self.lowest) / self.log_base
+        indexes = np.where(values < self.lowest, 0, np.minimum(self.size - 1, scaled.astype(np.int64) + 1))
+        for i, n in enumerate(np.bincount(indexes, minlength=self.size).tolist()):
+            if n:
+                self.counts[i] += n
+        self.count += len(values)
+        self.total += float(values.sum())
+        self.min = min(self.min, float(values.min()))
+        self.max = max(self.max, float(values.max()))
+
+    def merge(self, other):
+        for i, n in enumerate(other.counts):
+            if n:
+                self.counts[i] += n
+        self.count += other.count
+        self.total += other.total
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+
+    def clear(self):
+        self.counts = [0] * self.size
+        self.count = 0
+        self.total = 0.0
+        self.min = float("inf")
+        self.max = float("-inf")
+
+    def mean(self):
+        return self.total / self.count if self.count else float("nan")
+
+    def value_at(self, index):
+        """Representative (geometric middle) value of a bucket."""
+        if index == 0:
+            return self.lowest
+        return self.lowest * math.exp((index - 0.5) * self.log_base)
+
+    def percentile(self, percent):
+        """Value at or below which percent% of the recorded values fall."""
+        if not self.count:
+            return float("nan")
+        target = max(1, math.ceil(self.count * percent / 100.0))
+        seen = 0
+        for i, n in enumerate(self.counts):
+            seen += n
+            if seen >= target:
+                # Buckets are approximate; the extremes are exact
+                return min(max(self.value_at(i), self.min), self.max)
+        return self.max
+
+    def percentiles(self, percents):
+        return {p: self.percentile(p) for p in percents}
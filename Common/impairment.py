@@ -0,0 +1,162 @@
+"""
+Channel impairment model shared by the userspace proxy and anything
+else that needs netem-like behaviour without root.
+
+Impairment.schedule(now, size) decides the fate of one datagram and
+returns the times its copies should be delivered: an empty list when it
+is lost, two entries when it is duplicated. Semantics follow netem:
+  loss       independent loss probability
+  burst      Gilbert-Elliott two-state loss (netem "loss gemodel")
+  delay      fixed delay with uniform +-jitter; jittered packets reorder
+  reorder    probability a packet skips the delay and overtakes the
+             delayed ones (needs a delay to have any effect)
+  duplicate  probability a second, independently delayed copy is sent
+  rate       link rate in bytes/s; packets serialize behind each other
+  limit      packets in flight before new ones are tail-dropped
+"""
+import random
+
+DEFAULT_LIMIT = 10000
+
+# Named profiles; the first three match Tests/run_test.sh
+PROFILES = {
+    "normal": {},
+    "loss5": {"loss": 5},
+    "delay100": {"delay": 100, "jitter": 10},
+    "burst5": {"burst": (1.05, 20)},
+    "reorder25": {"delay": 20, "reorder": 25},
+    "duplicate5": {"duplicate": 5},
+    "rate64k": {"rate": 64, "limit": 50},
+    "lossy_wan": {"loss": 1, "burst": (0.5, 30), "delay": 80, "jitter": 20, "duplicate": 0.5},
+}
+
+
+class GilbertElliott:
+    """
+    Good/Bad Markov chain: p = P(good -> bad), r = P(bad -> good) per
+    packet, with a loss probability in each state. Mean burst length is
+    1/r packets; long-run loss is p/(p+r) * bad_loss + r/(p+r) * good_loss.
+    """
+
+    def __init__(self, p, r, bad_loss=1.0, good_loss=0.0):
+        if not 0 < p <= 1 or not 0 < r <= 1:
+            raise ValueError("Gilbert-Elliott p and r must be in (0, 1]")
+        self.p = p
+        self.r = r
+        self.bad_loss = bad_loss
+        self.good_loss = good_loss
+        self.bad = False
+
+    def lost(self, rng):
+        if self.bad:
+            if rng.random() < self.r:
+                self.bad = False
+        elif rng.random() < self.p:
+            self.bad = True
+        return rng.random() < (self.bad_loss if self.bad else self.good_loss)
+
+    def mean_loss(self):
+        bad_share = self.p / (self.p + self.r)
+        return bad_share * self.bad_loss + (1 - bad_share) * self.good_loss
+
+
+class Impairment:
+    """
+    Probabilities are fractions, times seconds, rate bytes per second.
+    Call delivered() whenever a scheduled copy leaves, so limit can be
+    enforced.
+    """
+
+    def __init__(self, loss=0.0, burst=None, delay=0.0, jitter=0.0, reorder=0.0,
+                 duplicate=0.0, rate=0.0, limit=DEFAULT_LIMIT, seed=None):
+        self.loss = loss
+        self.burst = burst
+        self.delay = delay
+        self.jitter = jitter
+        self.reorder = reorder
+        self.duplicate = duplicate
+        self.rate = rate
+        self.limit = limit
+        self.rng = random.Random(seed)
+
+        self.link_free = 0.0
+        self.in_flight = 0
+        self.stats = dict.fromkeys(
+            ("packets", "delivered", "lost", "overflow", "duplicated", "reordered"), 0
+        )
+
+    @classmethod
+    def from_options(cls, loss=0.0, burst=None, delay=0.0, jitter=0.0, reorder=0.0,
+                     duplicate=0.0, rate=0.0, limit=DEFAULT_LIMIT, seed=None):
+        """
+        Build from netem-style units: percentages, milliseconds, rate in
+        kbit/s and burst as (p%, r%[, bad loss%[, good loss%]]).
+        """
+        if burst:
+            burst = GilbertElliott(*(value / 100.0 for value in burst))
+        return cls(
+            loss=loss / 100.0, burst=burst,
+            delay=delay / 1000.0, jitter=jitter / 1000.0,
+            reorder=reorder / 100.0, duplicate=duplicate / 100.0,
+            rate=rate * 1000 / 8.0, limit=limit, seed=seed
+        )
+
+    @classmethod
+    def from_profile(cls, name, seed=None, **overrides):
+        options = dict(PROFILES[name])
+        options.update({key: value for key, value in overrides.items() if value is not None})
+        return cls.from_options(seed=seed, **options)
+
+    def schedule(self, now, size):
+        stats = self.stats
+        rng = self.rng
+        stats["packets"] += 1
+
+        if (self.loss and rng.random() < self.loss) or (self.burst and self.burst.lost(rng)):
+            stats["lost"] += 1
+            return []
+
+        copies = 1
+        if self.duplicate and rng.random() < self.duplicate:
+            copies = 2
+            stats["duplicated"] += 1
+
+        times = []
+        for _ in range(copies):
+            if self.in_flight >= self.limit:
+                stats["overflow"] += 1
+                continue
+            if self.reorder and rng.random() < self.reorder:
+                due = now
+                stats["reordered"] += 1
+            else:
+                due = now + max(0.0, self.delay + rng.uniform(-self.jitter, self.jitter))
+            if self.rate:
+                self.link_free = max(due, self.link_free) + size / self.rate
+                due = self.link_free
+            self.in_flight += 1
+            times.append(due)
+        return times
+
+    def delivered(self):
+        self.in_flight -= 1
+        self.stats["delivered"] += 1
+
+    def describe(self):
+        parts = []
+        if self.loss:
+            parts.append(f"loss {self.loss * 100:g}%")
+        if self.burst:
+            parts.append(
+                f"burst loss p={self.burst.p * 100:g}% r={self.burst.r * 100:g}% "
+                f"(mean {self.burst.mean_loss() * 100:.2g}%, bursts of {1 / self.burst.r:.1f})"
+            )
+        if self.delay or self.jitter:
+            parts.append(f"delay {self.delay * 1000:g}ms +-{self.jitter * 1000:g}ms")
+        if self.reorder:
+            parts.append(f"reorder {self.reorder * 100:g}%")
+        if self.duplicate:
+            parts.append(f"duplicate {self.duplicate * 100:g}%")
+        if self.rate:
+            parts.append(f"rate {self.rate * 8 / 1000:g}kbit limit {self.limit}")
+        return ", ".join(parts) or "no impairment"
@@ -0,0 +1,179 @@
+"""
+Rolling-window metrics the server updates on the hot path and exposes
+while it runs.
+
+Counters live in a ring of one-second slots and delays in a ring of
+LogHistograms, so memory is fixed however long the server runs and any
+window up to the ring length is a sum over slots. Exposed as Prometheus
+text (and JSON) on a localhost TCP port and as a periodic snapshot file.
+"""
+import json
+import os
+import time
+
+from Common.histogram import LogHistogram
+
+# Counters kept per one-second slot
+COUNTERS = ("packets", "readings", "bytes", "gaps", "duplicates")
+
+COUNTER_SLOTS = 60
+HISTOGRAM_SLOT = 10
+HISTOGRAM_SLOTS = 6
+
+RATE_WINDOWS = (1, 10, 60)
+QUANTILES = (0.5, 0.9, 0.99, 0.999)
+
+# Both are off unless asked for; these are what launchers that want them pass
+METRICS_PORT = 9100
+SNAPSHOT_INTERVAL = 5.0
+
+
+class LiveMetrics:
+
+    def __init__(self):
+        self.started = time.time()
+        self.slots = {name: [0] * COUNTER_SLOTS for name in COUNTERS}
+        self.totals = dict.fromkeys(COUNTERS, 0)
+        self.slot = None
+        self.first_slot = None
+
+        self.histograms = [LogHistogram() for _ in range(HISTOGRAM_SLOTS)]
+        self.histogram_slot = None
+        self.delay_total = LogHistogram()
+
+    def advance(self, now):
+        """Move to the slots for now, zeroing any skipped in between."""
+        second = int(now)
+        if self.slot is None:
+            self.slot = self.first_slot = second
+        elif second != self.slot:
+            for step in range(1, min(second - self.slot, COUNTER_SLOTS) + 1):
+                index = (self.slot + step) % COUNTER_SLOTS
+                for counts in self.slots.values():
+                    counts[index] = 0
+            self.slot = second
+
+        block = second // HISTOGRAM_SLOT
+        if self.histogram_slot is None:
+            self.histogram_slot = block
+        elif block != self.histogram_slot:
+            for step in range(1, min(block - self.histogram_slot, HISTOGRAM_SLOTS) + 1):
+                self.histograms[(self.histogram_slot + step) % HISTOGRAM_SLOTS].clear()
+            self.histogram_slot = block
+
+    def record(self, now, size, readings, gaps, duplicate, delay):
+        """One DATA packet. Cheap enough for the receive loop."""
+        if self.slot != int(now):
+            self.advance(now)
+        index = self.slot % COUNTER_SLOTS
+        slots = self.slots
+        slots["packets"][index] += 1
+        slots["readings"][index] += readings
+        slots["bytes"][index] += size
+        slots["gaps"][index] += gaps
+        slots["duplicates"][index] += duplicate
+
+        totals = self.totals
+        totals["packets"] += 1
+        totals["readings"] += readings
+        totals["bytes"] += size
+        totals["gaps"] += gaps
+        totals["duplicates"] += duplicate
+
+        self.histograms[self.histogram_slot % HISTOGRAM_SLOTS].record(delay)
+        self.delay_total.record(delay)
+
+    def rate(self, name, window):
+        """
+        Per-second rate over the last window completed seconds (fewer
+        right after start-up).
+        """
+        if self.slot is None:
+            return 0.0
+        window = min(window, self.slot - self.first_slot)
+        if window <= 0:
+            return 0.0
+        counts = self.slots[name]
+        total = sum(counts[(self.slot - step) % COUNTER_SLOTS] for step in range(1, window + 1))
+        return total / window
+
+    def window_histogram(self):
+        merged = LogHistogram()
+        for histogram in self.histograms:
+            merged.merge(histogram)
+        return merged
+
+    def snapshot(self, now, extra=None):
+        """Plain dict of totals, windowed rates and delay quantiles."""
+        self.advance(now)
+        window = self.window_histogram()
+        data = {
+            "time": time.time(),
+            "uptime": time.time() - self.started,
+            "totals": dict(self.totals),
+            "rates": {
+                f"{seconds}s": {name: self.rate(name, seconds) for name in COUNTERS}
+                for seconds in RATE_WINDOWS
+            },
+            "delay_seconds": {
+                f"{HISTOGRAM_SLOT * HISTOGRAM_SLOTS}s": {
+                    str(q): window.percentile(q * 100) for q in QUANTILES
+                },
+                "total": {str(q): self.delay_total.percentile(q * 100) for q in QUANTILES},
+            },
+        }
+        if extra:
+            data.update(extra)
+        return data
+
+    def prometheus(self, now, extra=None):
+        """Prometheus text exposition of snapshot()."""
+        data = self.snapshot(now)
+        lines = []
+        for name, value in data["totals"].items():
+            lines.append(f"# TYPE ttp_{name}_total counter")
+            lines.append(f"ttp_{name}_total {value}")
+        for name in COUNTERS:
+            lines.append(f"# TYPE ttp_{name}_per_second gauge")
+            for window, rates in data["rates"].items():
+                lines.append(f'ttp_{name}_per_second{{window="{window}"}} {rates[name]:.3f}')
+        lines.append("# TYPE ttp_delay_seconds gauge")
+        for window, quantiles in data["delay_seconds"].items():
+            for q, value in quantiles.items():
+                if value == value:
+                    lines.append(f'ttp_delay_seconds{{window="{window}",quantile="{q}"}} {value:.6f}')
+        for name, value in (extra or {}).items():
+            lines.append(f"# TYPE ttp_{name} gauge")
+            lines.append(f"ttp_{name} {value}")
+        lines.append(f"ttp_uptime_seconds {data['uptime']:.1f}")
+        return "\n".join(lines) + "\n"
+
+
+def write_snapshot(path, data):
+    """Write atomically so readers never see a half-written file."""
+    tmp = path + ".tmp"
+    with open(tmp, "w") as f:
+        json.dump(data, f, indent=2)
+    os.replace(tmp, path)
+
+
+def http_response(path, body_for):
+    """
+    Minimal HTTP/1.0 reply: /json gives the snapshot as JSON, anything
+    else Prometheus text. body_for(kind) builds the body.
+    """
+    if path.startswith("/json"):
+        body, content_type = body_for("json"), "application/json"
+    else:
+        body, content_type = body_for("prometheus"), "text/plain; version=0.0.4"
+    body = body.encode()
+    return (
+        f"HTTP/1.0 200 OK\r\nContent-Type: {content_type}\r\n"
+        f"Content-Length: {len(body)}\r\nConnection: close\r\n\r\n"
+    ).encode() + body
+
+
+def request_path(request):
+    """Path from the first line of an HTTP request ('/' if unparsable)."""
+    parts = request.split(b"\r\n", 1)[0].split()
+    return parts[1].decode("ascii", "replace") if len(parts) > 1 else "/"
@@ -0,0 +1,49 @@
+"""
+Logging setup shared by Client.py and Server.py.
+
+info (default) shows lifecycle events and periodic status lines,
+debug adds the per-packet trace, --quiet keeps warnings only.
+"""
+import logging
+import sys
+
+LEVELS = {
+    "debug": logging.DEBUG,
+    "info": logging.INFO,
+    "warning": logging.WARNING,
+}
+
+DEFAULT_STATUS_INTERVAL = 5.0
+
+
+def add_logging_args(parser):
+    parser.add_argument(
+        "--log_level", "--log-level",
+        default="info",
+        choices=list(LEVELS),
+        help="debug also logs every packet"
+    )
+    parser.add_argument(
+        "--quiet",
+        action="store_true",
+        help="Only log warnings"
+    )
+    parser.add_argument(
+        "--status_interval",
+        type=float,
+        default=DEFAULT_STATUS_INTERVAL,
+        help="Seconds between aggregated status lines (0 disables)"
+    )
+
+
+def setup_logging(args, name):
+    level = logging.WARNING if args.quiet else LEVELS[args.log_level]
+
+    handler = logging.StreamHandler(sys.stdout)
+    handler.setFormatter(logging.Formatter("%(message)s"))
+
+    logger = logging.getLogger(name)
+    logger.handlers[:] = [handler]
+    logger.setLevel(level)
+    logger.propagate = False
+    return logger
@@ -0,0 +1,201 @@
+"""
+Payload encodings for DATA packets.
+
+The encoding id travels in the header byte after the timestamp (always
+0 for v1 clients). A client asks for an encoding in its INIT and the
+server answers with the one it accepted in the ACK_INIT.
+
+  0 ascii  - comma separated text, e.g. b"23.9,21.3"
+  1 int16  - big-endian int16 centi-degrees, 2 bytes per reading
+  2 varint - first reading then deltas, zigzag varints of centi-degrees
+
+ENC_TIMED (0x80) can be set on any of them: the payload then starts with
+the reading count and one age per reading, all varints, in milliseconds
+before the header timestamp, followed by the readings themselves. The
+header timestamp stays the send time, so each reading keeps its own
+sample time inside a batch for 1-2 bytes.
+"""
+import sys
+from array import array
+
+ENC_ASCII = 0
+ENC_INT16 = 1
+ENC_VARINT = 2
+
+ENC_TIMED = 0x80
+
+ENCODINGS = {
+    "ascii": ENC_ASCII,
+    "int16": ENC_INT16,
+    "varint": ENC_VARINT,
+}
+
+SCALE = 100
+
+# Upper bound on the reading-count prefix of a timed payload
+TIMED_COUNT_SIZE = 2
+MAX_AGE_MS = 0xFFFFFFFF
+
+_SWAP = sys.byteorder == "little"
+
+
+# Varint Helpers
+def _zigzag(n):
+    return (n << 1) ^ (n >> 63)
+
+
+def _unzigzag(n):
+    return (n >> 1) ^ -(n & 1)
+
+
+def _put_varint(out, n):
+    while n >= 0x80:
+        out.append((n & 0x7F) | 0x80)
+        n >>= 7
+    out.append(n)
+
+
+def _get_varint(data, pos):
+    n = 0
+    shift = 0
+    while True:
+        byte = data[pos]
+        pos += 1
+        n |= (byte & 0x7F) << shift
+        if not byte & 0x80:
+            return n, pos
+        shift += 7
+
+
+def _varint_size(n):
+    size = 1
+    while n >= 0x80:
+        n >>= 7
+        size += 1
+    return size
+
+
+# Encode
+def is_known(encoding):
+    return encoding & ~ENC_TIMED in ENCODINGS.values()
+
+
+def reading_size(encoding, reading, previous=None, max_age_ms=MAX_AGE_MS):
+    """
+    Bytes that appending reading adds to an encoded batch whose last
+    reading is previous (None for an empty batch), without re-encoding.
+    For timed encodings the age and count prefix are upper bounds.
+    """
+    if encoding & ENC_TIMED:
+        size = _varint_size(max_age_ms)
+        if previous is None:
+            size += TIMED_COUNT_SIZE
+        return size + reading_size(encoding & ~ENC_TIMED, reading, previous)
+
+    if encoding == ENC_ASCII:
+        return len(str(reading)) + (previous is not None)
+
+    if encoding == ENC_INT16:
+        return 2
+
+    if encoding == ENC_VARINT:
+        base = 0 if previous is None else round(previous * SCALE)
+        return _varint_size(_zigzag(round(reading * SCALE) - base))
+
+    raise ValueError(f"Unknown payload encoding {encoding}")
+
+
+def encode_readings(encoding, readings, ages_ms=None):
+    """
+    readings: sequence of floats. Returns the payload bytes.
+    Timed encodings need ages_ms, one per reading.
+    """
+    if encoding & ENC_TIMED:
+        out = bytearray()
+        _put_varint(out, len(readings))
+        for age in ages_ms:
+            _put_varint(out, age)
+        return bytes(out) + encode_readings(encoding & ~ENC_TIMED, readings)
+
+    if encoding == ENC_ASCII:
+        return ",".join(str(r) for r in readings).encode()
+
+    if encoding == ENC_INT16:
+        packed = array("h", [round(r * SCALE) for r in readings])
+        if _SWAP:
+            packed.byteswap()
+        return packed.tobytes()
+
+    if encoding == ENC_VARINT:
+        out = bytearray()
+        previous = 0
+        for r in readings:
+            value = round(r * SCALE)
+            _put_varint(out, _zigzag(value - previous))
+            previous = value
+        return bytes(out)
+
+    raise ValueError(f"Unknown payload encoding {encoding}")
+
+
+# Decode
+def decode_batch(encoding, payload):
+    """
+    Returns (readings, ages_ms); ages_ms is None unless the encoding is
+    timed.
+    """
+    if not encoding & ENC_TIMED:
+        return decode_readings(encoding, payload), None
+
+    try:
+        count, pos = _get_varint(payload, 0)
+        ages = []
+        for _ in range(count):
+            age, pos = _get_varint(payload, pos)
+            ages.append(age)
+    except IndexError:
+        raise ValueError("Truncated timed payload")
+
+    readings = decode_readings(encoding & ~ENC_TIMED, payload[pos:])
+    if len(readings) != count:
+        raise ValueError(f"Timed payload has {count} ages for {len(readings)} readings")
+    return readings, ages
+
+
+def decode_readings(encoding, payload):
+    """
+    Decode a whole batch. ASCII readings stay strings so the CSV output
+    matches v1 exactly; binary encodings return floats.
+    """
+    if encoding == ENC_ASCII:
+        text = str(payload, "utf-8", "ignore")
+        return text.split(",") if "," in text else [text]
+
+    if encoding == ENC_INT16:
+        if len(payload) & 1:
+            raise ValueError("Odd-length int16 payload")
+        values = array("h")
+        values.frombytes(payload)
+        if _SWAP:
+            values.byteswap()
+        return [v / SCALE for v in values]
+
+    if encoding == ENC_VARINT:
+        values = []
+        value = 0
+        n = 0
+        shift = 0
+        for byte in bytes(payload):
+            n |= (byte & 0x7F) << shift
+            if byte & 0x80:
+                shift += 7
+                continue
+            value += _unzigzag(n)
+            values.append(value / SCALE)
+            n = 0
+            shift = 0
+        if shift:
+            raise ValueError("Truncated varint payload")
+        return values
+
+    raise ValueError(f"Unknown payload encoding {encoding}")
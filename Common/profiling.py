@@ -0,0 +1,130 @@
+"""
+Opt-in profiling for the server's packet path.
+
+StageTimer keeps one LogHistogram of perf_counter_ns durations per stage
+of process_packet, so a change can be judged on the stage it targets
+(decode, checksum, sequence tracking, ...). The laps themselves cost a
+few hundred nanoseconds each, so compare runs made with the same flags.
+
+For a whole-program view at shutdown, start_profile() either runs
+cProfile (a .prof / .pstats path, read with pstats or snakeviz) or
+samples the main thread's stack on SIGPROF and writes collapsed stacks
+("a;b;c count" lines) for flamegraph.pl / speedscope.
+"""
+import cProfile
+import os
+import signal
+import time
+
+from Common.histogram import LogHistogram
+
+# Stages of one DATA packet, in the order process_packet passes them
+STAGES = ("header", "checksum", "sequence", "payload", "sink", "bookkeeping", "log")
+STAGE_PERCENTILES = (50, 99)
+
+PSTATS_EXTENSIONS = (".prof", ".pstats")
+DEFAULT_SAMPLE_INTERVAL = 0.001
+
+
+def stage_histogram():
+    # 1 ns .. 10 s at 1%
+    return LogHistogram(lowest=1, highest=1e10)
+
+
+class StageTimer:
+    """
+    lap(stage, start) records the time since start under stage and
+    returns the new start, so stages chain without extra clock reads.
+    """
+
+    def __init__(self):
+        self.stages = {name: stage_histogram() for name in STAGES}
+        self.packet = stage_histogram()
+
+    def lap(self, stage, start):
+        now = time.perf_counter_ns()
+        self.stages[stage].record(now - start)
+        return now
+
+    def finish(self, packet_start):
+        self.packet.record(time.perf_counter_ns() - packet_start)
+
+    def merge(self, other):
+        for name, histogram in other.stages.items():
+            self.stages[name].merge(histogram)
+        self.packet.merge(other.packet)
+
+    def rows(self):
+        """(stage, count, mean ns, p50 ns, p99 ns, share of packet time)."""
+        total = self.packet.total or 1
+        rows = []
+        for name, histogram in list(self.stages.items()) + [("packet", self.packet)]:
+            if not histogram.count:
+                continue
+            p50, p99 = (histogram.percentile(p) for p in STAGE_PERCENTILES)
+            rows.append((
+                name, histogram.count, histogram.mean(), p50, p99,
+                histogram.total / total
+            ))
+        return rows
+
+
+class StackSampler:
+    """
+    Counts main-thread stacks sampled every interval seconds of CPU time
+    (ITIMER_PROF), so an idle server takes no samples.
+    """
+
+    def __init__(self, interval=DEFAULT_SAMPLE_INTERVAL):
+        self.interval = interval
+        self.counts = {}
+        self.previous = None
+
+    def sample(self, signum, frame):
+        stack = []
+        while frame is not None:
+            code = frame.f_code
+            stack.append(f"{os.path.basename(code.co_filename)}:{code.co_name}")
+            frame = frame.f_back
+        key = ";".join(reversed(stack))
+        self.counts[key] = self.counts.get(key, 0) + 1
+
+    def start(self):
+        self.previous = signal.signal(signal.SIGPROF, self.sample)
+        signal.setitimer(signal.ITIMER_PROF, self.interval, self.interval)
+
+    def stop(self):
+        signal.setitimer(signal.ITIMER_PROF, 0, 0)
+        signal.signal(signal.SIGPROF, self.previous or signal.SIG_DFL)
+
+    def write(self, path):
+        with open(path, "w") as f:
+            for stack, count in sorted(self.counts.items()):
+                f.write(f"{stack} {count}\n")
+
+
+class CProfiler:
+    def __init__(self):
+        self.profile = cProfile.Profile()
+
+    def start(self):
+        self.profile.enable()
+
+    def stop(self):
+        self.profile.disable()
+
+    def write(self, path):
+        self.profile.dump_stats(path)
+
+
+def start_profile(path):
+    """
+    Start the whole-program profiler path asks for: cProfile for .prof or
+    .pstats, stack sampling (collapsed stacks) for anything else.
+    """
+    if path.endswith(PSTATS_EXTENSIONS):
+        profiler = CProfiler()
+    else:
+        profiler = StackSampler()
+    profiler.start()
+    return profiler
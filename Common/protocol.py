@@ -0,0 +1,197 @@
+"""
+Wire-level definitions shared by Client.py and Server.py.
+
+Header codecs are precompiled struct.Struct objects. Decoding uses
+unpack_from directly on the received buffer (bytes or memoryview), so
+the header is never sliced out of the datagram.
+"""
+import struct
+import zlib
+
+# Header (v1, v2)
+# seq, device_id, msg_type, timestamp_ms, encoding, checksum, version
+HEADER_FORMAT = "!HBBIBHB"
+HEADER = struct.Struct(HEADER_FORMAT)
+HEADER_SIZE = HEADER.size
+# Fields in front of the checksum
+HEADER_PREFIX = struct.Struct("!HBBIB")
+CHECKSUM_FIELD = struct.Struct("!H")
+
+# Wide header (v3)
+# seq, device_id, msg_type, timestamp_ms, version, encoding, checksum
+# 32-bit seq and 16-bit device id. The version byte sits at the same
+# offset as in v1/v2, so a receiver can tell the layouts apart before
+# decoding anything else.
+HEADER_WIDE_FORMAT = "!IHBIBBH"
+HEADER_WIDE = struct.Struct(HEADER_WIDE_FORMAT)
+HEADER_WIDE_SIZE = HEADER_WIDE.size
+HEADER_WIDE_PREFIX = struct.Struct("!IHBIBB")
+
+VERSION_OFFSET = HEADER_SIZE - 1
+
+MSG_INIT = 1
+MSG_DATA = 2
+MSG_HEARTBEAT = 3
+
+MAX_DATAGRAM = 1024
+
+# Versions
+# v1: 16-bit byte-sum checksum
+# v2: CRC-32 folded to 16 bits, computed around the checksum field
+# v3: v2 checksum with the wide header
+VERSION_SUM = 1
+VERSION_CRC = 2
+VERSION_WIDE = 3
+SUPPORTED_VERSIONS = (VERSION_SUM, VERSION_CRC, VERSION_WIDE)
+# The 12-byte header keeps bytes_per_report comparable with earlier runs;
+# v3 is only picked when a device id needs it
+DEFAULT_VERSION = VERSION_CRC
+
+# Byte offsets of the checksum field inside the header
+CHECKSUM_START = HEADER_PREFIX.size
+CHECKSUM_END = CHECKSUM_START + CHECKSUM_FIELD.size
+WIDE_CHECKSUM_START = HEADER_WIDE_PREFIX.size
+WIDE_CHECKSUM_END = WIDE_CHECKSUM_START + CHECKSUM_FIELD.size
+
+
+def header_size(version):
+    return HEADER_WIDE_SIZE if version >= VERSION_WIDE else HEADER_SIZE
+
+
+def seq_bits(version):
+    return 32 if version >= VERSION_WIDE else 16
+
+
+def max_device_id(version):
+    return 0xFFFF if version >= VERSION_WIDE else 0xFF
+
+
+def version_for(device_id):
+    """DEFAULT_VERSION, or the wide header once device_id needs 16 bits."""
+    return DEFAULT_VERSION if device_id <= max_device_id(DEFAULT_VERSION) else VERSION_WIDE
+
+
+# Serial Number Arithmetic (RFC 1982)
+def serial_diff(a, b, bits):
+    """
+    Signed distance from b to a in a 2**bits sequence space, so that
+    serial_diff(0, 65535, 16) == 1 across the wrap.
+    """
+    modulus = 1 << bits
+    diff = (a - b) % modulus
+    return diff - modulus if diff >= modulus >> 1 else diff
+
+
+# Checksums
+# adler32's first sum is the plain byte sum while it stays below 65521,
+# which holds for any 256-byte chunk
+BYTE_SUM_CHUNK = 256
+
+
+def byte_sum(data):
+    """Sum of the bytes of data (bytes or memoryview), computed in C."""
+    size = len(data)
+    if size <= BYTE_SUM_CHUNK:
+        return zlib.adler32(data, 0) & 0xFFFF
+    if not isinstance(data, memoryview):
+        data = memoryview(data)
+    return sum(
+        zlib.adler32(data[start:start + BYTE_SUM_CHUNK], 0) & 0xFFFF
+        for start in range(0, size, BYTE_SUM_CHUNK)
+    )
+
+
+def sum16(data):
+    return byte_sum(data) % 65536
+
+
+def crc16_fold(data, start=CHECKSUM_START, end=CHECKSUM_END):
+    """CRC-32 of everything except the checksum field, folded to 16 bits."""
+    crc = zlib.crc32(data[end:], zlib.crc32(data[:start]))
+    return (crc >> 16) ^ (crc & 0xFFFF)
+
+
+def calculate_checksum(data, version=VERSION_SUM):
+    """Checksum of a packet whose checksum field is still zero."""
+    if version >= VERSION_WIDE:
+        return crc16_fold(data, WIDE_CHECKSUM_START, WIDE_CHECKSUM_END)
+    if version >= VERSION_CRC:
+        return crc16_fold(data)
+    return sum16(data)
+
+
+def verify_checksum(data, checksum, version):
+    """
+    Check a received packet in place, without building a patched copy
+    of it. The v1 byte sum runs in C (byte_sum), so it stays cheaper than
+    the old copy-then-sum() for memoryviews as well as bytes.
+    """
+    if version < VERSION_CRC:
+        return (byte_sum(data) - data[CHECKSUM_START] - data[CHECKSUM_START + 1]) % 65536 == checksum
+
+    if version >= VERSION_WIDE:
+        return crc16_fold(data, WIDE_CHECKSUM_START, WIDE_CHECKSUM_END) == checksum
+    return crc16_fold(data) == checksum
+
+
+# Codecs
+def decode_header(data):
+    """
+    Returns (seq, device_id, msg_type, timestamp_ms, encoding, checksum,
+    version) for any header version, or None if data is too short.
+    Fields are read straight out of data without slicing.
+    """
+    # v1/v2 is the common case: unpack first and let the version field,
+    # the last byte of the short header, tell whether to unpack again
+    try:
+        fields = HEADER.unpack_from(data)
+    except struct.error:
+        return None
+    if fields[6] < VERSION_WIDE:
+        return fields
+
+    if len(data) < HEADER_WIDE_SIZE:
+        return None
+    seq, device_id, msg_type, timestamp_ms, version, encoding, checksum = HEADER_WIDE.unpack_from(data)
+    return seq, device_id, msg_type, timestamp_ms, encoding, checksum, version
+
+
+class PacketEncoder:
+    """
+    Builds packets for one device with a single pack and one concat.
+    The checksum is computed from the packed header prefix and payload
+    first, so the packet is never sliced and re-joined to patch it in.
+    Sequence numbers wrap to the version's sequence space.
+    """
+
+    def __init__(self, device_id, version=DEFAULT_VERSION, encoding=0):
+        self.device_id = device_id
+        self.version = version
+        self.encoding = encoding
+        self.version_byte = bytes((version,))
+        self.seq_mask = (1 << seq_bits(version)) - 1
+
+    def encode(self, msg_type, seq, timestamp_ms, payload=b""):
+        seq &= self.seq_mask
+        timestamp_ms &= 0xFFFFFFFF
+
+        if self.version >= VERSION_WIDE:
+            prefix = HEADER_WIDE_PREFIX.pack(
+                seq, self.device_id, msg_type, timestamp_ms, self.version, self.encoding
+            )
+            crc = zlib.crc32(payload, zlib.crc32(prefix))
+            return prefix + CHECKSUM_FIELD.pack((crc >> 16) ^ (crc & 0xFFFF)) + payload
+
+        prefix = HEADER_PREFIX.pack(seq, self.device_id, msg_type, timestamp_ms, self.encoding)
+
+        if self.version >= VERSION_CRC:
+            crc = zlib.crc32(payload, zlib.crc32(self.version_byte, zlib.crc32(prefix)))
+            checksum = (crc >> 16) ^ (crc & 0xFFFF)
+        else:
+            checksum = (sum(prefix) + self.version + sum(payload)) % 65536
+
+        return HEADER.pack(
+            seq, self.device_id,
+            msg_type, timestamp_ms,
+            self.encoding, checksum, self.version
+        ) + payload
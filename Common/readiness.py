@@ -0,0 +1,35 @@
+"""
+Readiness handshake between a launcher and the processes it starts.
+
+A server or proxy given a ready file writes it once its socket is bound;
+the launcher waits for the file instead of sleeping a fixed time and
+hoping. The file holds the bound port and appears atomically, so its
+existence is the signal.
+"""
+import os
+import time
+
+READY_TIMEOUT = 10.0
+READY_POLL_INTERVAL = 0.01
+
+
+def mark_ready(path, port):
+    tmp = f"{path}.tmp{os.getpid()}"
+    with open(tmp, "w") as f:
+        f.write(f"{port}\n")
+    os.replace(tmp, path)
+
+
+def wait_ready(path, proc=None, timeout=READY_TIMEOUT):
+    """
+    Block until path exists. Returns False on timeout or if proc (a
+    Popen) exits first, e.g. because its port was taken.
+    """
+    deadline = time.monotonic() + timeout
+    while not os.path.exists(path):
+        if proc is not None and proc.poll() is not None:
+            return False
+        if time.monotonic() >= deadline:
+            return False
+        time.sleep(READY_POLL_INTERVAL)
+    return True
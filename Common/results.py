@@ -0,0 +1,23 @@
+"""
+The headline metrics.txt fields, read back for experiment result tables.
+
+Simulate and Sweep both turn each run's metrics.txt into one CSV row;
+reading it here keeps their columns and value types the same.
+"""
+
+METRIC_FIELDS = [
+    "bytes_per_report", "packets_received", "duplicate_rate",
+    "sequence_gap_count", "cpu_ms_per_report",
+]
+
+
+def read_metrics(path):
+    """METRIC_FIELDS found in a metrics.txt, as int or float."""
+    metrics = {}
+    with open(path) as f:
+        for line in f:
+            parts = line.split()
+            if len(parts) == 2 and parts[0] in METRIC_FIELDS:
+                value = parts[1]
+                metrics[parts[0]] = float(value) if "." in value else int(value)
+    return metrics
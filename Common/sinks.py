@@ -0,0 +1,632 @@
+"""
+Buffered output sinks for received telemetry.
+
+Every sink takes one call per DATA packet and buffers it in memory,
+with optional per-reading ages (ms before the packet timestamp) for
+timed batches,
+flushing when either the buffered reading count or the time since the
+last flush passes its limit.
+
+Formats:
+  csv    - the original sensor_data.csv layout, one row per reading,
+           plus the packet's send time so batches can be regrouped
+  binary - columnar row groups; packet fields are stored once per
+           packet, readings and their ages in separate columns
+
+RotatingSink wraps either one and starts a new timestamped segment file
+by size or age; finished segments are flushed and closed on a background
+thread so the receive loop never waits on the disk. LogTail pages
+through a log of either format while it is still being written.
+"""
+import bisect
+import csv
+import os
+import struct
+import sys
+import threading
+import time
+from array import array
+
+COLUMNS = [
+    "device_id",
+    "seq",
+    "timestamp",
+    "arrival_time",
+    "duplicate_flag",
+    "gap_flag",
+    "data_value",
+    "send_time"
+]
+
+DEFAULT_FLUSH_ROWS = 4096
+DEFAULT_FLUSH_INTERVAL = 1.0
+
+# Rows per chunk when streaming a log back in
+DEFAULT_CHUNK_ROWS = 1 << 18
+
+# Binary Layout
+# File:      MAGIC, byte order ('<' or '>'), format version
+# Row group: GROUP_HEADER (packets, readings) followed by one array per
+#            column in PACKET_COLUMNS order, then the readings column
+#            and (version 2) the reading ages column.
+MAGIC = b"TTPL"
+FILE_VERSION = 2
+FILE_HEADER = struct.Struct("!4scB")
+GROUP_HEADER = struct.Struct("!II")
+
+PACKET_COLUMNS = [
+    ("device_id", "H"),
+    ("seq", "I"),
+    ("timestamp", "d"),
+    ("arrival_time", "d"),
+    ("duplicate_flag", "B"),
+    ("gap_flag", "B"),
+    ("reading_count", "H"),
+]
+READING_TYPECODE = "d"
+AGE_TYPECODE = "I"
+
+BYTE_ORDER = b"<" if sys.byteorder == "little" else b">"
+
+
+def parse_reading(value):
+    try:
+        return float(value)
+    except ValueError:
+        return float("nan")
+
+
+# Sinks
+class CsvSink:
+    """Row-per-reading CSV, written with one writerows call per flush."""
+
+    extension = ".csv"
+
+    def __init__(self, path, flush_rows=DEFAULT_FLUSH_ROWS, flush_interval=DEFAULT_FLUSH_INTERVAL):
+        self.path = path
+        self.flush_rows = flush_rows
+        self.flush_interval = flush_interval
+        self.file = open(path, "w", newline="")
+        self.writer = csv.writer(self.file)
+        self.writer.writerow(COLUMNS)
+        self.rows = []
+        self.last_flush = time.monotonic()
+
+    def write_packet(self, device_id, seq, timestamp, arrival, duplicate_flag, gap_flag, values,
+                     ages=None):
+        if ages is None:
+            self.rows.extend(
+                [device_id, seq, timestamp, arrival, duplicate_flag, gap_flag, v, timestamp]
+                for v in values
+            )
+        else:
+            # timestamp came from whole milliseconds, so this is exact
+            timestamp_ms = round(timestamp * 1000)
+            self.rows.extend(
+                [device_id, seq, (timestamp_ms - age) / 1000.0, arrival,
+                 duplicate_flag, gap_flag, v, timestamp]
+                for v, age in zip(values, ages)
+            )
+        self.poll()
+
+    def poll(self):
+        """Flush if either limit has been reached."""
+        if (len(self.rows) >= self.flush_rows
+                or time.monotonic() - self.last_flush >= self.flush_interval):
+            self.flush()
+
+    def flush(self):
+        if self.rows:
+            self.writer.writerows(self.rows)
+            self.rows.clear()
+        self.file.flush()
+        self.last_flush = time.monotonic()
+
+    def close(self):
+        self.flush()
+        self.file.close()
+
+    @staticmethod
+    def merge(part_paths, path):
+        with open(path, "w", newline="") as out:
+            csv.writer(out).writerow(COLUMNS)
+            for part in part_paths:
+                if not os.path.exists(part):
+                    continue
+                with open(part, newline="") as f:
+                    next(f, None)
+                    for line in f:
+                        out.write(line)
+
+
+class BinarySink:
+    """Columnar row groups backed by array.array buffers."""
+
+    extension = ".bin"
+
+    def __init__(self, path, flush_rows=DEFAULT_FLUSH_ROWS, flush_interval=DEFAULT_FLUSH_INTERVAL):
+        self.path = path
+        self.flush_rows = flush_rows
+        self.flush_interval = flush_interval
+        self.file = open(path, "wb")
+        self.file.write(FILE_HEADER.pack(MAGIC, BYTE_ORDER, FILE_VERSION))
+        self.columns = [array(code) for _, code in PACKET_COLUMNS]
+        self.readings = array(READING_TYPECODE)
+        self.ages = array(AGE_TYPECODE)
+        self.last_flush = time.monotonic()
+
+    def write_packet(self, device_id, seq, timestamp, arrival, duplicate_flag, gap_flag, values,
+                     ages=None):
+        for column, value in zip(self.columns, (
+            device_id, seq, timestamp, arrival,
+            duplicate_flag, gap_flag, len(values)
+        )):
+            column.append(value)
+        self.readings.extend(
+            v if isinstance(v, float) else parse_reading(v) for v in values
+        )
+        if ages is None:
+            self.ages.extend([0] * len(values))
+        else:
+            self.ages.extend(ages)
+        self.poll()
+
+    def poll(self):
+        """Flush if either limit has been reached."""
+        if (len(self.readings) >= self.flush_rows
+                or time.monotonic() - self.last_flush >= self.flush_interval):
+            self.flush()
+
+    def flush(self):
+        packets = len(self.columns[0])
+        if packets:
+            self.file.write(GROUP_HEADER.pack(packets, len(self.readings)))
+            for column in self.columns:
+                column.tofile(self.file)
+                del column[:]
+            self.readings.tofile(self.file)
+            del self.readings[:]
+            self.ages.tofile(self.file)
+            del self.ages[:]
+        self.file.flush()
+        self.last_flush = time.monotonic()
+
+    def close(self):
+        self.flush()
+        self.file.close()
+
+    @staticmethod
+    def merge(part_paths, path):
+        # Row groups are self-contained, so parts concatenate after their
+        # file headers as long as they were written with the same byte order.
+        with open(path, "wb") as out:
+            out.write(FILE_HEADER.pack(MAGIC, BYTE_ORDER, FILE_VERSION))
+            for part in part_paths:
+                if not os.path.exists(part):
+                    continue
+                with open(part, "rb") as f:
+                    f.read(FILE_HEADER.size)
+                    while True:
+                        chunk = f.read(1 << 20)
+                        if not chunk:
+                            break
+                        out.write(chunk)
+
+
+SINKS = {
+    "csv": CsvSink,
+    "binary": BinarySink,
+}
+
+# How often a RotatingSink checks the segment size
+ROTATE_CHECK_INTERVAL = 1.0
+
+
+class RotatingSink:
+    """
+    Writes base_path segments named <base>_<YYYYmmdd-HHMMSS><ext>, rolling
+    over once a segment reaches max_bytes or max_age seconds (0 = no
+    limit). A segment's age counts from its first packet, so an idle
+    server does not leave a trail of empty files. on_rotate(segment_path)
+    runs on the caller's thread after each rollover, e.g. to write interim
+    metrics.
+    """
+
+    def __init__(self, kind, base_path, max_bytes=0, max_age=0, on_rotate=None, **options):
+        self.kind = kind
+        self.base_path = base_path
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self.on_rotate = on_rotate
+        self.options = options
+        self.closers = []
+        self.segments = []
+        self.open_segment()
+
+    @property
+    def path(self):
+        return self.sink.path
+
+    def segment_path(self):
+        root, ext = os.path.splitext(self.base_path)
+        stamp = time.strftime("%Y%m%d-%H%M%S")
+        path = f"{root}_{stamp}{ext}"
+        suffix = 1
+        while os.path.exists(path):
+            path = f"{root}_{stamp}-{suffix}{ext}"
+            suffix += 1
+        return path
+
+    def open_segment(self):
+        self.sink = create_sink(self.kind, self.segment_path(), **self.options)
+        self.segments.append(self.sink.path)
+        self.packets = 0
+        now = time.monotonic()
+        self.opened = now
+        self.next_check = now + ROTATE_CHECK_INTERVAL
+
+    def write_packet(self, *fields, **options):
+        self.sink.write_packet(*fields, **options)
+        self.packets += 1
+        if time.monotonic() >= self.next_check:
+            self.check()
+
+    def poll(self):
+        self.sink.poll()
+        if time.monotonic() >= self.next_check:
+            self.check()
+
+    def check(self):
+        now = time.monotonic()
+        self.next_check = now + ROTATE_CHECK_INTERVAL
+        if not self.packets:
+            # Nothing to rotate; age the segment from its first packet instead
+            self.opened = now
+        elif self.max_age and now - self.opened >= self.max_age:
+            self.rotate()
+        elif self.max_bytes and self.sink.file.tell() >= self.max_bytes:
+            self.rotate()
+
+    def rotate(self):
+        finished = self.sink
+        self.open_segment()
+
+        # Flushing the last rows and closing happen off the receive loop
+        closer = threading.Thread(target=finished.close, name="segment-close")
+        closer.start()
+        self.closers = [t for t in self.closers if t.is_alive()] + [closer]
+
+        if self.on_rotate:
+            self.on_rotate(finished.path)
+
+    def flush(self):
+        self.sink.flush()
+
+    def close(self):
+        self.sink.close()
+        for closer in self.closers:
+            closer.join()
+
+
+def create_sink(kind, path, **options):
+    return SINKS[kind](path, **options)
+
+
+# Readers
+def is_binary_log(path):
+    with open(path, "rb") as f:
+        return f.read(len(MAGIC)) == MAGIC
+
+
+def iter_row_groups(path):
+    """
+    Yield (packet_columns, readings, ages) per row group of a binary log,
+    where packet_columns maps column name to an array of per-packet values.
+    ages is None for version 1 logs, which have no reading ages.
+    """
+    with open(path, "rb") as f:
+        magic, order, version = FILE_HEADER.unpack(f.read(FILE_HEADER.size))
+        if magic != MAGIC:
+            raise ValueError(f"{path} is not a telemetry binary log")
+        swap = order != BYTE_ORDER
+
+        while True:
+            header = f.read(GROUP_HEADER.size)
+            if len(header) < GROUP_HEADER.size:
+                return
+            packets, readings = GROUP_HEADER.unpack(header)
+            yield _read_group(f, packets, readings, version, swap)
+
+
+def _read_group(f, packets, readings, version, swap):
+    """Columns of one row group; f is positioned just past its header."""
+    columns = {}
+    for name, code in PACKET_COLUMNS:
+        column = array(code)
+        column.fromfile(f, packets)
+        if swap:
+            column.byteswap()
+        columns[name] = column
+
+    values = array(READING_TYPECODE)
+    values.fromfile(f, readings)
+    if swap:
+        values.byteswap()
+
+    ages = None
+    if version >= 2:
+        ages = array(AGE_TYPECODE)
+        ages.fromfile(f, readings)
+        if swap:
+            ages.byteswap()
+    return columns, values, ages
+
+
+def iter_packets(path, chunk_rows=DEFAULT_CHUNK_ROWS):
+    """
+    Yield the log one chunk of packets at a time as a dict of numpy
+    arrays: device_id, seq, timestamp (send time), arrival_time,
+    duplicate_flag and readings (count per packet), plus sample_time with
+    one entry per reading, in packet order. Memory stays bounded by chunk_rows
+    whatever the file size. Rows of one packet that straddle a CSV chunk
+    boundary are carried over into the next chunk.
+    """
+    import numpy as np
+
+    if is_binary_log(path):
+        for columns, values, ages in iter_row_groups(path):
+            timestamp = np.frombuffer(columns["timestamp"], dtype=np.float64)
+            counts = np.frombuffer(columns["reading_count"], dtype=np.uint16).astype(np.int64)
+            if ages is None:
+                sample_time = np.repeat(timestamp, counts)
+            else:
+                sample_time = (
+                    np.repeat(np.round(timestamp * 1000), counts) - np.frombuffer(ages, dtype=np.uint32)
+                ) / 1000.0
+            yield {
+                "device_id": np.frombuffer(columns["device_id"], dtype=np.uint16).astype(np.int64),
+                "seq": np.frombuffer(columns["seq"], dtype=np.uint32).astype(np.int64),
+                "timestamp": timestamp,
+                "arrival_time": np.frombuffer(columns["arrival_time"], dtype=np.float64),
+                "duplicate_flag": np.frombuffer(columns["duplicate_flag"], dtype=np.uint8),
+                "readings": counts,
+                "sample_time": sample_time,
+            }
+        return
+
+    import pandas as pd
+
+    fields = ["device_id", "seq", "timestamp", "arrival_time", "duplicate_flag"]
+    # Logs from before the send_time column fall back to the newest sample time
+    with open(path, newline="") as f:
+        if "send_time" in next(csv.reader(f), []):
+            fields.append("send_time")
+    carry = None
+    reader = pd.read_csv(path, usecols=fields, chunksize=chunk_rows)
+    for chunk in reader:
+        rows = {name: chunk[name].to_numpy() for name in fields}
+        if carry is not None:
+            rows = {name: np.concatenate((carry[name], rows[name])) for name in fields}
+
+        # A new packet starts wherever device, seq or arrival changes
+        starts = np.flatnonzero(np.concatenate((
+            [True],
+            (np.diff(rows["device_id"]) != 0)
+            | (np.diff(rows["seq"]) != 0)
+            | (np.diff(rows["arrival_time"]) != 0)
+        )))
+
+        # The last packet may continue in the next chunk
+        carry = {name: rows[name][starts[-1]:] for name in fields}
+        starts = starts[:-1]
+        if len(starts):
+            yield _packets_from_rows(rows, starts, len(carry["seq"]))
+
+    if carry is not None and len(carry["seq"]):
+        yield _packets_from_rows(carry, np.array([0]), 0)
+
+
+def _packets_from_rows(rows, starts, carried):
+    import numpy as np
+
+    end = len(rows["seq"]) - carried
+    counts = np.diff(np.append(starts, end))
+    sample_time = rows["timestamp"][:end].astype(np.float64)
+    if "send_time" in rows:
+        timestamp = rows["send_time"][starts].astype(np.float64)
+    else:
+        # Timed batches give every reading its own sample time; the newest
+        # one is as close to the send time as these older logs get
+        timestamp = np.maximum.reduceat(sample_time, starts)
+    return {
+        "device_id": rows["device_id"][starts].astype(np.int64),
+        "seq": rows["seq"][starts].astype(np.int64),
+        "timestamp": timestamp,
+        "arrival_time": rows["arrival_time"][starts].astype(np.float64),
+        "duplicate_flag": rows["duplicate_flag"][starts],
+        "readings": counts,
+        "sample_time": sample_time,
+    }
+
+
+def read_dataframe(path):
+    """
+    Load a CSV or binary log as a pandas DataFrame with the CSV columns
+    (one row per reading).
+    """
+    import numpy as np
+    import pandas as pd
+
+    if not is_binary_log(path):
+        return pd.read_csv(path)
+
+    frames = []
+    for columns, values, ages in iter_row_groups(path):
+        counts = np.frombuffer(columns["reading_count"], dtype=np.uint16)
+        frame = {
+            name: np.repeat(np.frombuffer(columns[name], dtype=np.dtype(code)), counts)
+            for name, code in PACKET_COLUMNS
+            if name != "reading_count"
+        }
+        frame["send_time"] = frame["timestamp"]
+        if ages is not None:
+            # Per-reading sample time, as in the CSV
+            frame["timestamp"] = (
+                np.round(frame["timestamp"] * 1000) - np.frombuffer(ages, dtype=np.uint32)
+            ) / 1000.0
+        frame["data_value"] = np.frombuffer(values, dtype=np.float64)
+        frames.append(pd.DataFrame(frame, columns=COLUMNS))
+
+    if not frames:
+        return pd.DataFrame(columns=COLUMNS)
+    return pd.concat(frames, ignore_index=True)
+
+
+# Tailing
+# Rows per page of a LogTail and bytes it indexes per refresh() call
+DEFAULT_PAGE_ROWS = 200
+TAIL_READ_BYTES = 4 * 1024 * 1024
+
+
+class LogTail:
+    """
+    Random access to the rows of a CSV or binary log that is still being
+    written. refresh() indexes whatever complete rows were appended since
+    the last call (at most max_bytes per call, so a large file is caught
+    up over several calls), and rows(start, count) reads just those rows
+    back. The index keeps one offset per page_rows CSV rows or per binary
+    row group, so memory stays small whatever the file size.
+    """
+
+    def __init__(self, path, page_rows=DEFAULT_PAGE_ROWS):
+        self.path = path
+        self.page_rows = page_rows
+        self.reset()
+
+    def reset(self):
+        self.binary = None
+        self.offset = 0
+        self.row_count = 0
+        # CSV: byte offset of every page_rows-th row
+        self.pages = []
+        # Binary: first row and byte offset of every row group
+        self.group_rows = []
+        self.group_offsets = []
+        self.version = None
+        self.swap = False
+
+    def refresh(self, max_bytes=TAIL_READ_BYTES):
+        """Index newly appended rows. Returns True once caught up with the file."""
+        try:
+            size = os.path.getsize(self.path)
+        except OSError:
+            return True
+        if size < self.offset:
+            # Truncated by a new run
+            self.reset()
+        if size == self.offset:
+            return True
+
+        with open(self.path, "rb") as f:
+            if self.binary is None:
+                head = f.read(FILE_HEADER.size)
+                if len(head) < len(MAGIC):
+                    return True
+                self.binary = head.startswith(MAGIC)
+            if self.binary:
+                self._refresh_binary(f, size, max_bytes)
+            else:
+                self._refresh_csv(f, max_bytes)
+        return self.offset >= size
+
+    def _refresh_csv(self, f, max_bytes):
+        f.seek(self.offset)
+        data = f.read(max_bytes)
+        # Only complete lines; the server may be mid-write
+        end = data.rfind(b"\n") + 1
+        pos = 0
+        if self.offset == 0:
+            pos = data.find(b"\n") + 1
+            if not pos:
+                return
+
+        while pos < end:
+            if self.row_count % self.page_rows == 0:
+                self.pages.append(self.offset + pos)
+            pos = data.index(b"\n", pos) + 1
+            self.row_count += 1
+        self.offset += end
+
+    def _refresh_binary(self, f, size, max_bytes):
+        if self.offset == 0:
+            if size < FILE_HEADER.size:
+                return
+            f.seek(0)
+            _, order, self.version = FILE_HEADER.unpack(f.read(FILE_HEADER.size))
+            self.swap = order != BYTE_ORDER
+            self.offset = FILE_HEADER.size
+
+        packet_bytes = sum(array(code).itemsize for _, code in PACKET_COLUMNS)
+        reading_bytes = array(READING_TYPECODE).itemsize
+        if self.version >= 2:
+            reading_bytes += array(AGE_TYPECODE).itemsize
+
+        limit = self.offset + max_bytes
+        while self.offset + GROUP_HEADER.size <= size and self.offset < limit:
+            f.seek(self.offset)
+            packets, readings = GROUP_HEADER.unpack(f.read(GROUP_HEADER.size))
+            length = GROUP_HEADER.size + packets * packet_bytes + readings * reading_bytes
+            if self.offset + length > size:
+                break
+            self.group_rows.append(self.row_count)
+            self.group_offsets.append(self.offset)
+            self.row_count += readings
+            self.offset += length
+
+    def rows(self, start, count):
+        """Up to count rows from row start on, as tuples in COLUMNS order."""
+        count = min(count, self.row_count - start)
+        if start < 0 or count <= 0:
+            return []
+        with open(self.path, "rb") as f:
+            if self.binary:
+                return self._binary_rows(f, start, count)
+            return self._csv_rows(f, start, count)
+
+    def _csv_rows(self, f, start, count):
+        page = start // self.page_rows
+        f.seek(self.pages[page])
+        for _ in range(start - page * self.page_rows):
+            f.readline()
+        lines = [f.readline().decode() for _ in range(count)]
+        return [tuple(row) for row in csv.reader(lines)]
+
+    def _binary_rows(self, f, start, count):
+        rows = []
+        group = bisect.bisect_right(self.group_rows, start) - 1
+        while len(rows) < count and group < len(self.group_rows):
+            f.seek(self.group_offsets[group])
+            packets, readings = GROUP_HEADER.unpack(f.read(GROUP_HEADER.size))
+            columns, values, ages = _read_group(f, packets, readings, self.version, self.swap)
+
+            skip = start + len(rows) - self.group_rows[group]
+            reading = 0
+            for p in range(packets):
+                n = columns["reading_count"][p]
+                if reading + n <= skip:
+                    reading += n
+                    continue
+                for k in range(max(reading, skip), reading + n):
+                    timestamp = columns["timestamp"][p]
+                    if ages is not None:
+                        timestamp = (round(timestamp * 1000) - ages[k]) / 1000.0
+                    rows.append((
+                        columns["device_id"][p], columns["seq"][p], timestamp,
+                        columns["arrival_time"][p], columns["duplicate_flag"][p],
+                        columns["gap_flag"][p], values[k], columns["timestamp"][p]
+                    ))
+                    if len(rows) == count:
+                        return rows
+                reading += n
+            group += 1
+        return rows
@@ -1,164 +1,1049 @@
 import socket
 import struct
-import csv
 import time
 import argparse
+import asyncio
+import heapq
+import json
+import logging
+import multiprocessing
 import os
+import queue
+import select
+import signal
+import sys
+
+SERVER_PORT = 9999
+READY_DELAY = 0.5
 
-# Checksum 
-def calculate_checksum(data):
-    return sum(data) % 65536
-
-# Args 
-parser = argparse.ArgumentParser()
-parser.add_argument("--duration", type=int, default=60)
-args = parser.parse_args()
-DURATION = args.duration
-
-# Header 
-HEADER_FORMAT = "!HBBIBHB"
-HEADER_SIZE = struct.calcsize(HEADER_FORMAT)
-
-MSG_INIT = 1
-MSG_DATA = 2
-MSG_HEARTBEAT = 3
-
-# Metrics 
-total_bytes = 0
-packets_received = 0
-duplicate_packets = 0
-sequence_gap_count = 0
-total_cpu_time = 0.0
-total_readings = 0
-
-# CSV Setup 
 PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
-csv_path = os.path.join(PROJECT_ROOT, "sensor_data.csv")
-
-file = open(csv_path, "w", newline="")
-csv_writer = csv.writer(file)
-csv_writer.writerow([
-    "device_id",
-    "seq",
-    "timestamp",
-    "arrival_time",
-    "duplicate_flag",
-    "gap_flag",
-    "data_value"
-])
-
-# Socket 
-server_socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
-server_socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
-server_socket.bind(("0.0.0.0", 9999))
-server_socket.settimeout(1.0)
-
-print("Server is running on port 9999...", flush=True)
-
-SERVER_START = time.time()
-device_last_seq = {}
-start_time = time.time()
-
-# Main Loop 
-while time.time() - start_time < DURATION:
+sys.path.insert(0, PROJECT_ROOT)
+
+from Common.protocol import (
+    MAX_DATAGRAM, MSG_INIT, MSG_DATA, MSG_HEARTBEAT,
+    decode_header, header_size, seq_bits, verify_checksum
+)
+from Common.payload import ENC_ASCII, decode_batch, is_known
+from Common.sinks import (
+    SINKS, DEFAULT_FLUSH_ROWS, DEFAULT_FLUSH_INTERVAL, RotatingSink, create_sink
+)
+from Common.devices import (
+    COUNTER_FIELDS, DEFAULT_IDLE_TIMEOUT, DEFAULT_REORDER_WINDOW, DeviceTable,
+    SEQ_NEW, SEQ_LATE, SEQ_DUPLICATE
+)
+from Common.logs import DEFAULT_STATUS_INTERVAL, add_logging_args, setup_logging
+from Common.profiling import StageTimer, start_profile
+from Common.readiness import mark_ready
+from Common.live import (
+    METRICS_PORT, LiveMetrics,
+    http_response, request_path, write_snapshot
+)
+
+log = logging.getLogger("server")
+
+# Linux reports the socket's cumulative drop counter as ancillary data
+# on every received datagram once SO_RXQ_OVFL is enabled.
+SO_RXQ_OVFL = getattr(socket, "SO_RXQ_OVFL", 40)
+
+
+# Server State
+class ServerState:
+    """
+    Per-device sequence tracking and experiment metrics.
+    Shared by the blocking and asyncio receive modes.
+    """
+
+    def __init__(self, sink, status_interval=DEFAULT_STATUS_INTERVAL, label="Status",
+                 idle_timeout=DEFAULT_IDLE_TIMEOUT, reorder_window=DEFAULT_REORDER_WINDOW,
+                 snapshot_path=None, snapshot_interval=0, profile=False, live_metrics=False):
+        self.sink = sink
+        self.label = label
+        self.start = time.time()
+        self.devices = DeviceTable(idle_timeout, reorder_window)
+
+        # Per-packet trace is only formatted when debug logging is on
+        self.trace = log.isEnabledFor(logging.DEBUG)
+        # Per-stage timings of DATA packets (--profile)
+        self.timer = StageTimer() if profile else None
+        self.status_interval = status_interval
+        self.last_status = time.monotonic()
+        self.last_eviction = time.monotonic()
+        self.status_packets = 0
+        self.status_readings = 0
+        self.status_kernel_drops = 0
+
+        # Rolling windows for the metrics endpoint and snapshot file; kept
+        # only when one of them is on, as they cost time on every packet
+        self.live = LiveMetrics() if live_metrics or snapshot_path else None
+        self.snapshot_path = snapshot_path
+        self.snapshot_interval = snapshot_interval
+        self.last_snapshot = time.monotonic()
+
+        self.total_bytes = 0
+        self.packets_received = 0
+        self.duplicate_packets = 0
+        self.sequence_gap_count = 0
+        self.total_cpu_time = 0.0
+        self.total_readings = 0
+        self.kernel_drops = None
+        # Kernel drops grew during the last second; reported in ACK_HB
+        self.overloaded = False
+        self.tick_kernel_drops = 0
+        # Set by SIGTERM/SIGINT; the receive loops exit at their next wakeup
+        self.stopping = False
+
+        # Late packets that filled an earlier gap, and reorder depth -> count
+        self.late_packets = 0
+        self.too_old_packets = 0
+        self.reorder_histogram = {}
+        # DATA packets whose payload could not be decoded (logged with no readings)
+        self.malformed_payloads = 0
+
+    def arrival(self):
+        return time.time() - self.start
+
+    def process_packet(self, data, arrival):
+        """
+        Decode one datagram and update state.
+        Returns (msg_type, device_id), or None for runt packets.
+        """
+        cpu_start = time.perf_counter()
+        timer = self.timer
+        if timer:
+            packet_start = lap = time.perf_counter_ns()
+
+        header = decode_header(data)
+        if header is None:
+            return None
+
+        seq, device_id, msg_type, timestamp_ms, encoding, checksum, version = header
+        device = self.devices.get(device_id, arrival)
+
+        if msg_type == MSG_INIT:
+            device.reset_sequence(seq, seq_bits(version))
+            device.last_heartbeat = arrival
+            # INIT carries the payload encoding the client would like to use
+            if not is_known(encoding):
+                encoding = ENC_ASCII
+            device.encoding = encoding
+            log.info(f"INIT from device {device_id} (encoding {encoding})")
+            return msg_type, device_id
+
+        if msg_type == MSG_HEARTBEAT:
+            device.last_heartbeat = arrival
+            if self.trace:
+                log.debug(f"Heartbeat from device {device_id}")
+            return msg_type, device_id
+
+        if msg_type != MSG_DATA:
+            return msg_type, device_id
+
+        timestamp = timestamp_ms / 1000.0
+        if timer:
+            lap = timer.lap("header", lap)
+        integrity = verify_checksum(data, checksum, version)
+        if timer:
+            lap = timer.lap("checksum", lap)
+
+        duplicate_flag = 0
+        gap_flag = 0
+        gap = 0
+        size = len(data)
+
+        self.packets_received += 1
+        self.total_bytes += size
+
+        kind, amount = device.classify(seq, seq_bits(version))
+        if kind == SEQ_NEW:
+            if amount:
+                gap_flag = 1
+                gap = amount
+                self.sequence_gap_count += gap
+        elif kind == SEQ_LATE:
+            # Fills a hole counted as a gap when it opened
+            gap = -1
+            self.sequence_gap_count -= 1
+            self.late_packets += 1
+            device.late += 1
+            self.reorder_histogram[amount] = self.reorder_histogram.get(amount, 0) + 1
+        elif kind == SEQ_DUPLICATE:
+            duplicate_flag = 1
+            self.duplicate_packets += 1
+        else:
+            self.too_old_packets += 1
+            device.too_old += 1
+        if timer:
+            lap = timer.lap("sequence", lap)
+
+        try:
+            values, ages = decode_batch(encoding, data[header_size(version):])
+        except ValueError as e:
+            values, ages = [], None
+            self.malformed_payloads += 1
+            log.warning(f"Malformed payload from device {device_id} (packet {seq}): {e}")
+        readings = len(values)
+        self.total_readings += readings
+        if timer:
+            lap = timer.lap("payload", lap)
+
+        self.sink.write_packet(
+            device_id, seq, timestamp,
+            arrival, duplicate_flag,
+            gap_flag, values, ages
+        )
+        if timer:
+            lap = timer.lap("sink", lap)
+
+        device.packets += 1
+        device.readings += readings
+        device.bytes += size
+        device.duplicates += duplicate_flag
+        device.gaps += gap
+        device.last_arrival = arrival
+
+        device.window_packets += 1
+        device.window_readings += readings
+        device.window_gaps += gap
+        device.window_duplicates += duplicate_flag
+
+        if self.live:
+            self.live.record(arrival, size, readings, gap, duplicate_flag, arrival - timestamp)
+        if timer:
+            lap = timer.lap("bookkeeping", lap)
+
+        if self.trace:
+            log.debug(
+                f"Data | Packet {seq} | Readings {readings} | Checksum {'OK' if integrity else 'BAD'}"
+            )
+        elif not integrity:
+            log.warning(f"Bad checksum from device {device_id} (packet {seq})")
+        if timer:
+            timer.lap("log", lap)
+            timer.finish(packet_start)
+
+        self.total_cpu_time += time.perf_counter() - cpu_start
+        return msg_type, device_id
+
+    def tick(self):
+        """Periodic housekeeping; cheap to call on every loop pass."""
+        self.report_status()
+
+        now = time.monotonic()
+        if (self.snapshot_path and self.snapshot_interval > 0
+                and now - self.last_snapshot >= self.snapshot_interval):
+            self.last_snapshot = now
+            self.write_snapshot()
+
+        if now - self.last_eviction < 1.0:
+            return
+        self.last_eviction = now
+
+        if self.kernel_drops is not None:
+            self.overloaded = self.kernel_drops > self.tick_kernel_drops
+            self.tick_kernel_drops = self.kernel_drops
+
+        for device in self.devices.evict_idle(self.arrival()):
+            log.info(
+                f"Device {device.device_id} idle for over "
+                f"{self.devices.idle_timeout:.0f}s — evicted"
+            )
+
+    def report_status(self):
+        """Log one aggregated line per status_interval."""
+        if self.status_interval <= 0:
+            return
+
+        now = time.monotonic()
+        elapsed = now - self.last_status
+        if elapsed < self.status_interval:
+            return
+
+        packets = self.packets_received - self.status_packets
+        readings = self.total_readings - self.status_readings
+        line = f"{self.label} | {packets / elapsed:.1f} pkt/s | {readings / elapsed:.1f} readings/s"
+
+        if self.kernel_drops is not None:
+            line += f" | kernel drops {self.kernel_drops - self.status_kernel_drops}"
+            self.status_kernel_drops = self.kernel_drops
+
+        for device_id, device in sorted(self.devices.live.items()):
+            if device.window_packets:
+                line += (
+                    f" | dev {device_id}: {device.window_packets} pkts, "
+                    f"{device.window_gaps} gaps, {device.window_duplicates} dups"
+                )
+            device.reset_window()
+
+        log.info(line)
+
+        self.last_status = now
+        self.status_packets = self.packets_received
+        self.status_readings = self.total_readings
+
+    def write_metrics(self, metrics_path, report=True):
+        """
+        Write metrics_path; report=False skips the stdout summary (interim
+        metrics written on segment rotation).
+        """
+        if self.packets_received > 0 and self.total_readings > 0:
+            bytes_per_report = self.total_bytes / self.total_readings
+            duplicate_rate = self.duplicate_packets / self.packets_received
+            cpu_ms_per_report = (self.total_cpu_time / self.total_readings) * 1000
+        else:
+            bytes_per_report = 0
+            duplicate_rate = 0
+            cpu_ms_per_report = 0
+
+        breakdown = sorted(self.devices.breakdown().items())
+        stages = self.timer.rows() if self.timer else []
+
+        if report:
+            print("\n Experiment Metrics", flush=True)
+            print(f"Packets received: {self.packets_received}", flush=True)
+            print(f"Total readings received: {self.total_readings}", flush=True)
+            print(f"Bytes per report: {bytes_per_report:.2f}", flush=True)
+            print(f"Duplicate rate: {duplicate_rate:.4f}", flush=True)
+            print(f"Sequence gaps detected: {self.sequence_gap_count}", flush=True)
+            print(f"Late (reordered) packets: {self.late_packets}", flush=True)
+            if self.too_old_packets:
+                print(f"Packets older than the reorder window: {self.too_old_packets}", flush=True)
+            if self.malformed_payloads:
+                print(f"Malformed payloads: {self.malformed_payloads}", flush=True)
+            print(f"CPU ms per report: {cpu_ms_per_report:.4f}", flush=True)
+            if self.kernel_drops is not None:
+                # Drops in the kernel receive queue show up as sequence gaps too;
+                # whatever remains is loss that happened on the network.
+                print(f"Kernel drops: {self.kernel_drops}", flush=True)
+                print(
+                    f"Protocol gaps beyond kernel drops: "
+                    f"{max(0, self.sequence_gap_count - self.kernel_drops)}",
+                    flush=True
+                )
+
+            if breakdown:
+                print("\n Per-Device Metrics", flush=True)
+                widths = (8, 9, 9, 10, 6, 6, 7)
+                print(f"{'device':>6} " + " ".join(
+                    f"{name:>{width}}" for name, width in zip(COUNTER_FIELDS, widths)
+                ), flush=True)
+                for device_id, counters in breakdown:
+                    print(f"{device_id:>6} " + " ".join(
+                        f"{value:>{width}}" for value, width in zip(counters, widths)
+                    ), flush=True)
+
+            if stages:
+                print("\n Stage Timings (ns per DATA packet)", flush=True)
+                print(f"{'stage':>11} {'count':>9} {'mean':>9} {'p50':>9} {'p99':>9} {'share':>6}",
+                      flush=True)
+                for name, count, mean, p50, p99, share in stages:
+                    print(f"{name:>11} {count:>9} {mean:>9.0f} {p50:>9.0f} {p99:>9.0f} "
+                          f"{share:>6.1%}", flush=True)
+
+        with open(metrics_path, "w") as f:
+            f.write(f"bytes_per_report {bytes_per_report}\n")
+            f.write(f"packets_received {self.packets_received}\n")
+            f.write(f"duplicate_rate {duplicate_rate}\n")
+            f.write(f"sequence_gap_count {self.sequence_gap_count}\n")
+            f.write(f"cpu_ms_per_report {cpu_ms_per_report}\n")
+            if self.kernel_drops is not None:
+                f.write(f"kernel_drops {self.kernel_drops}\n")
+            f.write(f"late_packets {self.late_packets}\n")
+            f.write(f"too_old_packets {self.too_old_packets}\n")
+            f.write(f"malformed_payloads {self.malformed_payloads}\n")
+            for depth, count in sorted(self.reorder_histogram.items()):
+                f.write(f"reorder_depth_{depth} {count}\n")
+            f.write(f"devices_evicted {self.devices.evictions}\n")
+            for name, count, mean, p50, p99, share in stages:
+                f.write(f"stage_{name}_count {count}\n")
+                f.write(f"stage_{name}_mean_ns {mean:.0f}\n")
+                f.write(f"stage_{name}_p50_ns {p50:.0f}\n")
+                f.write(f"stage_{name}_p99_ns {p99:.0f}\n")
+                f.write(f"stage_{name}_share {share:.4f}\n")
+            for device_id, counters in breakdown:
+                for name, value in zip(COUNTER_FIELDS, counters):
+                    f.write(f"device_{device_id}_{name} {value}\n")
+
+        if report:
+            print(f"Metrics written to {metrics_path}", flush=True)
+
+    def live_gauges(self):
+        gauges = {
+            "devices_live": len(self.devices.live),
+            "late_packets": self.late_packets,
+            "too_old_packets": self.too_old_packets,
+        }
+        if self.kernel_drops is not None:
+            gauges["kernel_drops"] = self.kernel_drops
+        return gauges
+
+    def metrics_body(self, kind):
+        """Body for the metrics endpoint: 'json' or Prometheus text."""
+        if kind == "json":
+            return json.dumps(self.live.snapshot(self.arrival(), {"server": self.live_gauges()}))
+        return self.live.prometheus(self.arrival(), self.live_gauges())
+
+    def segment_finished(self, segment_path):
+        """
+        RotatingSink callback: cumulative metrics as of the rollover, next
+        to the finished segment, plus a fresh live snapshot.
+        """
+        log.info(f"Rotated output; finished {os.path.basename(segment_path)}")
+        self.write_metrics(os.path.splitext(segment_path)[0] + ".metrics.txt", report=False)
+        if self.snapshot_path:
+            self.write_snapshot()
+
+    def write_snapshot(self):
+        try:
+            write_snapshot(
+                self.snapshot_path,
+                self.live.snapshot(self.arrival(), {"label": self.label, "server": self.live_gauges()})
+            )
+        except OSError as e:
+            log.warning(f"Could not write {self.snapshot_path}: {e}")
+
+    def init_ack(self, device_id):
+        """ACK_INIT reply; v1 (ascii) clients get the bare message."""
+        device = self.devices.live.get(device_id)
+        encoding = device.encoding if device else ENC_ASCII
+        if encoding == ENC_ASCII:
+            return b"ACK_INIT"
+        return b"ACK_INIT" + bytes([encoding])
+
+    def heartbeat_ack(self, device_id):
+        """
+        ACK_HB plus a load byte: 1 asks the client to back off, because
+        the kernel dropped packets or this device's packets went missing
+        since its last heartbeat.
+        """
+        device = self.devices.live.get(device_id)
+        lossy = False
+        if device:
+            lossy = device.gaps > device.heartbeat_gaps
+            device.heartbeat_gaps = device.gaps
+        return b"ACK_HB" + bytes([1 if self.overloaded or lossy else 0])
+
+    def counters(self):
+        return {
+            "total_bytes": self.total_bytes,
+            "packets_received": self.packets_received,
+            "duplicate_packets": self.duplicate_packets,
+            "sequence_gap_count": self.sequence_gap_count,
+            "total_cpu_time": self.total_cpu_time,
+            "total_readings": self.total_readings,
+            "kernel_drops": self.kernel_drops,
+            "late_packets": self.late_packets,
+            "too_old_packets": self.too_old_packets,
+            "malformed_payloads": self.malformed_payloads,
+            "reorder_histogram": self.reorder_histogram,
+            "evictions": self.devices.evictions,
+            "devices": self.devices.breakdown(),
+            "timer": self.timer,
+        }
+
+    def merge(self, counters):
+        """Add another worker's counters into this state."""
+        self.total_bytes += counters["total_bytes"]
+        self.packets_received += counters["packets_received"]
+        self.duplicate_packets += counters["duplicate_packets"]
+        self.sequence_gap_count += counters["sequence_gap_count"]
+        self.total_cpu_time += counters["total_cpu_time"]
+        self.total_readings += counters["total_readings"]
+        if counters["kernel_drops"] is not None:
+            self.kernel_drops = (self.kernel_drops or 0) + counters["kernel_drops"]
+        self.late_packets += counters["late_packets"]
+        self.too_old_packets += counters["too_old_packets"]
+        self.malformed_payloads += counters["malformed_payloads"]
+        for depth, count in counters["reorder_histogram"].items():
+            self.reorder_histogram[depth] = self.reorder_histogram.get(depth, 0) + count
+        self.devices.evictions += counters["evictions"]
+        for device_id, values in counters["devices"].items():
+            self.devices.totals_for(device_id).add_counters(values)
+        if counters["timer"]:
+            if self.timer is None:
+                self.timer = StageTimer()
+            self.timer.merge(counters["timer"])
+
+
+# Socket
+def create_socket(rcvbuf, reuseport=False, port=SERVER_PORT):
+    server_socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    server_socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    if reuseport:
+        # Kernel hashes each source address onto one of the bound sockets,
+        # so a device always lands on the same worker.
+        server_socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+    server_socket.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, rcvbuf)
+    server_socket.bind(("0.0.0.0", port))
+    server_socket.setblocking(False)
+    return server_socket
+
+
+def create_metrics_socket(port):
+    """Localhost TCP listener for the metrics endpoint, or None."""
+    if not port:
+        return None
+    listener = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    listener.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    try:
+        listener.bind(("127.0.0.1", port))
+    except OSError as e:
+        log.warning(f"Metrics endpoint disabled: cannot bind 127.0.0.1:{port} ({e})")
+        listener.close()
+        return None
+    listener.listen(8)
+    listener.setblocking(False)
+    return listener
+
+
+# Blocking Mode
+def serve_metrics(listener, state):
+    """Answer every pending metrics request; one short exchange each."""
+    while True:
+        try:
+            conn, _ = listener.accept()
+        except (BlockingIOError, InterruptedError):
+            return
+        try:
+            conn.settimeout(0.5)
+            path = request_path(conn.recv(4096))
+            conn.sendall(http_response(path, state.metrics_body))
+        except OSError:
+            pass
+        finally:
+            conn.close()
+
+
+class BatchReceiver:
+    """
+    Drains every queued datagram (up to batch_size) into a preallocated
+    pool of buffers without blocking.
+    """
+
+    def __init__(self, server_socket, batch_size, state):
+        self.sock = server_socket
+        self.batch_size = batch_size
+        self.state = state
+
+        self.pool = [bytearray(MAX_DATAGRAM) for _ in range(batch_size)]
+        self.views = [memoryview(buf) for buf in self.pool]
+        self.sizes = [0] * batch_size
+        self.addrs = [None] * batch_size
+        self.arrivals = [0.0] * batch_size
+        self.anc_size = socket.CMSG_SPACE(4)
+
+        self.track_drops = False
+        if sys.platform.startswith("linux"):
+            try:
+                self.sock.setsockopt(socket.SOL_SOCKET, SO_RXQ_OVFL, 1)
+                self.track_drops = True
+                state.kernel_drops = 0
+            except OSError:
+                pass
+
+    def drain(self):
+        """Returns the number of pool slots filled."""
+        count = 0
+
+        while count < self.batch_size:
+            try:
+                if self.track_drops:
+                    nbytes, ancdata, _, addr = self.sock.recvmsg_into(
+                        [self.views[count]], self.anc_size
+                    )
+                    for level, ctype, cdata in ancdata:
+                        if level == socket.SOL_SOCKET and ctype == SO_RXQ_OVFL:
+                            drops = struct.unpack("I", cdata[:4])[0]
+                            self.state.kernel_drops = max(self.state.kernel_drops, drops)
+                else:
+                    nbytes, addr = self.sock.recvfrom_into(self.views[count])
+            except (BlockingIOError, InterruptedError):
+                break
+
+            self.sizes[count] = nbytes
+            self.addrs[count] = addr
+            self.arrivals[count] = self.state.arrival()
+            count += 1
+
+        return count
+
+    def packet(self, i):
+        """
+        Slot i as bytes. One small copy out of the pool is cheaper than
+        decoding through memoryview slices (Benchmarks/codec_bench.py).
+        """
+        return self.views[i][:self.sizes[i]].tobytes()
+
+
+class PendingReady:
+    """
+    ACK_READYs owed READY_DELAY after each INIT, as a heap of
+    (deadline, addr), so the blocking loop never sleeps on a handshake.
+    A retried INIT replaces the outstanding ACK_READY, as in asyncio mode.
+    """
+
+    def __init__(self):
+        self.heap = []
+        self.deadlines = {}
+
+    def add(self, addr, now):
+        deadline = now + READY_DELAY
+        self.deadlines[addr] = deadline
+        heapq.heappush(self.heap, (deadline, addr))
+
+    def timeout(self, now, limit):
+        """select() timeout: at most limit, and no later than the next deadline."""
+        if not self.heap:
+            return limit
+        return min(limit, max(0.0, self.heap[0][0] - now))
+
+    def send_due(self, server_socket, now):
+        while self.heap and self.heap[0][0] <= now:
+            deadline, addr = heapq.heappop(self.heap)
+            # Superseded by a later INIT from the same address
+            if self.deadlines.get(addr) != deadline:
+                continue
+            del self.deadlines[addr]
+            server_socket.sendto(b"ACK_READY", addr)
+
+
+def run_blocking(server_socket, state, duration, recv_batch, metrics_socket=None):
+    receiver = BatchReceiver(server_socket, recv_batch, state)
+    pending = PendingReady()
+    start_time = time.time()
+    watched = [server_socket] + ([metrics_socket] if metrics_socket else [])
+
+    while not state.stopping and time.time() - start_time < duration:
+        readable, _, _ = select.select(watched, [], [], pending.timeout(time.monotonic(), 1.0))
+        pending.send_due(server_socket, time.monotonic())
+        state.tick()
+        if metrics_socket in readable:
+            serve_metrics(metrics_socket, state)
+        if server_socket not in readable:
+            state.sink.poll()
+            continue
+
+        received = receiver.drain()
+
+        for i in range(received):
+            addr = receiver.addrs[i]
+            result = state.process_packet(receiver.packet(i), receiver.arrivals[i])
+            if not result:
+                continue
+            if result[0] == MSG_HEARTBEAT:
+                server_socket.sendto(state.heartbeat_ack(result[1]), addr)
+            elif result[0] == MSG_INIT:
+                server_socket.sendto(state.init_ack(result[1]), addr)
+                pending.add(addr, time.monotonic())
+
+
+# Asyncio Mode
+class TelemetryProtocol(asyncio.DatagramProtocol):
+    """
+    Non-blocking server: ACK_READY is a scheduled callback, so an INIT
+    never stalls DATA or HEARTBEAT handling for other devices.
+    """
+
+    def __init__(self, state):
+        self.state = state
+        self.transport = None
+        self.pending_ready = {}
+
+    def connection_made(self, transport):
+        self.transport = transport
+
+    def datagram_received(self, data, addr):
+        result = self.state.process_packet(data, self.state.arrival())
+        if not result:
+            return
+        if result[0] == MSG_HEARTBEAT:
+            self.transport.sendto(self.state.heartbeat_ack(result[1]), addr)
+            return
+        if result[0] != MSG_INIT:
+            return
+
+        self.transport.sendto(self.state.init_ack(result[1]), addr)
+
+        # A retried INIT replaces the outstanding ACK_READY
+        pending = self.pending_ready.pop(addr, None)
+        if pending:
+            pending.cancel()
+        self.pending_ready[addr] = asyncio.get_running_loop().call_later(
+            READY_DELAY, self.send_ready, addr
+        )
+
+    def send_ready(self, addr):
+        self.pending_ready.pop(addr, None)
+        if self.transport and not self.transport.is_closing():
+            self.transport.sendto(b"ACK_READY", addr)
+
+    def error_received(self, exc):
+        log.warning(f"Socket error: {exc}")
+
+
+async def handle_metrics(reader, writer, state):
+    try:
+        request = await asyncio.wait_for(reader.read(4096), 0.5)
+        writer.write(http_response(request_path(request), state.metrics_body))
+        await writer.drain()
+    except (OSError, asyncio.TimeoutError):
+        pass
+    finally:
+        writer.close()
+
+
+async def run_asyncio(server_socket, state, duration, metrics_socket=None):
+    loop = asyncio.get_running_loop()
+    transport, protocol = await loop.create_datagram_endpoint(
+        lambda: TelemetryProtocol(state), sock=server_socket
+    )
+    metrics_server = None
+    if metrics_socket:
+        metrics_server = await asyncio.start_server(
+            lambda reader, writer: handle_metrics(reader, writer, state),
+            sock=metrics_socket
+        )
     try:
-        data, addr = server_socket.recvfrom(1024)
-    except socket.timeout:
-        continue
+        deadline = loop.time() + duration
+        while not state.stopping and loop.time() < deadline:
+            await asyncio.sleep(min(1.0, deadline - loop.time()))
+            state.sink.poll()
+            state.tick()
+    finally:
+        for pending in protocol.pending_ready.values():
+            pending.cancel()
+        transport.close()
+        if metrics_server:
+            metrics_server.close()
 
-    cpu_start = time.perf_counter()
-    arrival = time.time() - SERVER_START
 
-    if len(data) < HEADER_SIZE:
-        continue
+# Serving
+def open_sink(args, path):
+    options = {"flush_rows": args.flush_rows, "flush_interval": args.flush_interval}
+    if rotating(args):
+        return RotatingSink(
+            args.sink, path,
+            max_bytes=int(args.rotate_size * 1024 * 1024),
+            max_age=args.rotate_interval,
+            **options
+        )
+    return create_sink(args.sink, path, **options)
 
-    seq, device_id, msg_type, timestamp_ms, _, checksum, version = struct.unpack(
-        HEADER_FORMAT, data[:HEADER_SIZE]
+
+def rotating(args):
+    return args.rotate_size > 0 or args.rotate_interval > 0
+
+
+def stop_on_signals(state):
+    """SIGTERM/SIGINT end the receive loop so buffers and metrics are written."""
+    def handler(signum, frame):
+        log.info(f"{state.label}: received {signal.Signals(signum).name}, shutting down")
+        state.stopping = True
+
+    signal.signal(signal.SIGTERM, handler)
+    signal.signal(signal.SIGINT, handler)
+
+
+def serve(args, data_path, reuseport=False, label="Server", metrics_port=0, snapshot_path=None,
+          profile_path=None, on_bound=None):
+    """
+    Run one receive loop writing to data_path. on_bound() is called once
+    the socket is bound. Returns its ServerState.
+    """
+    sink = open_sink(args, data_path)
+    metrics_socket = create_metrics_socket(metrics_port)
+
+    server_socket = create_socket(args.rcvbuf, reuseport, args.port)
+    actual_rcvbuf = server_socket.getsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF)
+    log.info(
+        f"{label} is running on port {args.port}... "
+        f"(mode={args.mode}, rcvbuf={actual_rcvbuf})"
     )
+    if on_bound:
+        on_bound()
 
-    timestamp = timestamp_ms / 1000.0
-    temp_data = data[:9] + b"\x00\x00" + data[11:]
-    integrity = calculate_checksum(temp_data) == checksum
+    if metrics_socket:
+        log.info(f"{label} metrics on http://127.0.0.1:{metrics_port}/ (Prometheus text, /json)")
 
-    duplicate_flag = 0
-    gap_flag = 0
+    state = ServerState(
+        sink, args.status_interval, f"{label} status",
+        args.idle_timeout, args.reorder_window,
+        snapshot_path, args.snapshot_interval, args.profile,
+        live_metrics=metrics_socket is not None
+    )
+    if isinstance(sink, RotatingSink):
+        sink.on_rotate = state.segment_finished
+    stop_on_signals(state)
 
-    if msg_type == MSG_INIT:
-        device_last_seq[device_id] = seq
-        server_socket.sendto(b"ACK_INIT", addr)
-        time.sleep(0.5)
-        server_socket.sendto(b"ACK_READY", addr)
-        print(f"INIT from device {device_id}", flush=True)
-        continue
+    profiler = start_profile(profile_path) if profile_path else None
+    if args.mode == "asyncio":
+        asyncio.run(run_asyncio(server_socket, state, args.duration, metrics_socket))
+    else:
+        run_blocking(server_socket, state, args.duration, max(1, args.recv_batch), metrics_socket)
+    if profiler:
+        profiler.stop()
+        profiler.write(profile_path)
+        log.info(f"{label} profile written to {profile_path}")
 
-    if msg_type == MSG_HEARTBEAT:
-        print(f"Heartbeat from device {device_id}", flush=True)
-        continue
+    if snapshot_path:
+        state.write_snapshot()
+    sink.close()
+    server_socket.close()
+    if metrics_socket:
+        metrics_socket.close()
+    return state
 
-    if msg_type == MSG_DATA:
-        packets_received += 1
-        total_bytes += len(data)
 
-        if device_id in device_last_seq:
-            last = device_last_seq[device_id]
-            if seq == last:
-                duplicate_flag = 1
-                duplicate_packets += 1
-            elif seq > last + 1:
-                gap_flag = 1
-                sequence_gap_count += (seq - last - 1)
+def worker_main(index, args, data_path, bound, results):
+    setup_logging(args, "server")
+    state = serve(
+        args, data_path, reuseport=True, label=f"Worker {index}",
+        # Each worker serves its own port and snapshot file
+        metrics_port=args.metrics_port + index if args.metrics_port else 0,
+        snapshot_path=snapshot_path(args, f"_worker{index}"),
+        profile_path=worker_path(args.profile_output, index),
+        on_bound=lambda: bound.put(index)
+    )
+    results.put((index, state.counters()))
+
+
+def run_workers(args, data_path, metrics_path):
+    """
+    Start args.workers processes sharing the port via SO_REUSEPORT, then
+    merge their output parts and metrics once they all finish. The ready
+    file is written here, once every worker has bound its socket.
+    """
+    bound = multiprocessing.Queue()
+    results = multiprocessing.Queue()
+    if rotating(args):
+        # Each worker keeps its own segment series; there is no merge
+        root, ext = os.path.splitext(data_path)
+        part_paths = [f"{root}_worker{i}{ext}" for i in range(args.workers)]
+    else:
+        part_paths = [f"{data_path}.worker{i}" for i in range(args.workers)]
+
+    workers = [
+        multiprocessing.Process(
+            target=worker_main,
+            args=(i, args, part_paths[i], bound, results)
+        )
+        for i in range(args.workers)
+    ]
+    for proc in workers:
+        proc.start()
 
-        device_last_seq[device_id] = seq
+    # A signal sent to the parent alone still stops every worker cleanly
+    def forward(signum, frame):
+        for proc in workers:
+            if proc.is_alive():
+                proc.terminate()
 
-        payload = data[HEADER_SIZE:].decode(errors="ignore")
-        values = payload.split(",") if "," in payload else [payload]
-        total_readings += len(values)
+    signal.signal(signal.SIGTERM, forward)
+    signal.signal(signal.SIGINT, forward)
 
-        for v in values:
-            csv_writer.writerow([
-                device_id, seq, timestamp,
-                arrival, duplicate_flag,
-                gap_flag, v
-            ])
+    if wait_bound(bound, workers) and args.ready_file:
+        mark_ready(args.ready_file, args.port)
 
-        print(
-            f"Data | Packet {seq} | Readings {len(values)} | Checksum {'OK' if integrity else 'BAD'}",
-            flush=True
+    merged = ServerState(None)
+    for _ in workers:
+        index, counters = collect(results, workers)
+        if index is None:
+            log.warning("A worker exited without reporting its metrics")
+            break
+        log.info(
+            f"Worker {index}: packets={counters['packets_received']} "
+            f"duplicates={counters['duplicate_packets']} "
+            f"gaps={counters['sequence_gap_count']}"
         )
+        merged.merge(counters)
 
-    total_cpu_time += time.perf_counter() - cpu_start
+    for proc in workers:
+        proc.join()
 
-# Metrics Summary 
-print("\n Experiment Metrics", flush=True)
+    if not rotating(args):
+        SINKS[args.sink].merge(part_paths, data_path)
+        for part in part_paths:
+            if os.path.exists(part):
+                os.remove(part)
 
-if packets_received > 0 and total_readings > 0:
-    bytes_per_report = total_bytes / total_readings
-    duplicate_rate = duplicate_packets / packets_received
-    cpu_ms_per_report = (total_cpu_time / total_readings) * 1000
-else:
-    bytes_per_report = 0
-    duplicate_rate = 0
-    cpu_ms_per_report = 0
+    merged.write_metrics(metrics_path)
 
-print(f"Packets received: {packets_received}", flush=True)
-print(f"Total readings received: {total_readings}", flush=True)
-print(f"Bytes per report: {bytes_per_report:.2f}", flush=True)
-print(f"Duplicate rate: {duplicate_rate:.4f}", flush=True)
-print(f"Sequence gaps detected: {sequence_gap_count}", flush=True)
-print(f"CPU ms per report: {cpu_ms_per_report:.4f}", flush=True)
 
-# Write metrics to file
-PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
-metrics_path = os.path.join(PROJECT_ROOT, "metrics.txt")
+def wait_bound(bound, workers):
+    """True once every worker has reported its socket bound, False if one exits first."""
+    for _ in workers:
+        while True:
+            try:
+                bound.get(timeout=1.0)
+                break
+            except queue.Empty:
+                if not all(proc.is_alive() for proc in workers):
+                    log.warning("A worker exited before binding its socket")
+                    return False
+    return True
+
+
+def collect(results, workers):
+    """Next worker result, or (None, None) once no worker is left to send one."""
+    while True:
+        try:
+            return results.get(timeout=1.0)
+        except queue.Empty:
+            if not any(proc.is_alive() for proc in workers):
+                return None, None
+
+
+def worker_path(path, index):
+    """path with .worker<index> before its extension (None stays None)."""
+    if not path:
+        return None
+    root, ext = os.path.splitext(path)
+    return f"{root}.worker{index}{ext}"
 
-with open(metrics_path, "w") as f:
-    f.write(f"bytes_per_report {bytes_per_report}\n")
-    f.write(f"packets_received {packets_received}\n")
-    f.write(f"duplicate_rate {duplicate_rate}\n")
-    f.write(f"sequence_gap_count {sequence_gap_count}\n")
-    f.write(f"cpu_ms_per_report {cpu_ms_per_report}\n")
 
-print(f"Metrics written to {metrics_path}", flush=True)
+def snapshot_path(args, suffix=""):
+    if args.snapshot_interval <= 0:
+        return None
+    return os.path.join(args.output_dir, f"metrics_live{suffix}.json")
+
+
+# Main
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--duration", type=int, default=60)
+    parser.add_argument("--port", type=int, default=SERVER_PORT, help="UDP port to receive on")
+    parser.add_argument(
+        "--output_dir",
+        default=PROJECT_ROOT,
+        help="Directory for sensor_data, metrics.txt and metrics_live.json (default: project root)"
+    )
+    parser.add_argument(
+        "--ready_file",
+        help="Create this file once the socket (every worker's, with --workers) is bound, "
+             "for launchers to wait on"
+    )
+    parser.add_argument(
+        "--daemon",
+        action="store_true",
+        help="Ignore --duration and run until SIGTERM/SIGINT"
+    )
+    parser.add_argument(
+        "--mode",
+        default="blocking",
+        choices=["blocking", "asyncio"],
+        help="Receive loop implementation"
+    )
+    parser.add_argument(
+        "--rcvbuf",
+        type=int,
+        default=4 * 1024 * 1024,
+        help="Requested SO_RCVBUF size in bytes"
+    )
+    parser.add_argument(
+        "--recv_batch",
+        type=int,
+        default=64,
+        help="Max datagrams drained from the socket per receive pass"
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=1,
+        help="Number of SO_REUSEPORT worker processes"
+    )
+    parser.add_argument(
+        "--sink",
+        default="csv",
+        choices=sorted(SINKS),
+        help="Output format (binary writes sensor_data.bin)"
+    )
+    parser.add_argument(
+        "--flush_rows",
+        type=int,
+        default=DEFAULT_FLUSH_ROWS,
+        help="Flush the sink after this many buffered readings"
+    )
+    parser.add_argument(
+        "--flush_interval",
+        type=float,
+        default=DEFAULT_FLUSH_INTERVAL,
+        help="Flush the sink at least this often (seconds)"
+    )
+    parser.add_argument(
+        "--idle_timeout",
+        type=float,
+        default=DEFAULT_IDLE_TIMEOUT,
+        help="Evict devices silent (no data or heartbeat) for this many seconds (0 keeps them)"
+    )
+    parser.add_argument(
+        "--reorder_window",
+        type=int,
+        default=DEFAULT_REORDER_WINDOW,
+        help="Per-device sliding window (packets) for late/duplicate detection"
+    )
+    parser.add_argument(
+        "--metrics_port",
+        type=int,
+        default=0,
+        help=f"Localhost TCP port for live metrics (Prometheus text, /json), e.g. {METRICS_PORT}; "
+             "0 (default) disables. Workers use consecutive ports"
+    )
+    parser.add_argument(
+        "--snapshot_interval",
+        type=float,
+        default=0,
+        help="Seconds between live snapshots to metrics_live.json; 0 (default) disables"
+    )
+    parser.add_argument(
+        "--rotate_size",
+        type=float,
+        default=0,
+        help="Start a new timestamped output segment after this many MB (0 disables)"
+    )
+    parser.add_argument(
+        "--rotate_interval",
+        type=float,
+        default=0,
+        help="Start a new timestamped output segment after this many seconds (0 disables)"
+    )
+    parser.add_argument(
+        "--profile",
+        action="store_true",
+        help="Time each stage of the DATA packet path and add the breakdown to metrics.txt"
+    )
+    parser.add_argument(
+        "--profile_output",
+        help="At shutdown write a cProfile dump (.prof/.pstats) or, for any other "
+             "extension, sampled collapsed stacks for flamegraph tools"
+    )
+    add_logging_args(parser)
+    args = parser.parse_args()
+
+    setup_logging(args, "server")
+
+    if args.daemon:
+        args.duration = float("inf")
+        log.info("Daemon mode: running until SIGTERM/SIGINT")
+
+    os.makedirs(args.output_dir, exist_ok=True)
+    data_path = os.path.join(args.output_dir, "sensor_data" + SINKS[args.sink].extension)
+    metrics_path = os.path.join(args.output_dir, "metrics.txt")
+
+    if args.workers > 1:
+        if not hasattr(socket, "SO_REUSEPORT"):
+            log.error("SO_REUSEPORT is not supported on this platform.")
+            sys.exit(1)
+        run_workers(args, data_path, metrics_path)
+        return
+
+    state = serve(
+        args, data_path,
+        metrics_port=args.metrics_port,
+        snapshot_path=snapshot_path(args),
+        profile_path=args.profile_output,
+        on_bound=(lambda: mark_ready(args.ready_file, args.port)) if args.ready_file else None
+    )
+    state.write_metrics(metrics_path)
+
 
-file.close()
-server_socket.close()
+if __name__ == "__main__":
+    main()
@@ -2,6 +2,11 @@
 
 TESTS=("normal" "loss5" "delay100")
 
+# ./run_all_tests.sh --proxy runs the wider matrix through ImpairProxy, without sudo
+if [ "$1" == "--proxy" ]; then
+    TESTS+=("burst5" "reorder25" "duplicate5" "rate64k" "lossy_wan")
+fi
+
 echo "Running all loopback tests..."
 echo ""
 
@@ -9,7 +14,7 @@ for t in "${TESTS[@]}"; do
     echo "------------------------------------------"
     echo "[START] Running test: $t"
     echo "------------------------------------------"
-    ./run_test.sh "$t"
+    ./run_test.sh "$t" "$@"
     echo ""
 done
 
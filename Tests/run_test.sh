@@ -25,9 +25,17 @@ CLIENTS=1
 
 TEST_NAME="$1"
 
+# --proxy impairs traffic with Automation/ImpairProxy.py instead of
+# netem: no sudo, only this test's flows, and any profile it knows.
+USE_PROXY=0
+if [ "$2" == "--proxy" ]; then
+    USE_PROXY=1
+fi
+
 if [ -z "$TEST_NAME" ]; then
-    echo "Usage: ./run_test.sh <test_name>"
+    echo "Usage: ./run_test.sh <test_name> [--proxy]"
     echo "Example tests: loss5, delay100, normal"
+    echo "With --proxy also: burst5, reorder25, duplicate5, rate64k, lossy_wan"
     exit 1
 fi
 
@@ -40,39 +48,53 @@ echo ""
 
 
 #########################################
-# APPLY NETEM (LOOPBACK)
+# USERSPACE PROXY (NO ROOT)
 #########################################
 
-echo "[INFO] Applying netem settings to loopback..."
-sudo tc qdisc del dev $IFACE root 2>/dev/null
-
-case "$TEST_NAME" in
-    loss5)
-        echo "[INFO] Applying 5% packet loss on lo"
-        sudo tc qdisc add dev $IFACE root netem loss 5%
-        ;;
-    delay100)
-        echo "[INFO] Applying 100ms delay ±10ms jitter on lo"
-        sudo tc qdisc add dev $IFACE root netem delay 100ms 10ms
-        ;;
-    normal)
-        echo "[INFO] Running without impairment"
-        ;;
-    *)
-        echo "[WARN] Unknown test '$TEST_NAME'. Running without netem."
-        ;;
-esac
-
-tc qdisc show dev $IFACE > "$RESULT_DIR/netem_settings.txt"
+if [ "$USE_PROXY" -eq 1 ]; then
+    if ! python3 -c "import sys; sys.path.insert(0, '$PROJECT_ROOT'); from Common.impairment import PROFILES; sys.exit('$TEST_NAME' not in PROFILES)"; then
+        echo "[WARN] Unknown proxy profile '$TEST_NAME'. Running without impairment."
+        PROFILE="normal"
+    else
+        PROFILE="$TEST_NAME"
+    fi
+    echo "[INFO] Impairing through ImpairProxy (profile $PROFILE)"
+    echo "ImpairProxy profile $PROFILE" > "$RESULT_DIR/netem_settings.txt"
+    IMPAIR_ARGS=(--impair "$PROFILE")
+fi
 
 
 #########################################
-# PACKET CAPTURE (tcpdump on lo)
+# APPLY NETEM + TCPDUMP (LOOPBACK, ROOT)
 #########################################
 
-echo "[INFO] Starting tcpdump on loopback..."
-sudo tcpdump -i $IFACE -w "$RESULT_DIR/trace.pcap" > /dev/null 2>&1 &
-TCPDUMP_PID=$!
+if [ "$USE_PROXY" -eq 0 ]; then
+    echo "[INFO] Applying netem settings to loopback..."
+    sudo tc qdisc del dev $IFACE root 2>/dev/null
+
+    case "$TEST_NAME" in
+        loss5)
+            echo "[INFO] Applying 5% packet loss on lo"
+            sudo tc qdisc add dev $IFACE root netem loss 5%
+            ;;
+        delay100)
+            echo "[INFO] Applying 100ms delay ±10ms jitter on lo"
+            sudo tc qdisc add dev $IFACE root netem delay 100ms 10ms
+            ;;
+        normal)
+            echo "[INFO] Running without impairment"
+            ;;
+        *)
+            echo "[WARN] Unknown test '$TEST_NAME'. Running without netem."
+            ;;
+    esac
+
+    tc qdisc show dev $IFACE > "$RESULT_DIR/netem_settings.txt"
+
+    echo "[INFO] Starting tcpdump on loopback..."
+    sudo tcpdump -i $IFACE -w "$RESULT_DIR/trace.pcap" > /dev/null 2>&1 &
+    TCPDUMP_PID=$!
+fi
 
 
 #########################################
@@ -85,7 +107,7 @@ if [ ! -f "$TESTRUNNER" ]; then
 fi
 
 echo "[INFO] Running TestRunner (client + server on 127.0.0.1)..."
-python3 "$TESTRUNNER" "$SERVER_IP" "$DURATION" "$BATCH" "$CLIENTS" \
+python3 "$TESTRUNNER" "$SERVER_IP" "$DURATION" "$BATCH" "$CLIENTS" "${IMPAIR_ARGS[@]}" \
     | tee "$RESULT_DIR/test_output.log"
 
 
@@ -108,6 +130,7 @@ fi
 if [ -f "$OUT_CSV" ]; then
     echo "[INFO] Running loss/gap analysis..."
     python3 "$PROJECT_ROOT/analyze_loss.py" "$OUT_CSV" \
+        --json "$RESULT_DIR/analysis_${TEST_NAME}_${TIMESTAMP}.json" \
         | tee "$RESULT_DIR/analysis_${TEST_NAME}_${TIMESTAMP}.txt"
 else
     echo "[WARN] Cannot analyze – CSV missing."
@@ -118,11 +141,13 @@ fi
 # CLEANUP
 #########################################
 
-echo "[INFO] Stopping tcpdump..."
-sudo kill $TCPDUMP_PID 2>/dev/null
+if [ "$USE_PROXY" -eq 0 ]; then
+    echo "[INFO] Stopping tcpdump..."
+    sudo kill $TCPDUMP_PID 2>/dev/null
 
-echo "[INFO] Removing netem..."
-sudo tc qdisc del dev $IFACE root 2>/dev/null
+    echo "[INFO] Removing netem..."
+    sudo tc qdisc del dev $IFACE root 2>/dev/null
+fi
 
 echo ""
 echo "[DONE] Test '$TEST_NAME' complete."
@@ -0,0 +1,117 @@
+"""
+Sequence classification against the per-device bitmap window.
+
+Run from the project root: python -m pytest -q Tests
+"""
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from Common.devices import (
+    SEQ_DUPLICATE, SEQ_LATE, SEQ_NEW, SEQ_TOO_OLD, DeviceState, DeviceTable
+)
+
+
+def started(seq=1, bits=16, window=64):
+    device = DeviceState(1, window_size=window)
+    device.reset_sequence(seq, bits)
+    return device
+
+
+def test_first_packet_starts_tracking():
+    device = DeviceState(1)
+    assert device.classify(500) == (SEQ_NEW, 0)
+    assert device.last_seq == 500
+
+
+def test_in_order_packets_have_no_gaps():
+    device = started(1)
+    for seq in range(2, 200):
+        assert device.classify(seq) == (SEQ_NEW, 0)
+
+
+def test_gap_counts_skipped_numbers():
+    device = started(1)
+    assert device.classify(5) == (SEQ_NEW, 3)
+
+
+def test_late_packet_reports_reorder_depth():
+    device = started(1)
+    device.classify(5)
+    assert device.classify(3) == (SEQ_LATE, 2)
+    assert device.classify(2) == (SEQ_LATE, 3)
+    assert device.classify(4) == (SEQ_LATE, 1)
+
+
+def test_duplicates_of_newest_and_late_packets():
+    device = started(1)
+    device.classify(5)
+    assert device.classify(5) == (SEQ_DUPLICATE, 0)
+    device.classify(3)
+    assert device.classify(3) == (SEQ_DUPLICATE, 0)
+
+
+def test_packets_before_init_count_as_seen():
+    device = started(100)
+    assert device.classify(99) == (SEQ_DUPLICATE, 0)
+
+
+def test_too_old_beyond_the_window():
+    device = started(1, window=8)
+    device.classify(20)
+    assert device.classify(12) == (SEQ_TOO_OLD, 0)
+    assert device.classify(13) == (SEQ_LATE, 7)
+
+
+def test_jump_beyond_the_window_clears_history():
+    device = started(1, window=8)
+    assert device.classify(100) == (SEQ_NEW, 98)
+    # Everything below the new highest was never seen
+    assert device.classify(99) == (SEQ_LATE, 1)
+    assert device.classify(99) == (SEQ_DUPLICATE, 0)
+
+
+def test_wrap_at_16_bits_is_not_a_gap():
+    device = started(65534)
+    assert device.classify(65535) == (SEQ_NEW, 0)
+    assert device.classify(0) == (SEQ_NEW, 0)
+    assert device.classify(1) == (SEQ_NEW, 0)
+    # A straggler from before the wrap fills its own slot
+    device = started(65533)
+    device.classify(1)
+    assert device.classify(65535) == (SEQ_LATE, 2)
+    assert device.classify(65535) == (SEQ_DUPLICATE, 0)
+
+
+def test_wrap_at_32_bits_is_not_a_gap():
+    top = 2**32 - 1
+    device = started(top - 1, bits=32)
+    assert device.classify(top, 32) == (SEQ_NEW, 0)
+    assert device.classify(0, 32) == (SEQ_NEW, 0)
+    assert device.classify(3, 32) == (SEQ_NEW, 2)
+    assert device.classify(top, 32) == (SEQ_DUPLICATE, 0)
+
+
+def test_16_bit_values_are_not_wraps_in_32_bit_space():
+    device = started(65535, bits=32)
+    assert device.classify(65536, 32) == (SEQ_NEW, 0)
+    assert device.classify(0, 32) == (SEQ_TOO_OLD, 0)
+
+
+def test_sequence_space_change_restarts_tracking():
+    device = started(10, bits=16)
+    assert device.classify(5000, 32) == (SEQ_NEW, 0)
+    assert device.seq_bits == 32
+
+
+def test_eviction_keeps_counters():
+    table = DeviceTable(idle_timeout=10)
+    device = table.get(7, now=0.0)
+    device.packets = 3
+    device.gaps = 1
+    assert table.evict_idle(5.0) == []
+    assert [d.device_id for d in table.evict_idle(11.0)] == [7]
+    assert 7 not in table.live
+    counters = table.breakdown()[7]
+    assert counters[0] == 3 and counters[4] == 1
@@ -0,0 +1,141 @@
+"""
+Payload codec round-trips and malformed-payload handling.
+
+Run from the project root: python -m pytest -q Tests
+"""
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from Common.payload import (
+    ENC_ASCII, ENC_INT16, ENC_TIMED, ENC_VARINT, MAX_AGE_MS, decode_batch, decode_readings,
+    encode_readings, reading_size, _put_varint, _unzigzag, _zigzag
+)
+
+READINGS = [23.9, 21.3, 33.2, -5.5, 0.0, -40.0, 85.0, 20.1]
+
+
+@pytest.mark.parametrize("n", [0, 1, -1, 63, -64, 64, -65, 8191, -8192, 2**31 - 1, -2**31, 2**62])
+def test_zigzag_round_trip(n):
+    assert _zigzag(n) >= 0
+    assert _unzigzag(_zigzag(n)) == n
+
+
+def test_zigzag_small_magnitudes_stay_small():
+    assert [_zigzag(n) for n in (0, -1, 1, -2, 2)] == [0, 1, 2, 3, 4]
+
+
+@pytest.mark.parametrize("encoding", [ENC_INT16, ENC_VARINT])
+def test_binary_round_trip(encoding):
+    assert decode_readings(encoding, encode_readings(encoding, READINGS)) == READINGS
+
+
+def test_varint_round_trip_large_negative_deltas():
+    readings = [300.0, -300.0, 300.0, -327.68, 327.67]
+    payload = encode_readings(ENC_VARINT, readings)
+    assert decode_readings(ENC_VARINT, payload) == readings
+
+
+def test_varint_multibyte_values():
+    out = bytearray()
+    _put_varint(out, 300)
+    assert bytes(out) == b"\xac\x02"
+
+
+def test_ascii_round_trip_keeps_strings():
+    payload = encode_readings(ENC_ASCII, [23.9, 21.3])
+    assert payload == b"23.9,21.3"
+    assert decode_readings(ENC_ASCII, payload) == ["23.9", "21.3"]
+    assert decode_readings(ENC_ASCII, b"23.9") == ["23.9"]
+
+
+def test_decode_accepts_memoryview():
+    payload = encode_readings(ENC_VARINT, READINGS)
+    assert decode_readings(ENC_VARINT, memoryview(payload)) == READINGS
+
+
+def test_truncated_varint_is_rejected():
+    payload = encode_readings(ENC_VARINT, [23.9, 300.0])
+    assert payload[-1] < 0x80 and payload[-2] & 0x80
+    with pytest.raises(ValueError):
+        decode_readings(ENC_VARINT, payload[:-1])
+    with pytest.raises(ValueError):
+        decode_batch(ENC_VARINT, payload[:-1])
+
+
+def test_odd_length_int16_is_rejected():
+    payload = encode_readings(ENC_INT16, [23.9, 21.3])
+    with pytest.raises(ValueError):
+        decode_readings(ENC_INT16, payload + b"\x01")
+    with pytest.raises(ValueError):
+        decode_batch(ENC_INT16, payload[:-1])
+    with pytest.raises(ValueError):
+        decode_batch(ENC_INT16 | ENC_TIMED, encode_readings(ENC_INT16 | ENC_TIMED, [23.9], [0])[:-1])
+
+
+@pytest.mark.parametrize("encoding", [ENC_ASCII, ENC_INT16, ENC_VARINT])
+def test_reading_size_matches_encoded_length(encoding):
+    size = 0
+    previous = None
+    for i, reading in enumerate(READINGS):
+        size += reading_size(encoding, reading, previous)
+        previous = reading
+        assert size == len(encode_readings(encoding, READINGS[:i + 1]))
+
+
+def test_unknown_encoding_raises():
+    with pytest.raises(ValueError):
+        encode_readings(5, [1.0])
+    with pytest.raises(ValueError):
+        decode_readings(5, b"")
+
+
+# Timed payloads (ENC_TIMED)
+@pytest.mark.parametrize("encoding", [ENC_ASCII, ENC_INT16, ENC_VARINT])
+def test_timed_round_trip(encoding):
+    readings = [23.9, 21.3, 33.2]
+    ages = [2000, 1000, 0]
+    payload = encode_readings(encoding | ENC_TIMED, readings, ages)
+    values, decoded_ages = decode_batch(encoding | ENC_TIMED, payload)
+    assert decoded_ages == ages
+    assert [float(v) for v in values] == readings
+
+
+def test_untimed_batch_has_no_ages():
+    payload = encode_readings(ENC_INT16, [23.9])
+    assert decode_batch(ENC_INT16, payload) == ([23.9], None)
+
+
+def test_timed_large_ages_use_multibyte_varints():
+    ages = [MAX_AGE_MS, 128, 0]
+    payload = encode_readings(ENC_INT16 | ENC_TIMED, [1.0, 2.0, 3.0], ages)
+    assert decode_batch(ENC_INT16 | ENC_TIMED, payload)[1] == ages
+
+
+def test_timed_truncated_ages_are_rejected():
+    payload = encode_readings(ENC_VARINT | ENC_TIMED, [23.9, 21.3], [300, 200])
+    # count byte plus the first byte of the first two-byte age
+    with pytest.raises(ValueError):
+        decode_batch(ENC_VARINT | ENC_TIMED, payload[:2])
+
+
+def test_timed_count_mismatch_is_rejected():
+    payload = encode_readings(ENC_INT16 | ENC_TIMED, [23.9, 21.3], [10, 0])
+    with pytest.raises(ValueError):
+        decode_batch(ENC_INT16 | ENC_TIMED, payload[:-2])
+
+
+def test_timed_reading_size_is_an_upper_bound():
+    encoding = ENC_VARINT | ENC_TIMED
+    readings = [23.9, 21.3, 33.2, 30.0]
+    max_age = 20000
+    size = 0
+    previous = None
+    for reading in readings:
+        size += reading_size(encoding, reading, previous, max_age)
+        previous = reading
+    payload = encode_readings(encoding, readings, [max_age] * len(readings))
+    assert len(payload) <= size
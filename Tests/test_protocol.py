@@ -0,0 +1,130 @@
+"""
+Header codecs, checksums and serial-number arithmetic for v1/v2/v3.
+
+Run from the project root: python -m pytest -q Tests
+"""
+import os
+import struct
+import sys
+
+import numpy as np
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from Common.protocol import (
+    HEADER_SIZE, HEADER_WIDE_SIZE, MSG_DATA, MSG_INIT,
+    VERSION_CRC, VERSION_SUM, VERSION_WIDE, PacketEncoder,
+    byte_sum, calculate_checksum, decode_header, header_size, serial_diff, verify_checksum
+)
+from analyze_loss import unwrap_sequence
+
+PAYLOAD = b"23.9,21.3"
+
+
+# Headers
+@pytest.mark.parametrize("version", [VERSION_SUM, VERSION_CRC, VERSION_WIDE])
+def test_header_round_trip(version):
+    encoder = PacketEncoder(7, version, 2)
+    packet = encoder.encode(MSG_DATA, 42, 123456, PAYLOAD)
+    assert len(packet) == header_size(version) + len(PAYLOAD)
+
+    seq, device_id, msg_type, timestamp_ms, encoding, checksum, decoded_version = decode_header(packet)
+    assert (seq, device_id, msg_type, timestamp_ms, encoding, decoded_version) == (
+        42, 7, MSG_DATA, 123456, 2, version
+    )
+    assert verify_checksum(packet, checksum, version)
+    assert verify_checksum(memoryview(packet), checksum, version)
+    assert packet[header_size(version):] == PAYLOAD
+
+
+def test_v1_header_matches_original_layout():
+    packet = PacketEncoder(3, VERSION_SUM).encode(MSG_INIT, 1, 1000)
+    seq, device_id, msg_type, timestamp_ms, encoding, checksum, version = struct.unpack(
+        "!HBBIBHB", packet
+    )
+    assert (seq, device_id, msg_type, timestamp_ms, version) == (1, 3, MSG_INIT, 1000, VERSION_SUM)
+    # The original checksum: byte sum with the checksum field zeroed
+    assert checksum == sum(packet[:9] + b"\x00\x00" + packet[11:]) % 65536
+
+
+def test_wide_header_carries_32_bit_seq_and_16_bit_device():
+    packet = PacketEncoder(0xFFFF, VERSION_WIDE).encode(MSG_DATA, 2**32 - 1, 5)
+    assert len(packet) == HEADER_WIDE_SIZE
+    seq, device_id = decode_header(packet)[:2]
+    assert (seq, device_id) == (2**32 - 1, 0xFFFF)
+
+
+@pytest.mark.parametrize("version, bits", [(VERSION_CRC, 16), (VERSION_WIDE, 32)])
+def test_encoder_wraps_sequence_numbers(version, bits):
+    packet = PacketEncoder(1, version).encode(MSG_DATA, (1 << bits) + 5, 0)
+    assert decode_header(packet)[0] == 5
+
+
+def test_runt_packets_are_rejected():
+    assert decode_header(b"") is None
+    assert decode_header(b"\x00" * (HEADER_SIZE - 1)) is None
+    wide = PacketEncoder(1, VERSION_WIDE).encode(MSG_DATA, 1, 0)
+    assert decode_header(wide[:HEADER_WIDE_SIZE - 1]) is None
+
+
+@pytest.mark.parametrize("version", [VERSION_SUM, VERSION_CRC, VERSION_WIDE])
+def test_corruption_is_detected(version):
+    packet = bytearray(PacketEncoder(1, version).encode(MSG_DATA, 9, 77, PAYLOAD))
+    checksum = decode_header(packet)[5]
+    packet[-1] ^= 0x01
+    assert not verify_checksum(packet, checksum, version)
+
+
+def test_calculate_checksum_agrees_with_encoder():
+    packet = bytearray(PacketEncoder(1, VERSION_CRC).encode(MSG_DATA, 9, 77, PAYLOAD))
+    checksum = decode_header(packet)[5]
+    packet[9:11] = b"\x00\x00"
+    assert calculate_checksum(packet, VERSION_CRC) == checksum
+
+
+@pytest.mark.parametrize("size", [0, 1, 255, 256, 257, 511, 1024, 1500])
+def test_byte_sum_matches_sum(size):
+    data = bytes(range(256)) * (size // 256) + bytes([255] * (size % 256))
+    assert byte_sum(data) == sum(data)
+    assert byte_sum(memoryview(data)) == sum(data)
+
+
+# Serial number arithmetic
+@pytest.mark.parametrize("bits", [16, 32])
+def test_serial_diff_across_the_wrap(bits):
+    top = (1 << bits) - 1
+    assert serial_diff(0, top, bits) == 1
+    assert serial_diff(top, 0, bits) == -1
+    assert serial_diff(5, top - 4, bits) == 10
+    assert serial_diff(10, 3, bits) == 7
+    assert serial_diff(3, 10, bits) == -7
+
+
+@pytest.mark.parametrize("bits", [16, 32])
+def test_serial_diff_half_space_is_negative(bits):
+    half = 1 << (bits - 1)
+    assert serial_diff(half - 1, 0, bits) == half - 1
+    assert serial_diff(half, 0, bits) == -half
+
+
+@pytest.mark.parametrize("bits", [16, 32])
+def test_unwrap_sequence_across_the_wrap(bits):
+    top = (1 << bits) - 1
+    raw = [top - 2, top - 1, top, 0, 1, 3, 2]
+    unwrapped = unwrap_sequence(raw, bits)
+    assert list(np.diff(unwrapped)) == [1, 1, 1, 1, 2, -1]
+    assert unwrapped[0] == top - 2
+
+
+def test_unwrap_sequence_carries_state_between_chunks():
+    raw = list(range(65530, 65536)) + list(range(0, 6))
+    whole = unwrap_sequence(raw, 16)
+    first = unwrap_sequence(raw[:4], 16)
+    second = unwrap_sequence(raw[4:], 16, previous=(raw[3], first[-1]))
+    assert list(np.concatenate((first, second))) == list(whole)
+    assert whole[-1] == 65536 + 5
+
+
+def test_unwrap_sequence_empty():
+    assert len(unwrap_sequence([], 16)) == 0
@@ -0,0 +1,84 @@
+"""
+Deferred ACK_READY replies of the blocking receive loop, and payload
+error accounting in ServerState.
+
+Run from the project root: python -m pytest -q Tests
+"""
+import os
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, "Server"))
+
+from Common.payload import ENC_INT16, encode_readings
+from Common.protocol import MSG_DATA, MSG_INIT, VERSION_CRC, PacketEncoder
+from Server import READY_DELAY, PendingReady, ServerState
+
+
+class FakeSocket:
+    def __init__(self):
+        self.sent = []
+
+    def sendto(self, data, addr):
+        self.sent.append((data, addr))
+
+
+class NullSink:
+    def __init__(self):
+        self.packets = []
+
+    def write_packet(self, *fields, **options):
+        self.packets.append(fields)
+
+    def poll(self):
+        pass
+
+
+A = ("10.0.0.1", 4000)
+B = ("10.0.0.2", 4000)
+
+
+def test_ready_is_sent_once_its_delay_passes():
+    pending, sock = PendingReady(), FakeSocket()
+    pending.add(A, 100.0)
+    pending.send_due(sock, 100.0 + READY_DELAY / 2)
+    assert sock.sent == []
+    pending.send_due(sock, 100.0 + READY_DELAY)
+    assert sock.sent == [(b"ACK_READY", A)]
+    pending.send_due(sock, 200.0)
+    assert len(sock.sent) == 1
+
+
+def test_timeout_is_capped_at_the_next_deadline():
+    pending = PendingReady()
+    assert pending.timeout(100.0, 1.0) == 1.0
+    pending.add(A, 100.0)
+    pending.add(B, 100.2)
+    assert pending.timeout(100.0, 1.0) == READY_DELAY
+    assert pending.timeout(100.0, 0.1) == 0.1
+    assert pending.timeout(105.0, 1.0) == 0.0
+
+
+def test_retried_init_replaces_the_outstanding_ready():
+    pending, sock = PendingReady(), FakeSocket()
+    pending.add(A, 100.0)
+    pending.add(B, 100.1)
+    pending.add(A, 100.3)
+    pending.send_due(sock, 100.0 + READY_DELAY + 0.15)
+    assert sock.sent == [(b"ACK_READY", B)]
+    pending.send_due(sock, 100.3 + READY_DELAY)
+    assert sock.sent == [(b"ACK_READY", B), (b"ACK_READY", A)]
+
+
+def test_odd_length_int16_payload_counts_as_malformed():
+    sink = NullSink()
+    state = ServerState(sink, status_interval=float("inf"))
+    encoder = PacketEncoder(1, VERSION_CRC, ENC_INT16)
+    payload = encode_readings(ENC_INT16, [23.9, 21.3])
+    state.process_packet(encoder.encode(MSG_INIT, 0, 0), 0.0)
+    state.process_packet(encoder.encode(MSG_DATA, 1, 10, payload), 0.1)
+    state.process_packet(encoder.encode(MSG_DATA, 2, 20, payload + b"\x01"), 0.2)
+    assert state.malformed_payloads == 1
+    assert state.total_readings == 2
+    assert [fields[6] for fields in sink.packets] == [[23.9, 21.3], []]
@@ -0,0 +1,85 @@
+"""
+CSV and binary logs read back as the same packets.
+
+Run from the project root: python -m pytest -q Tests
+"""
+import csv
+import os
+import sys
+
+import numpy as np
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from Common.sinks import COLUMNS, RotatingSink, create_sink, iter_packets
+
+# device_id, seq, timestamp, arrival, duplicate_flag, gap_flag, values, ages
+PACKETS = [
+    (1, 1, 10.0, 10.5, 0, 0, [21.0, 22.0, 23.0], [2000, 1000, 500]),
+    (1, 2, 12.0, 12.4, 0, 0, [24.0], None),
+    (2, 7, 11.25, 11.3, 0, 1, [30.0, 31.0], [250, 0]),
+    (1, 2, 12.0, 12.6, 1, 0, [24.0], None),
+]
+
+
+def write_log(tmp_path, kind):
+    sink = create_sink(kind, str(tmp_path / f"log.{kind}"))
+    for *fields, values, ages in PACKETS:
+        sink.write_packet(*fields, values, ages=ages)
+    sink.close()
+    return sink.path
+
+
+def read_all(path):
+    chunks = list(iter_packets(path, chunk_rows=2))
+    return {name: np.concatenate([c[name] for c in chunks]) for name in chunks[0]}
+
+
+@pytest.mark.parametrize("kind", ["csv", "binary"])
+def test_packets_keep_their_send_time(tmp_path, kind):
+    packets = read_all(write_log(tmp_path, kind))
+    assert list(packets["seq"]) == [1, 2, 7, 2]
+    assert list(packets["timestamp"]) == [10.0, 12.0, 11.25, 12.0]
+    assert list(packets["readings"]) == [3, 1, 2, 1]
+    assert list(packets["duplicate_flag"]) == [0, 0, 0, 1]
+    assert list(packets["sample_time"]) == [8.0, 9.0, 9.5, 12.0, 11.0, 11.25, 12.0]
+
+
+def test_csv_and_binary_agree(tmp_path):
+    from_csv = read_all(write_log(tmp_path, "csv"))
+    from_binary = read_all(write_log(tmp_path, "binary"))
+    for name in from_csv:
+        assert list(from_csv[name]) == list(from_binary[name]), name
+
+
+def test_csv_without_send_time_uses_newest_sample(tmp_path):
+    path = tmp_path / "old.csv"
+    with open(path, "w", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(COLUMNS[:COLUMNS.index("send_time")])
+        writer.writerows([
+            [1, 1, 8.0, 10.5, 0, 0, 21.0],
+            [1, 1, 9.5, 10.5, 0, 0, 22.0],
+            [1, 2, 12.0, 12.4, 0, 0, 24.0],
+        ])
+    packets = read_all(str(path))
+    assert list(packets["timestamp"]) == [9.5, 12.0]
+    assert list(packets["readings"]) == [2, 1]
+
+
+def test_idle_segment_is_not_rotated_by_age(tmp_path):
+    sink = RotatingSink("csv", str(tmp_path / "log.csv"), max_age=10)
+    sink.opened -= 60
+    sink.check()
+    assert len(sink.segments) == 1
+
+    # The age restarted with the check above, so the first packet does not rotate
+    sink.write_packet(*PACKETS[1][:-2], PACKETS[1][-2])
+    sink.check()
+    assert len(sink.segments) == 1
+
+    sink.opened -= 60
+    sink.check()
+    assert len(sink.segments) == 2
+    sink.close()
@@ -0,0 +1,131 @@
+"""
+Statistics behind analyze_loss: RFC 3550 jitter, sequence unwrapping
+across chunks, and LogHistogram percentile accuracy.
+
+Run from the project root: python -m pytest -q Tests
+"""
+import math
+import os
+import random
+import sys
+
+import numpy as np
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from Common.histogram import LogHistogram
+from analyze_loss import JITTER_BLOCK, DeviceStats, rfc3550_jitter, unwrap_sequence
+
+
+def recurrence_jitter(deltas, start=0.0):
+    """RFC 3550 section 6.4.1, one packet at a time."""
+    jitter = start
+    series = []
+    for d in deltas:
+        jitter += (abs(d) - jitter) / 16
+        series.append(jitter)
+    return series
+
+
+# Jitter
+@pytest.mark.parametrize("n", [1, 15, JITTER_BLOCK, JITTER_BLOCK + 1, 3 * JITTER_BLOCK + 7])
+def test_jitter_matches_the_recurrence(n):
+    rng = np.random.default_rng(n)
+    deltas = rng.normal(0, 0.02, n)
+    assert np.allclose(rfc3550_jitter(deltas), recurrence_jitter(deltas), rtol=1e-9, atol=1e-15)
+
+
+def test_jitter_continues_from_a_start_value():
+    deltas = np.random.default_rng(1).normal(0, 0.05, 2000)
+    first = rfc3550_jitter(deltas[:700])
+    second = rfc3550_jitter(deltas[700:], first[-1])
+    assert np.allclose(np.concatenate((first, second)), recurrence_jitter(deltas), rtol=1e-9)
+
+
+def test_constant_transit_has_no_jitter():
+    assert not rfc3550_jitter(np.zeros(100)).any()
+
+
+# Sequence unwrap
+def test_unwrap_split_exactly_at_the_wrap():
+    raw = [0xFFFD, 0xFFFE, 0xFFFF, 0, 1, 2]
+    first = unwrap_sequence(raw[:3], 16)
+    second = unwrap_sequence(raw[3:], 16, previous=(raw[2], first[-1]))
+    assert list(first) + list(second) == list(range(0xFFFD, 0x10003))
+
+
+def test_device_stats_do_not_depend_on_chunking():
+    """Loss, reordering and jitter over a wrapping sequence, whole vs. chunked."""
+    rng = random.Random(7)
+    seqs = [s & 0xFFFF for s in range(65000, 67000) if rng.random() > 0.02]
+    # A little local reordering
+    for i in range(0, len(seqs) - 1, 97):
+        seqs[i], seqs[i + 1] = seqs[i + 1], seqs[i]
+    n = len(seqs)
+    seq = np.array(seqs)
+    timestamp = np.arange(n) * 0.1
+    arrival = timestamp + 0.05 + np.array([rng.uniform(0, 0.01) for _ in range(n)])
+    duplicate = np.zeros(n, dtype=np.uint8)
+    readings = np.ones(n, dtype=np.int64)
+    latency = arrival - timestamp
+
+    whole = DeviceStats(1)
+    whole.add(seq, timestamp, arrival, duplicate, readings, latency)
+    chunked = DeviceStats(1)
+    for start in range(0, n, 333):
+        part = slice(start, start + 333)
+        chunked.add(seq[part], timestamp[part], arrival[part], duplicate[part], readings[part],
+                    latency[part])
+
+    # The first arrival (65001, swapped with 65000) anchors the count; 67000 is past the end
+    assert whole.packets == chunked.packets == n
+    assert whole.expected() == chunked.expected() == 66999 - 65001 + 1
+    assert chunked.lost() == whole.lost() == whole.expected() - n
+    assert chunked.reordered == whole.reordered > 0
+    assert chunked.bursts == whole.bursts
+    assert chunked.jitter == pytest.approx(whole.jitter, rel=1e-9)
+    assert chunked.delay.mean == pytest.approx(whole.delay.mean, rel=1e-12)
+    assert chunked.delay.std() == pytest.approx(whole.delay.std(), rel=1e-9)
+
+
+# LogHistogram
+@pytest.mark.parametrize("percent", [1, 50, 90, 99, 99.9])
+def test_percentiles_within_the_relative_error(percent):
+    rng = np.random.default_rng(3)
+    values = rng.lognormal(mean=-4, sigma=1.5, size=20000)
+    histogram = LogHistogram()
+    histogram.record_array(values)
+
+    exact = np.sort(values)[max(1, math.ceil(len(values) * percent / 100)) - 1]
+    assert histogram.percentile(percent) == pytest.approx(exact, rel=histogram.precision)
+
+
+def test_record_and_record_array_agree():
+    values = np.random.default_rng(4).exponential(0.01, 5000)
+    one, many = LogHistogram(), LogHistogram()
+    for v in values:
+        one.record(float(v))
+    many.record_array(values)
+    assert one.counts == many.counts
+    assert (one.count, one.min, one.max) == (many.count, many.min, many.max)
+
+
+def test_merge_equals_recording_everything():
+    values = np.random.default_rng(5).exponential(0.01, 4000)
+    whole, left, right = LogHistogram(), LogHistogram(), LogHistogram()
+    whole.record_array(values)
+    left.record_array(values[:1500])
+    right.record_array(values[1500:])
+    left.merge(right)
+    assert left.counts == whole.counts
+    assert left.percentiles([50, 99]) == whole.percentiles([50, 99])
+
+
+def test_percentiles_stay_within_min_and_max():
+    histogram = LogHistogram()
+    histogram.record_array(np.array([0.0123, 0.5, 7.25]))
+    # Percentiles are clamped to the exact min and max
+    assert 0.0123 <= histogram.percentile(0.1) <= 0.0123 * (1 + histogram.precision)
+    assert 7.25 / (1 + histogram.precision) <= histogram.percentile(100) <= 7.25
+    assert math.isnan(LogHistogram().percentile(50))
@@ -1,95 +1,406 @@
-import pandas as pd
-import sys
+import argparse
+import csv
+import json
 import numpy as np
 
+from Common.histogram import LogHistogram
+from Common.sinks import is_binary_log, iter_packets
+
+PERCENTILES = (50, 90, 99, 99.9)
+LATENCY_PERCENTILES = (50, 95, 99)
+
+# RFC 3550 interarrival jitter gain, and the block length its closed form
+# is evaluated over (keeps (16/15)**n well inside float range)
+JITTER_GAIN = 1 / 16
+JITTER_BLOCK = 512
+
+
 # HELPERS
 def format_ms(seconds):
     return round(seconds * 1000, 3)
 
 
-# 1. LOAD CSV
-if len(sys.argv) < 2:
-    print("Usage: python3 analyze_results.py <csv_file>")
-    sys.exit(1)
-
-csv_file = sys.argv[1]
-df = pd.read_csv(csv_file)
-
-# Filter only DATA packets (heartbeats don't matter for delay/loss)
-df = df[df["duplicate_flag"].isin([0, 1])]
-
-if df.empty:
-    print("CSV contains no data packets.")
-    sys.exit(0)
-
-# 2. BASIC SEQUENCE STATS
-received = df["seq"].nunique()
-first_seq = df["seq"].min()
-last_seq = df["seq"].max()
-expected = (last_seq - first_seq) + 1
-lost = expected - received
-loss_percent = (lost / expected) * 100
-
-print("\n PACKET STATS ")
-print(f"CSV File: {csv_file}")
-print(f"First seq          : {first_seq}")
-print(f"Last seq           : {last_seq}")
-print(f"Expected packets   : {expected}")
-print(f"Received packets   : {received}")
-print(f"Total lost packets : {lost}")
-print(f"Loss % (calculated): {loss_percent:.2f}%")
-
-# GAP ANALYSIS (LOSS TEST)
-df_sorted = df.sort_values("seq")
-seq_list = df_sorted["seq"].tolist()
-
-gaps = []
-for i in range(1, len(seq_list)):
-    prev = seq_list[i - 1]
-    curr = seq_list[i]
-    diff = curr - prev
-    if diff > 1:
-        gaps.append((prev, curr, diff - 1))
-
-print(" GAP ANALYSIS (LOSS TEST) ")
-if not gaps:
-    print("No gaps detected.")
-else:
-    for g in gaps:
-        print(f"Gap after seq {g[0]} → next {g[1]} | Lost {g[2]} packets")
-
-# DELAY & JITTER ANALYSIS
-if "arrival_time" in df.columns and "timestamp" in df.columns:
-    df["arrival_time"] = pd.to_numeric(df["arrival_time"], errors="coerce")
-    df["timestamp"] = pd.to_numeric(df["timestamp"], errors="coerce")
-
-    # Raw delay = arrival time - packet timestamp
-    df["delay"] = df["arrival_time"] - df["timestamp"]
-
-    avg_delay = df["delay"].mean()
-    min_delay = df["delay"].min()
-    max_delay = df["delay"].max()
-    std_delay = df["delay"].std()
-
-    # Inter-arrival time (difference between adjacent packets)
-    df = df.sort_values("arrival_time")
-    df["inter_arrival"] = df["arrival_time"].diff()
-
-    avg_inter = df["inter_arrival"].mean()
-    std_inter = df["inter_arrival"].std()
-
-    # Detect out-of-order packets (should NOT happen unless delay > variation)
-    df_sorted_by_arrival = df.sort_values("arrival_time")
-    arrival_order = df_sorted_by_arrival["seq"].tolist()
-
-    print(" DELAY ANALYSIS ")
-    print(f"Avg network delay     : {format_ms(avg_delay)} ms")
-    print(f"Min delay             : {format_ms(min_delay)} ms")
-    print(f"Max delay             : {format_ms(max_delay)} ms")
-    print(f"Delay jitter (stddev) : {format_ms(std_delay)} ms")
+def unwrap_sequence(seq, bits, previous=None):
+    """
+    Map wrapped sequence numbers (in arrival order) onto a monotonic axis:
+    each step is taken as the shortest signed distance mod 2**bits.
+    previous is the (raw, unwrapped) pair carried over from the last chunk.
+    """
+    seq = np.asarray(seq, dtype=np.int64)
+    if len(seq) == 0:
+        return seq
+    modulus = 1 << bits
+    if previous is None:
+        first = seq[0]
+        steps = np.diff(seq)
+    else:
+        first = previous[1]
+        steps = np.diff(np.concatenate(([previous[0]], seq)))
+    steps = (steps + (modulus >> 1)) % modulus - (modulus >> 1)
+    if previous is None:
+        return np.concatenate(([first], first + np.cumsum(steps)))
+    return first + np.cumsum(steps)
+
+
+def rfc3550_jitter(deltas, start=0.0):
+    """
+    J = J + (|D| - J) / 16 over a whole array of transit-time differences
+    D, without a Python loop. Returns the J value after each packet.
+    """
+    decay = 1 - JITTER_GAIN
+    series = np.empty(len(deltas))
+    jitter = start
+    for block in range(0, len(deltas), JITTER_BLOCK):
+        d = np.abs(deltas[block:block + JITTER_BLOCK])
+        powers = decay ** np.arange(1, len(d) + 1)
+        # J_n = decay^n * (J_0 + gain * sum_k |D_k| / decay^k)
+        values = powers * (jitter + JITTER_GAIN * np.cumsum(d / powers))
+        series[block:block + len(d)] = values
+        jitter = values[-1]
+    return series
+
+
+def add_counts(counts, values):
+    for value, n in zip(*np.unique(values, return_counts=True)):
+        counts[int(value)] = counts.get(int(value), 0) + int(n)
+
+
+class RunningStats:
+    """Welford mean/variance, fed whole arrays via Chan's parallel update."""
+
+    def __init__(self):
+        self.count = 0
+        self.mean = 0.0
+        self.m2 = 0.0
+        self.min = float("inf")
+        self.max = float("-inf")
+
+    def add(self, values):
+        values = values[~np.isnan(values)]
+        if len(values):
+            self.combine(len(values), values.mean(), ((values - values.mean()) ** 2).sum(),
+                         values.min(), values.max())
+
+    def merge(self, other):
+        if other.count:
+            self.combine(other.count, other.mean, other.m2, other.min, other.max)
+
+    def combine(self, count, mean, m2, low, high):
+        total = self.count + count
+        delta = mean - self.mean
+        self.mean += delta * count / total
+        self.m2 += m2 + delta * delta * self.count * count / total
+        self.count = total
+        self.min = min(self.min, low)
+        self.max = max(self.max, high)
+
+    def std(self):
+        # Sample stddev, as pandas .std()
+        return (self.m2 / (self.count - 1)) ** 0.5 if self.count > 1 else float("nan")
+
+
+class DeviceStats:
+    """Per-device accumulators; memory does not grow with the file."""
+
+    def __init__(self, device_id):
+        self.device_id = device_id
+        self.packets = 0
+        self.duplicates = 0
+        self.readings = 0
+        self.reordered = 0
+        self.gap_events = 0
+        # Packets lost per gap -> gaps, reorder extent -> packets
+        self.bursts = {}
+        self.reorder_extent = {}
+        self.wide = False
+
+        self.first_seq = None
+        self.highest = None
+        self.last = None
+        self.last_arrival = None
+        self.last_transit = None
+
+        self.delay = RunningStats()
+        self.delay_histogram = LogHistogram()
+        # Arrival minus each reading's own sample time, so batching and
+        # linger show up here but not in the per-packet delay
+        self.latency_histogram = LogHistogram()
+        self.inter_arrival = RunningStats()
+        self.jitter = 0.0
+        self.jitter_max = 0.0
+
+    def add(self, seq, timestamp, arrival, duplicate, readings, latency):
+        """
+        One chunk of this device's packets, in arrival order, and the
+        per-reading latency of the ones that were not duplicates.
+        """
+        self.readings += int(readings.sum())
+        self.duplicates += int(duplicate.sum())
+        self.latency_histogram.record_array(latency)
+
+        keep = duplicate == 0
+        seq, timestamp, arrival = seq[keep], timestamp[keep], arrival[keep]
+        if not len(seq):
+            return
+
+        # Sequence numbers above 16 bits mean a v3 (32-bit) sender
+        self.wide = self.wide or bool(seq.max() > 0xFFFF)
+        bits = 32 if self.wide else 16
+        unwrapped = unwrap_sequence(seq, bits, self.last)
+
+        if self.first_seq is None:
+            self.first_seq = int(unwrapped[0])
+            highest_before = np.concatenate(([unwrapped[0] - 1], np.maximum.accumulate(unwrapped)[:-1]))
+        else:
+            running = np.maximum.accumulate(np.concatenate(([self.highest], unwrapped)))
+            highest_before = running[:-1]
+
+        # Forward jumps past the highest so far open gaps; anything below
+        # it arrived out of order
+        jumps = unwrapped - highest_before
+        late = jumps <= 0
+        self.reordered += int(late.sum())
+        add_counts(self.reorder_extent, -jumps[late])
+        opened = jumps > 1
+        self.gap_events += int(opened.sum())
+        add_counts(self.bursts, jumps[opened] - 1)
+
+        self.packets += len(unwrapped)
+        self.highest = int(max(highest_before[-1], unwrapped[-1]))
+        self.last = (int(seq[-1]), int(unwrapped[-1]))
+
+        transit = arrival - timestamp
+        self.delay.add(transit)
+        self.delay_histogram.record_array(transit)
+
+        previous = transit[:1] if self.last_transit is None else [self.last_transit]
+        jitter = rfc3550_jitter(np.diff(np.concatenate((previous, transit))), self.jitter)
+        self.jitter = float(jitter[-1])
+        self.jitter_max = max(self.jitter_max, float(jitter.max()))
+        self.last_transit = transit[-1]
+
+        if self.last_arrival is not None:
+            self.inter_arrival.add(np.diff(np.concatenate(([self.last_arrival], arrival))))
+        else:
+            self.inter_arrival.add(np.diff(arrival))
+        self.last_arrival = arrival[-1]
+
+    def expected(self):
+        return 0 if self.first_seq is None else self.highest - self.first_seq + 1
+
+    def lost(self):
+        return max(0, self.expected() - self.packets)
+
+
+def analyze(path):
+    devices = {}
+
+    for chunk in iter_packets(path):
+        device_ids = chunk["device_id"]
+        # Stable grouping keeps each device's packets in arrival order
+        order = np.argsort(device_ids, kind="stable")
+        ids, starts = np.unique(device_ids[order], return_index=True)
+        bounds = np.append(starts, len(order))
+
+        # Per-reading latency, grouped the same way
+        counts = chunk["readings"]
+        kept = np.repeat(chunk["duplicate_flag"] == 0, counts)
+        latency = (np.repeat(chunk["arrival_time"], counts) - chunk["sample_time"])[kept]
+        reading_ids = np.repeat(device_ids, counts)[kept]
+        reading_order = np.argsort(reading_ids, kind="stable")
+        reading_bounds = np.searchsorted(reading_ids[reading_order], np.append(ids, ids[-1] + 1))
+
+        for i, device_id in enumerate(ids.tolist()):
+            rows = order[bounds[i]:bounds[i + 1]]
+            device = devices.get(device_id)
+            if device is None:
+                device = devices[device_id] = DeviceStats(device_id)
+            device.add(
+                chunk["seq"][rows], chunk["timestamp"][rows], chunk["arrival_time"][rows],
+                chunk["duplicate_flag"][rows], chunk["readings"][rows],
+                latency[reading_order[reading_bounds[i]:reading_bounds[i + 1]]]
+            )
+
+    return devices
+
+
+def summarize(stats):
+    """Flat dict of one DeviceStats (or the fleet-wide merge)."""
+    expected = stats.expected()
+    lost = stats.lost()
+    percentiles = stats.delay_histogram.percentiles(PERCENTILES)
+    summary = {
+        "expected": expected,
+        "received": stats.packets,
+        "lost": lost,
+        "loss_percent": lost / expected * 100 if expected else 0.0,
+        "duplicates": stats.duplicates,
+        "reordered": stats.reordered,
+        "readings": stats.readings,
+        "gaps": stats.gap_events,
+        "max_burst": max(stats.bursts, default=0),
+        "delay_mean_ms": format_ms(stats.delay.mean),
+        "delay_min_ms": format_ms(stats.delay.min),
+        "delay_max_ms": format_ms(stats.delay.max),
+        "delay_stddev_ms": format_ms(stats.delay.std()),
+    }
+    for p, value in percentiles.items():
+        summary[f"delay_p{p:g}_ms"] = format_ms(value)
+    latency = stats.latency_histogram
+    summary["reading_latency_mean_ms"] = format_ms(latency.mean())
+    for p, value in latency.percentiles(LATENCY_PERCENTILES).items():
+        summary[f"reading_latency_p{p:g}_ms"] = format_ms(value)
+    summary["reading_latency_max_ms"] = format_ms(latency.max if latency.count else float("nan"))
+    summary["jitter_rfc3550_ms"] = format_ms(stats.jitter)
+    summary["jitter_rfc3550_max_ms"] = format_ms(stats.jitter_max)
+    summary["inter_arrival_mean_ms"] = format_ms(stats.inter_arrival.mean)
+    summary["inter_arrival_stddev_ms"] = format_ms(stats.inter_arrival.std())
+    return summary
+
+
+class FleetStats(DeviceStats):
+    """All devices merged; expected/lost are sums of per-device values."""
+
+    def __init__(self, devices):
+        super().__init__("all")
+        self.members = list(devices.values())
+        for d in self.members:
+            self.packets += d.packets
+            self.duplicates += d.duplicates
+            self.readings += d.readings
+            self.reordered += d.reordered
+            self.gap_events += d.gap_events
+            for counts, other in ((self.bursts, d.bursts), (self.reorder_extent, d.reorder_extent)):
+                for key, n in other.items():
+                    counts[key] = counts.get(key, 0) + n
+            self.delay.merge(d.delay)
+            self.delay_histogram.merge(d.delay_histogram)
+            self.latency_histogram.merge(d.latency_histogram)
+            self.inter_arrival.merge(d.inter_arrival)
+            # Mean of the devices' final RFC 3550 jitter
+            self.jitter += d.jitter / len(self.members)
+            self.jitter_max = max(self.jitter_max, d.jitter_max)
+
+    def expected(self):
+        return sum(d.expected() for d in self.members)
+
+    def lost(self):
+        return sum(d.lost() for d in self.members)
+
+
+def print_distribution(title, counts, unit):
+    print(title)
+    if not counts:
+        print("None.")
+        return
+    total = sum(counts.values())
+    for key in sorted(counts):
+        print(f"  {key:>6} {unit:<8}: {counts[key]:>7} ({counts[key] / total * 100:.1f}%)")
+
+
+def log_format(path):
+    return "binary" if is_binary_log(path) else "CSV"
+
+
+def print_report(path, devices):
+    fleet = FleetStats(devices)
+    summary = summarize(fleet)
+
+    print("\n PACKET STATS ")
+    print(f"Input file         : {path} ({log_format(path)} log)")
+    print(f"Devices            : {len(devices)}")
+    print(f"Expected packets   : {summary['expected']}")
+    print(f"Received packets   : {summary['received']}")
+    print(f"Duplicate packets  : {summary['duplicates']}")
+    print(f"Reordered packets  : {summary['reordered']}")
+    print(f"Total lost packets : {summary['lost']}")
+    print(f"Loss % (calculated): {summary['loss_percent']:.2f}%")
+
+    print(" GAP ANALYSIS (LOSS TEST) ")
+    if not fleet.gap_events:
+        print("No gaps detected.")
+    else:
+        print(f"{fleet.gap_events} gaps, longest burst {summary['max_burst']} packets")
+        print_distribution("Burst length distribution:", fleet.bursts, "lost")
+
+    if fleet.reorder_extent:
+        print_distribution(" REORDERING EXTENT ", fleet.reorder_extent, "behind")
+
+    print(" DELAY ANALYSIS (per packet) ")
+    print(f"Avg network delay     : {summary['delay_mean_ms']} ms")
+    print(f"Min delay             : {summary['delay_min_ms']} ms")
+    print(f"Max delay             : {summary['delay_max_ms']} ms")
+    print(f"Delay jitter (stddev) : {summary['delay_stddev_ms']} ms")
+    print("Percentiles           : " + ", ".join(
+        f"p{p:g} {summary[f'delay_p{p:g}_ms']} ms" for p in PERCENTILES
+    ))
+    print(f"RFC 3550 jitter       : {summary['jitter_rfc3550_ms']} ms "
+          f"(max {summary['jitter_rfc3550_max_ms']} ms)")
+    print("")
+    print(f"Avg inter-arrival     : {summary['inter_arrival_mean_ms']} ms (per device)")
+    print(f"Inter-arrival jitter  : {summary['inter_arrival_stddev_ms']} ms")
     print("")
-    print(f"Avg inter-arrival     : {format_ms(avg_inter)} ms")
-    print(f"Inter-arrival jitter  : {format_ms(std_inter)} ms")
+
+    print(" LATENCY (per reading, arrival - sample time) ")
+    print(f"Avg reading latency   : {summary['reading_latency_mean_ms']} ms")
+    print("Percentiles           : " + ", ".join(
+        f"p{p:g} {summary[f'reading_latency_p{p:g}_ms']} ms" for p in LATENCY_PERCENTILES
+    ))
+    print(f"Max reading latency   : {summary['reading_latency_max_ms']} ms")
     print("")
-else:
-    print("Arrival times not present — cannot compute delay analysis.")
+
+    print(" PER-DEVICE ")
+    print(f"{'device':>6} {'expected':>9} {'received':>9} {'lost':>6} {'loss %':>7} "
+          f"{'dups':>5} {'reorder':>7} {'p50 ms':>9} {'p99 ms':>9} {'jitter ms':>9}")
+    for device_id, d in sorted(devices.items()):
+        row = summarize(d)
+        print(f"{device_id:>6} {row['expected']:>9} {row['received']:>9} {row['lost']:>6} "
+              f"{row['loss_percent']:>7.2f} {row['duplicates']:>5} {row['reordered']:>7} "
+              f"{row['delay_p50_ms']:>9} {row['delay_p99_ms']:>9} {row['jitter_rfc3550_ms']:>9}")
+
+
+def write_json(path, source, devices):
+    fleet = FleetStats(devices)
+    report = {
+        "file": source,
+        "format": log_format(source),
+        "fleet": summarize(fleet),
+        "burst_lengths": {str(k): v for k, v in sorted(fleet.bursts.items())},
+        "reorder_extent": {str(k): v for k, v in sorted(fleet.reorder_extent.items())},
+        "devices": [
+            dict(device_id=device_id, **summarize(d),
+                 burst_lengths={str(k): v for k, v in sorted(d.bursts.items())})
+            for device_id, d in sorted(devices.items())
+        ],
+    }
+    with open(path, "w") as f:
+        json.dump(report, f, indent=2, default=float)
+
+
+def write_csv(path, devices):
+    rows = [dict(device_id=device_id, **summarize(d)) for device_id, d in sorted(devices.items())]
+    rows.append(dict(device_id="all", **summarize(FleetStats(devices))))
+    with open(path, "w", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=list(rows[0]))
+        writer.writeheader()
+        writer.writerows(rows)
+
+
+# MAIN
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Loss, delay and jitter report for a telemetry log")
+    parser.add_argument("path", help="sensor_data.csv or sensor_data.bin")
+    parser.add_argument("--json", help="Also write the report as JSON to this path")
+    parser.add_argument("--csv", help="Also write one row per device (plus 'all') to this path")
+    args = parser.parse_args()
+
+    devices = analyze(args.path)
+    if not devices:
+        print(f"{args.path} contains no data packets.")
+        raise SystemExit(0)
+
+    print_report(args.path, devices)
+    if args.json:
+        write_json(args.json, args.path, devices)
+    if args.csv:
+        write_csv(args.csv, devices)